@@ -1,10 +1,11 @@
 from .fields import (Field, ResourceField, DictField, ListField, DateTimeField)
 from .lookup import nap_url
 from .resources import ResourceModel
+from .warmup import warmup
 
 
 __all__ = (
     ResourceModel,
     DateTimeField, Field, ResourceField, DictField, ListField,
-    nap_url
+    nap_url, warmup
 )
@@ -0,0 +1,123 @@
+import collections
+import threading
+import time
+
+from .exceptions import CircuitOpenError
+
+
+class Circuit(object):
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half-open'
+
+    def __init__(self, window_size):
+        self.state = self.CLOSED
+        self.opened_at = None
+        self.probes = 0
+        self.outcomes = collections.deque(maxlen=window_size)
+
+    @property
+    def failure_rate(self):
+        if not self.outcomes:
+            return 0.0
+        return float(sum(self.outcomes)) / len(self.outcomes)
+
+
+class CircuitBreaker(object):
+
+    """
+    Fails fast with :class:`~nap.exceptions.CircuitOpenError` for a host
+    whose recent requests mostly failed, instead of piling up more slow
+    requests against it. Each host has its own circuit.
+
+    Once ``reset_timeout`` seconds have passed, the circuit half-opens and
+    lets ``half_open_probes`` requests through. A successful probe closes
+    the circuit again, and a failed one re-opens it.
+
+    :param failure_threshold: failure rate (0 to 1) that opens the circuit
+    :param min_requests: requests needed in the window before the circuit
+        can open
+    :param window_size: number of recent requests the failure rate is
+        computed over
+    :param slow_request_threshold: seconds after which a successful
+        request is counted as failed. ``None`` ignores latency
+    :param reset_timeout: seconds an open circuit waits before half-opening
+    :param half_open_probes: requests let through while half-open
+    :param serve_from_cache: while open, answer gets from the cache when
+        possible instead of failing
+    """
+
+    def __init__(self, failure_threshold=0.5, min_requests=20, window_size=50,
+            slow_request_threshold=None, reset_timeout=30, half_open_probes=1,
+            serve_from_cache=False):
+        self.failure_threshold = failure_threshold
+        self.min_requests = min_requests
+        self.window_size = window_size
+        self.slow_request_threshold = slow_request_threshold
+        self.reset_timeout = reset_timeout
+        self.half_open_probes = half_open_probes
+        self.serve_from_cache = serve_from_cache
+
+        self._circuits = {}
+        self._lock = threading.Lock()
+
+    def get_circuit(self, host):
+        circuit = self._circuits.get(host)
+        if circuit is None:
+            circuit = self._circuits[host] = Circuit(self.window_size)
+        return circuit
+
+    def get_state(self, host):
+        with self._lock:
+            return self.get_circuit(host).state
+
+    def before_request(self, host):
+        "Raise CircuitOpenError if a request to ``host`` may not be sent"
+        with self._lock:
+            circuit = self.get_circuit(host)
+            if circuit.state == Circuit.OPEN:
+                if time.time() - circuit.opened_at < self.reset_timeout:
+                    raise CircuitOpenError(host)
+                circuit.state = Circuit.HALF_OPEN
+                circuit.probes = 0
+
+            if circuit.state == Circuit.HALF_OPEN:
+                if circuit.probes >= self.half_open_probes:
+                    raise CircuitOpenError(host)
+                circuit.probes += 1
+
+    def release(self, host):
+        "Give back the half-open probe taken by a request that wasn't sent"
+        with self._lock:
+            circuit = self.get_circuit(host)
+            if circuit.state == Circuit.HALF_OPEN and circuit.probes > 0:
+                circuit.probes -= 1
+
+    def is_failure(self, response, elapsed):
+        if response.status_code >= 500:
+            return True
+
+        slow_threshold = self.slow_request_threshold
+        return slow_threshold is not None and elapsed > slow_threshold
+
+    def record(self, host, failed):
+        with self._lock:
+            circuit = self.get_circuit(host)
+            if circuit.state == Circuit.HALF_OPEN:
+                if failed:
+                    self.open(circuit)
+                else:
+                    circuit.state = Circuit.CLOSED
+                    circuit.outcomes.clear()
+                return
+
+            circuit.outcomes.append(failed)
+            if len(circuit.outcomes) >= self.min_requests and \
+                    circuit.failure_rate >= self.failure_threshold:
+                self.open(circuit)
+
+    def open(self, circuit):
+        circuit.state = Circuit.OPEN
+        circuit.opened_at = time.time()
+        circuit.outcomes.clear()
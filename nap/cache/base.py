@@ -1,29 +1,244 @@
-import re
+import hashlib
+import json
+import struct
+import uuid
+import zlib
+
+from requests.structures import CaseInsensitiveDict
+
+from ..http import NapResponse
+from .policy import FreshnessPolicy
 
 DEFAULT_TIMEOUT = 60 * 5
+# tag versions outlive the entries they tag
+TAG_TIMEOUT = 60 * 60 * 24 * 30
+# stored under a response's key, followed by the names of the request
+# headers it varies on, when the response itself is cached per variant
+VARY_MARKER_PREFIX = 'vary::'
+
+# Compact encoding of cached responses: a prefix, then a JSON header
+# holding the status, url, cache metadata and the headers nap needs, then
+# the body. Everything after the prefix may be zlib compressed.
+ENCODING_PREFIX = 'nap'
+ENCODING_VERSION = 1
+CACHED_HEADERS = (
+    'age', 'cache-control', 'content-type', 'date', 'etag', 'expires',
+    'last-modified', 'vary',
+)
+
+FLAG_COMPRESSED = 1
+FLAG_UNICODE = 2
+_prefix_struct = struct.Struct('!3sBB')
+_length_struct = struct.Struct('!I')
+
+
+def encode_response(response, compress_min_size=1024, level=6):
+    """Encode ``response`` into a compact string, compressing it when it is
+    at least ``compress_min_size`` bytes long. ``None`` never compresses
+    """
+    headers = dict(
+        (name.lower(), value) for (name, value) in response.headers.items()
+        if name.lower() in CACHED_HEADERS
+    )
+    meta = json.dumps({
+        's': response.status_code,
+        'u': response.url,
+        'm': response.request_method,
+        'h': headers,
+        'e': response.expires_at,
+        'w': response.stale_until,
+        't': response.tag_versions,
+    }, separators=(',', ':'))
+
+    flags = 0
+    content = response.content or ''
+    if isinstance(content, unicode):
+        content = content.encode('utf-8')
+        flags |= FLAG_UNICODE
+
+    data = _length_struct.pack(len(meta)) + meta + content
+    if compress_min_size is not None and len(data) >= compress_min_size:
+        compressed_data = zlib.compress(data, level)
+        if len(compressed_data) < len(data):
+            data = compressed_data
+            flags |= FLAG_COMPRESSED
+
+    return _prefix_struct.pack(ENCODING_PREFIX, ENCODING_VERSION, flags) + data
+
+
+def is_encoded_response(value):
+    return isinstance(value, str) and len(value) >= _prefix_struct.size \
+        and value.startswith(ENCODING_PREFIX)
+
+
+def decode_response(value):
+    """Decode a response encoded by ``encode_response``. Returns None for
+    anything encoded with another version of the format
+    """
+    prefix, version, flags = _prefix_struct.unpack_from(value)
+    if prefix != ENCODING_PREFIX or version != ENCODING_VERSION:
+        return None
+
+    data = value[_prefix_struct.size:]
+    if flags & FLAG_COMPRESSED:
+        data = zlib.decompress(data)
+
+    meta_length, = _length_struct.unpack_from(data)
+    meta_end = _length_struct.size + meta_length
+    meta = json.loads(data[_length_struct.size:meta_end])
+
+    content = data[meta_end:]
+    if flags & FLAG_UNICODE:
+        content = content.decode('utf-8')
+
+    response = NapResponse(
+        content=content,
+        url=meta['u'],
+        status_code=meta['s'],
+        headers=CaseInsensitiveDict(meta['h']),
+        request_method=meta['m'],
+    )
+    response.expires_at = meta['e']
+    response.stale_until = meta['w']
+    response.tag_versions = meta['t']
+
+    return response
 
 
 class BaseCacheBackend(object):
 
     CACHE_EMPTY = "!!!DNE!!!"
 
-    def __init__(self, default_timeout=DEFAULT_TIMEOUT, obey_cache_headers=True):
+    def __init__(self, default_timeout=DEFAULT_TIMEOUT, obey_cache_headers=True,
+            stale_timeout=0, policy=None):
+        """
+        :param default_timeout: seconds a response stays fresh, unless its
+            headers say otherwise
+        :param obey_cache_headers: use response headers to decide whether,
+            for how long and under which key a response is cached
+        :param stale_timeout: seconds an expired response is kept around so
+            it can be revalidated with a conditional request
+        :param policy: the :class:`~nap.cache.policy.FreshnessPolicy` that
+            reads response headers
+        """
         self.obey_cache_headers = obey_cache_headers
         self.default_timeout = default_timeout
+        self.stale_timeout = stale_timeout
+        self.policy = policy or FreshnessPolicy()
 
     def get(self, key):
         return None
 
-    def set(self, key, value, response=None):
+    def set(self, key, value, response=None, timeout=None):
+        """Store ``value`` under ``key``. Unless ``timeout`` is given, it is
+        kept for the storage timeout of ``response``
+        """
         return None
 
+    def delete(self, key):
+        return None
+
+    def get_many(self, keys):
+        """Return a dictionary of cached values for ``keys``. Keys with no
+        cached value are left out
+        """
+        values = {}
+        for key in keys:
+            value = self.get(key)
+            if value is not None:
+                values[key] = value
+
+        return values
+
+    def set_many(self, values, timeout=None):
+        """Store each of the ``values`` dictionary under its key, all kept
+        for ``timeout`` seconds, or the default storage timeout
+        """
+        for key, value in values.items():
+            self.set(key, value, timeout=timeout)
+
+    def get_tag_key(self, tag):
+        return "nap-tag::%s" % tag
+
+    def get_tag_versions(self, tags):
+        """Return a dictionary of the current version of each of ``tags``.
+        Tags with no stored version are given a new one
+        """
+        tag_keys = dict((self.get_tag_key(tag), tag) for tag in tags)
+        stored_versions = self.get_many(list(tag_keys.keys()))
+
+        tag_versions = {}
+        for tag_key, tag in tag_keys.items():
+            version = stored_versions.get(tag_key)
+            if version is None:
+                version = self.new_tag_version(tag_key)
+            tag_versions[tag] = version
+
+        return tag_versions
+
+    def new_tag_version(self, tag_key):
+        version = uuid.uuid4().hex
+        self.set(tag_key, version, timeout=TAG_TIMEOUT)
+        return version
+
+    def purge_tags(self, tags):
+        """Invalidate every entry cached with any of ``tags``. Entries are
+        not deleted, but are ignored from then on
+        """
+        # the next reader of a tag with no stored version gives it a new one
+        for tag in tags:
+            self.delete(self.get_tag_key(tag))
+
+    def is_purged(self, tag_versions):
+        "Whether an entry cached with ``tag_versions`` has been purged since"
+        return self.get_tag_versions(list(tag_versions.keys())) != tag_versions
+
+    def is_cacheable(self, response):
+        if not self.obey_cache_headers:
+            return True
+        return self.policy.is_storable(response)
+
     def get_timeout_from_header(self, response):
-        cache_headers = response.headers.get('cache-control')
-        if cache_headers is None:
+        return self.policy.get_time_to_live(response)
+
+    def get_stale_while_revalidate_from_header(self, response):
+        return self.policy.get_stale_while_revalidate(response)
+
+    def allows_stale(self, response):
+        "Whether ``response`` may be served stale, without revalidating it"
+        if not self.obey_cache_headers:
+            return True
+        return self.policy.allows_stale(response)
+
+    def get_vary(self, response):
+        if not self.obey_cache_headers:
+            return []
+        return self.policy.get_vary(response)
+
+    def make_vary_marker(self, vary):
+        return VARY_MARKER_PREFIX + ','.join(vary)
+
+    def get_vary_from_marker(self, value):
+        """Return the request header names stored in a Vary marker, or None
+        if ``value`` isn't one
+        """
+        if not isinstance(value, basestring) or \
+                not value.startswith(VARY_MARKER_PREFIX):
             return None
+        return value[len(VARY_MARKER_PREFIX):].split(',')
 
-        cache_header_age = re.search(r'max\-?age=(\d+)', cache_headers)
-        return int(cache_header_age.group(1))
+    def get_variant_key(self, cache_key, vary, request_headers):
+        """The key a response cached under ``cache_key`` is stored under when
+        it varies on the ``vary`` request headers. Header values are hashed,
+        so credentials never appear in keys
+        """
+        values = '\n'.join(
+            '%s:%s' % (name, request_headers.get(name, '')) for name in vary
+        )
+        if isinstance(values, unicode):
+            values = values.encode('utf-8')
+
+        return "%s::vary::%s" % (cache_key, hashlib.sha1(values).hexdigest())
 
     def get_cache_key(self, model, url):
 
@@ -42,7 +257,11 @@ class BaseCacheBackend(object):
 
         if response and self.obey_cache_headers:
             header_timeout = self.get_timeout_from_header(response)
-            if header_timeout:
+            if header_timeout is not None:
                 return header_timeout
 
         return self.default_timeout
+
+    def get_storage_timeout(self, response=None):
+        "Seconds to keep ``response`` stored, including its stale period"
+        return self.get_timeout(response) + self.stale_timeout
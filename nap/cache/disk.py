@@ -0,0 +1,214 @@
+import os
+import sqlite3
+import threading
+import time
+
+from ..http import NapResponse
+from .base import BaseCacheBackend, decode_response, encode_response
+from .tiered import TieredEntry
+
+KIND_STRING = 0
+KIND_UNICODE = 1
+KIND_RESPONSE = 2
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY,
+    value BLOB NOT NULL,
+    kind INTEGER NOT NULL,
+    wrapped INTEGER NOT NULL,
+    expires_at REAL NOT NULL,
+    size INTEGER NOT NULL
+)
+"""
+EXPIRES_INDEX = """
+CREATE INDEX IF NOT EXISTS entries_expires_at ON entries (expires_at)
+"""
+
+# SQLite allows at most 999 parameters per statement
+MAX_QUERY_KEYS = 500
+
+
+class DiskCacheBackend(BaseCacheBackend):
+
+    """
+    A persistent cache in a local SQLite database, so a restarted process
+    starts with a warm cache. Any number of threads and processes on the
+    same host may share the database file.
+
+    Responses are stored in nap's compact encoding. Other values may only
+    be strings, which is all nap itself caches besides responses.
+
+    :param path: path of the database file
+    :param max_bytes: the most bytes of values to keep. Entries closest to
+        expiring are evicted first
+    :param compress_min_size: smallest encoded response, in bytes, that is
+        compressed. ``None`` never compresses
+    :param cull_interval: sets between two checks for expired entries and
+        for the size limit
+    :param busy_timeout: seconds to wait for another process's write to
+        finish
+    """
+
+    def __init__(self, path, max_bytes=100 * 1024 * 1024,
+            compress_min_size=1024, cull_interval=100, busy_timeout=5,
+            **kwargs):
+        super(DiskCacheBackend, self).__init__(**kwargs)
+        self.path = path
+        self.max_bytes = max_bytes
+        self.compress_min_size = compress_min_size
+        self.cull_interval = cull_interval
+        self.busy_timeout = busy_timeout
+
+        self._local = threading.local()
+        self._sets = 0
+        self._lock = threading.Lock()
+
+    @property
+    def connection(self):
+        "This thread's connection. Forked processes open their own"
+        pid = os.getpid()
+        if getattr(self._local, 'pid', None) != pid:
+            self._local.connection = self.connect()
+            self._local.pid = pid
+
+        return self._local.connection
+
+    def connect(self):
+        connection = sqlite3.connect(self.path, timeout=self.busy_timeout,
+            isolation_level=None, check_same_thread=False)
+        # WAL lets readers carry on while another process writes
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.execute('PRAGMA synchronous=NORMAL')
+        connection.execute(SCHEMA)
+        connection.execute(EXPIRES_INDEX)
+
+        return connection
+
+    def encode(self, value):
+        if isinstance(value, NapResponse):
+            return KIND_RESPONSE, encode_response(value, self.compress_min_size)
+        if isinstance(value, unicode):
+            return KIND_UNICODE, value.encode('utf-8')
+        if isinstance(value, str):
+            return KIND_STRING, value
+
+        raise TypeError("DiskCacheBackend can't store %r" % value)
+
+    def decode(self, kind, data):
+        data = str(data)
+        if kind == KIND_RESPONSE:
+            return decode_response(data)
+        if kind == KIND_UNICODE:
+            return data.decode('utf-8')
+        return data
+
+    def load(self, row):
+        value_data, kind, wrapped, expires_at = row
+        value = self.decode(kind, value_data)
+        if value is not None and wrapped:
+            value = TieredEntry(value, expires_at)
+
+        return value
+
+    def get(self, key):
+        row = self.connection.execute(
+            'SELECT value, kind, wrapped, expires_at FROM entries '
+            'WHERE key = ? AND expires_at > ?',
+            (key, time.time())
+        ).fetchone()
+        if row is None:
+            return None
+
+        return self.load(row)
+
+    def get_many(self, keys):
+        keys = list(keys)
+        now = time.time()
+
+        values = {}
+        for start in range(0, len(keys), MAX_QUERY_KEYS):
+            chunk = keys[start:start + MAX_QUERY_KEYS]
+            rows = self.connection.execute(
+                'SELECT key, value, kind, wrapped, expires_at FROM entries '
+                'WHERE key IN (%s) AND expires_at > ?' % ','.join('?' * len(chunk)),
+                chunk + [now]
+            )
+            for row in rows:
+                value = self.load(row[1:])
+                if value is not None:
+                    values[row[0]] = value
+
+        return values
+
+    def set(self, key, value, response=None, timeout=None):
+        if timeout is None:
+            timeout = self.get_storage_timeout(response)
+
+        wrapped = isinstance(value, TieredEntry)
+        if wrapped:
+            value = value.value
+
+        kind, data = self.encode(value)
+        if len(data) > self.max_bytes:
+            # the old value is stale too, so don't leave it behind
+            self.delete(key)
+            return None
+
+        self.connection.execute(
+            'INSERT OR REPLACE INTO entries '
+            '(key, value, kind, wrapped, expires_at, size) '
+            'VALUES (?, ?, ?, ?, ?, ?)',
+            (key, sqlite3.Binary(data), kind, int(wrapped),
+                time.time() + timeout, len(data))
+        )
+
+        with self._lock:
+            self._sets += 1
+            cull = self._sets % self.cull_interval == 0
+        if cull:
+            self.cull()
+
+    def delete(self, key):
+        self.connection.execute('DELETE FROM entries WHERE key = ?', (key,))
+
+    def clear(self):
+        self.connection.execute('DELETE FROM entries')
+
+    def get_total_bytes(self):
+        total, = self.connection.execute(
+            'SELECT COALESCE(SUM(size), 0) FROM entries').fetchone()
+        return total
+
+    def cull(self):
+        "Delete expired entries, then evict entries over the size limit"
+        connection = self.connection
+        connection.execute('DELETE FROM entries WHERE expires_at <= ?',
+            (time.time(),))
+
+        excess = self.get_total_bytes() - self.max_bytes
+        if excess <= 0:
+            return
+
+        rows = connection.execute(
+            'SELECT key, size FROM entries ORDER BY expires_at')
+        evicted_keys = []
+        for key, size in rows:
+            evicted_keys.append(key)
+            excess -= size
+            if excess <= 0:
+                break
+
+        for start in range(0, len(evicted_keys), MAX_QUERY_KEYS):
+            chunk = evicted_keys[start:start + MAX_QUERY_KEYS]
+            connection.execute(
+                'DELETE FROM entries WHERE key IN (%s)' % ','.join('?' * len(chunk)),
+                chunk
+            )
+
+    def __len__(self):
+        count, = self.connection.execute(
+            'SELECT COUNT(*) FROM entries WHERE expires_at > ?',
+            (time.time(),)
+        ).fetchone()
+        return count
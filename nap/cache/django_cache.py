@@ -4,14 +4,72 @@ except ImportError as e:
     raise ImportError("Error loading django cache module: %s" % e)
 
 
-from .base import BaseCacheBackend
+from ..http import NapResponse
+from .base import (BaseCacheBackend, decode_response, encode_response,
+    is_encoded_response)
+from .tiered import TieredEntry
+
+# marks an encoded TieredEntry, stored as (TIERED_ENTRY, expires_at, value)
+TIERED_ENTRY = 'nap-tiered'
 
 
 class DjangoCacheBackend(BaseCacheBackend):
 
+    """
+    Caches responses with Django's configured cache.
+
+    :param compact: store responses in nap's compact encoding instead of
+        pickling them
+    :param compress_min_size: smallest encoded response, in bytes, that is
+        compressed. ``None`` never compresses
+    """
+
+    def __init__(self, compact=False, compress_min_size=1024, **kwargs):
+        super(DjangoCacheBackend, self).__init__(**kwargs)
+        self.compact = compact
+        self.compress_min_size = compress_min_size
+
+    def encode(self, value):
+        if not self.compact:
+            return value
+        if isinstance(value, TieredEntry):
+            # stored by a TieredCacheBackend in front of this one
+            return (TIERED_ENTRY, value.expires_at, self.encode(value.value))
+        if isinstance(value, NapResponse):
+            return encode_response(value, self.compress_min_size)
+        return value
+
+    def decode(self, value):
+        if isinstance(value, tuple) and value[:1] == (TIERED_ENTRY,):
+            marker, expires_at, inner = value
+            return TieredEntry(self.decode(inner), expires_at)
+        if is_encoded_response(value):
+            return decode_response(value)
+        return value
+
     def get(self, key):
-        return cache.get(key)
+        return self.decode(cache.get(key))
+
+    def get_many(self, keys):
+        values = {}
+        for key, value in cache.get_many(keys).items():
+            value = self.decode(value)
+            if value is not None:
+                values[key] = value
+
+        return values
+
+    def set(self, key, value, response=None, timeout=None):
+        if timeout is None:
+            timeout = self.get_storage_timeout(response)
+        return cache.set(key, self.encode(value), timeout)
+
+    def set_many(self, values, timeout=None):
+        if timeout is None:
+            timeout = self.get_storage_timeout()
+        return cache.set_many(dict([
+            (key, self.encode(value)) for (key, value) in values.items()
+        ]), timeout)
 
-    def set(self, key, value, response=None):
-        timeout = self.get_timeout(response)
-        return cache.set(key, value, timeout)
+    def delete(self, key):
+        return cache.delete(key)
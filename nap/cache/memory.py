@@ -0,0 +1,95 @@
+import collections
+import threading
+import time
+
+from .base import BaseCacheBackend
+
+
+class MemoryCacheBackend(BaseCacheBackend):
+
+    """
+    A thread-safe, in-process cache. Entries expire by their timeout, and the
+    least recently used entries are evicted once the cache holds more than
+    ``max_entries`` entries or ``max_bytes`` bytes of response content.
+
+    ``hits``, ``misses`` and ``evictions`` count cache activity since the
+    backend was created.
+    """
+
+    def __init__(self, max_entries=1000, max_bytes=50 * 1024 * 1024, **kwargs):
+        super(MemoryCacheBackend, self).__init__(**kwargs)
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.total_bytes = 0
+
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_size(self, value):
+        content = getattr(value, 'content', value)
+        try:
+            return len(content)
+        except TypeError:
+            return 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            value, expires_at, size = entry
+            if expires_at <= time.time():
+                self.total_bytes -= size
+                self.misses += 1
+                return None
+
+            # re-inserting marks the entry as most recently used
+            self._entries[key] = entry
+            self.hits += 1
+            return value
+
+    def set(self, key, value, response=None, timeout=None):
+        if timeout is None:
+            timeout = self.get_storage_timeout(response)
+        size = self.get_size(value)
+
+        with self._lock:
+            # replaced even when the new value is too big to keep, so the
+            # old one isn't served in its place
+            self._delete(key)
+            if size > self.max_bytes:
+                return None
+
+            self._entries[key] = (value, time.time() + timeout, size)
+            self.total_bytes += size
+            self._evict()
+
+    def delete(self, key):
+        with self._lock:
+            self._delete(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.total_bytes = 0
+
+    def _delete(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.total_bytes -= entry[2]
+
+    def _evict(self):
+        while len(self._entries) > self.max_entries or \
+                self.total_bytes > self.max_bytes:
+            key, (value, expires_at, size) = self._entries.popitem(last=False)
+            self.total_bytes -= size
+            self.evictions += 1
+
+    def __len__(self):
+        return len(self._entries)
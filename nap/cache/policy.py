@@ -0,0 +1,142 @@
+"""
+Decides, from a response's headers, whether it may be cached and for how
+long, following HTTP's caching rules (RFC 7234).
+"""
+import time
+from email.utils import mktime_tz, parsedate_tz
+
+
+def parse_cache_control(header):
+    """Parse a Cache-Control header into a dictionary of directives. Valueless
+    directives, like ``no-store``, map to None
+    """
+    directives = {}
+    for directive in (header or '').split(','):
+        name, sep, value = directive.partition('=')
+        name = name.strip().lower()
+        if name:
+            directives[name] = value.strip().strip('"') if sep else None
+
+    return directives
+
+
+def parse_seconds(value):
+    try:
+        return max(int(value), 0)
+    except (TypeError, ValueError):
+        return None
+
+
+def parse_http_date(value):
+    parsed_date = parsedate_tz(value or '')
+    if parsed_date is None:
+        return None
+    return mktime_tz(parsed_date)
+
+
+class FreshnessPolicy(object):
+
+    """
+    Reads the caching headers of responses.
+
+    :param shared: whether the cache is shared by several users. A shared
+        cache prefers ``s-maxage`` to ``max-age`` and never stores responses
+        marked ``private``
+    """
+
+    def __init__(self, shared=False):
+        self.shared = shared
+
+    def get_directives(self, response):
+        return parse_cache_control(response.headers.get('cache-control'))
+
+    def get_vary(self, response):
+        """Lowercased names of the request headers ``response`` varies on.
+        Responses marked ``private`` also vary on ``Authorization``, so each
+        user gets their own copy
+        """
+        vary = response.headers.get('vary') or ''
+        names = set(
+            name.strip().lower() for name in vary.split(',') if name.strip()
+        )
+        if 'private' in self.get_directives(response):
+            names.add('authorization')
+
+        return sorted(names)
+
+    def is_storable(self, response):
+        directives = self.get_directives(response)
+        if 'no-store' in directives:
+            return False
+
+        if self.shared and 'private' in directives:
+            return False
+
+        # varies on something other than request headers
+        return '*' not in self.get_vary(response)
+
+    def get_freshness_lifetime(self, response):
+        """Seconds ``response`` stays fresh, or None if its headers don't
+        say. ``no-cache`` responses are stale right away, so they are
+        revalidated before every use
+        """
+        directives = self.get_directives(response)
+        if 'no-cache' in directives:
+            return 0
+
+        if self.shared and 's-maxage' in directives:
+            lifetime = parse_seconds(directives['s-maxage'])
+            if lifetime is not None:
+                return lifetime
+
+        if 'max-age' in directives:
+            lifetime = parse_seconds(directives['max-age'])
+            if lifetime is not None:
+                return lifetime
+
+        expires = response.headers.get('expires')
+        if expires is None:
+            return None
+
+        expires_at = parse_http_date(expires)
+        if expires_at is None:
+            # an invalid Expires date means the response already expired
+            return 0
+
+        date = parse_http_date(response.headers.get('date'))
+        if date is None:
+            date = time.time()
+
+        return max(int(expires_at - date), 0)
+
+    def get_age(self, response):
+        """Seconds ``response`` had already spent in caches on its way here,
+        from its Age header. Its Date isn't used, as the origin's clock may
+        not agree with ours
+        """
+        return parse_seconds(response.headers.get('age')) or 0
+
+    def get_time_to_live(self, response):
+        """Seconds ``response`` has left to be fresh, ie: its freshness
+        lifetime less its age, or None if its headers don't say
+        """
+        lifetime = self.get_freshness_lifetime(response)
+        if lifetime is None:
+            return None
+
+        return max(lifetime - self.get_age(response), 0)
+
+    def allows_stale(self, response):
+        """Whether ``response`` may be served once stale. ``no-cache`` and
+        ``must-revalidate`` (and, for a shared cache, ``proxy-revalidate``)
+        responses must be revalidated first
+        """
+        directives = self.get_directives(response)
+        if 'no-cache' in directives or 'must-revalidate' in directives:
+            return False
+
+        return not (self.shared and 'proxy-revalidate' in directives)
+
+    def get_stale_while_revalidate(self, response):
+        directives = self.get_directives(response)
+        return parse_seconds(directives.get('stale-while-revalidate'))
@@ -0,0 +1,122 @@
+import time
+
+from .base import BaseCacheBackend
+
+
+class TieredEntry(object):
+
+    "A cached value, along with when it expires from the shared tier"
+
+    def __init__(self, value, expires_at):
+        self.value = value
+        self.expires_at = expires_at
+
+    def __len__(self):
+        # lets size-bounded backends account for the wrapped content
+        content = getattr(self.value, 'content', self.value)
+        try:
+            return len(content)
+        except TypeError:
+            return 0
+
+
+class TieredCacheBackend(BaseCacheBackend):
+
+    """
+    A small per-process cache (``l1``, usually a MemoryCacheBackend) in front
+    of a shared one (``l2``, eg: a DjangoCacheBackend). Hits in ``l2`` are
+    promoted to ``l1``, where they are kept for at most ``l1_timeout``
+    seconds and never longer than they have left in ``l2``.
+
+    Timeouts and cache headers are handled as ``l2`` handles them. Cache
+    tag versions are only kept in ``l2``, so a purge is seen by every
+    process right away. Deleting a key removes it from both tiers of this
+    process, but other processes may serve their ``l1`` copy for up to
+    ``l1_timeout`` seconds.
+    """
+
+    def __init__(self, l1, l2, l1_timeout=60):
+        super(TieredCacheBackend, self).__init__(
+            default_timeout=l2.default_timeout,
+            obey_cache_headers=l2.obey_cache_headers,
+            stale_timeout=l2.stale_timeout,
+            policy=l2.policy,
+        )
+        self.l1 = l1
+        self.l2 = l2
+        self.l1_timeout = l1_timeout
+
+    def get_tag_versions(self, tags):
+        return self.l2.get_tag_versions(tags)
+
+    def purge_tags(self, tags):
+        self.l2.purge_tags(tags)
+
+    def get_timeout(self, response=None):
+        return self.l2.get_timeout(response)
+
+    def get_storage_timeout(self, response=None):
+        return self.l2.get_storage_timeout(response)
+
+    def unwrap(self, entry):
+        if isinstance(entry, TieredEntry):
+            return entry.value
+        return entry
+
+    def promote(self, key, entry):
+        if not isinstance(entry, TieredEntry):
+            # written by someone else: we can't tell how long it has left
+            return
+
+        remaining = entry.expires_at - time.time()
+        if remaining > 0:
+            self.l1.set(key, entry, timeout=min(self.l1_timeout, remaining))
+
+    def get(self, key):
+        entry = self.l1.get(key)
+        if entry is None:
+            entry = self.l2.get(key)
+            if entry is None:
+                return None
+            self.promote(key, entry)
+
+        return self.unwrap(entry)
+
+    def get_many(self, keys):
+        entries = self.l1.get_many(keys)
+
+        missing_keys = [key for key in keys if key not in entries]
+        if missing_keys:
+            l2_entries = self.l2.get_many(missing_keys)
+            for key, entry in l2_entries.items():
+                self.promote(key, entry)
+            entries.update(l2_entries)
+
+        return dict([
+            (key, self.unwrap(entry)) for (key, entry) in entries.items()
+        ])
+
+    def set(self, key, value, response=None, timeout=None):
+        if timeout is None:
+            timeout = self.get_storage_timeout(response)
+
+        entry = TieredEntry(value, time.time() + timeout)
+        self.l2.set(key, entry, response=response, timeout=timeout)
+        self.l1.set(key, entry, response=response,
+            timeout=min(self.l1_timeout, timeout))
+
+    def set_many(self, values, timeout=None):
+        if timeout is None:
+            timeout = self.get_storage_timeout()
+
+        expires_at = time.time() + timeout
+        entries = dict([
+            (key, TieredEntry(value, expires_at))
+            for (key, value) in values.items()
+        ])
+        self.l2.set_many(entries, timeout=timeout)
+        self.l1.set_many(entries, timeout=min(self.l1_timeout, timeout))
+
+    def delete(self, key):
+        self.l1.delete(key)
+        self.l2.delete(key)
@@ -7,3 +7,41 @@ class ListWithAttributes(list):
             extra_data = {}
         super(ListWithAttributes, self).__init__(list_vals)
         self.extra_data = extra_data
+
+
+class BulkResult(list):
+
+    """
+    Results of a bulk operation, in the same order as its input. Failed items
+    are ``None`` in the list, and their exceptions are kept in ``errors``,
+    keyed by index.
+    """
+
+    def __init__(self, results, errors=None):
+        if not errors:
+            errors = {}
+        super(BulkResult, self).__init__(results)
+        self.errors = errors
+
+    @classmethod
+    def from_pairs(cls, pairs, errors=None):
+        "Build from ``(result, exception)`` pairs"
+        results = []
+        errors = dict(errors or {})
+        for index, (result, error) in enumerate(pairs):
+            if error is not None:
+                errors[index] = error
+            results.append(result)
+
+        return cls(results, errors)
+
+    @property
+    def ok(self):
+        return not self.errors
+
+    @property
+    def successes(self):
+        return [
+            result for (index, result) in enumerate(self)
+            if index not in self.errors
+        ]
@@ -0,0 +1,93 @@
+import threading
+import zlib
+
+GZIP_WBITS = 16 + zlib.MAX_WBITS
+
+
+def compress(data, encoding='gzip', level=6):
+    if encoding == 'gzip':
+        compressor = zlib.compressobj(level, zlib.DEFLATED, GZIP_WBITS)
+    elif encoding == 'deflate':
+        compressor = zlib.compressobj(level)
+    else:
+        raise ValueError("Unsupported encoding: %s" % encoding)
+
+    return compressor.compress(data) + compressor.flush()
+
+
+def decompress(content, encoding):
+    """Decode ``content`` sent with a ``Content-Encoding`` of ``encoding``.
+    Unknown encodings are returned as is
+    """
+    encoding = (encoding or '').strip().lower()
+    if encoding in ('gzip', 'x-gzip'):
+        return zlib.decompress(content, GZIP_WBITS)
+
+    if encoding == 'deflate':
+        try:
+            return zlib.decompress(content)
+        except zlib.error:
+            # some servers send raw deflate data, with no zlib header
+            return zlib.decompress(content, -zlib.MAX_WBITS)
+
+    return content
+
+
+class Compressor(object):
+
+    """
+    Compresses request bodies of at least ``min_size`` bytes and asks for
+    compressed responses. Keeps count of the request bytes it saved.
+
+    :param min_size: smallest body, in bytes, worth compressing
+    :param encoding: ``'gzip'`` or ``'deflate'``
+    :param level: zlib compression level, from 1 (fastest) to 9 (smallest)
+    :param accept_encoding: ``Accept-Encoding`` header sent with every
+        request. ``None`` leaves the header alone
+    """
+
+    def __init__(self, min_size=1024, encoding='gzip', level=6,
+            accept_encoding='gzip, deflate'):
+        self.min_size = min_size
+        self.encoding = encoding
+        self.level = level
+        self.accept_encoding = accept_encoding
+
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self._lock = threading.Lock()
+
+    @property
+    def bytes_saved(self):
+        return self.bytes_in - self.bytes_out
+
+    def compress_request(self, request):
+        """Compress ``request``'s body in place, if it is big enough.
+        Returns the number of bytes saved
+        """
+        if self.accept_encoding:
+            request.headers['Accept-Encoding'] = self.accept_encoding
+
+        data = request.data
+        if not isinstance(data, basestring) or len(data) < self.min_size:
+            return 0
+
+        header_names = [name.lower() for name in request.headers]
+        if 'content-encoding' in header_names:
+            return 0
+
+        if isinstance(data, unicode):
+            data = data.encode('utf-8')
+
+        compressed_data = compress(data, self.encoding, self.level)
+        if len(compressed_data) >= len(data):
+            return 0
+
+        request.data = compressed_data
+        request.headers['Content-Encoding'] = self.encoding
+
+        with self._lock:
+            self.bytes_in += len(data)
+            self.bytes_out += len(compressed_data)
+
+        return len(data) - len(compressed_data)
@@ -0,0 +1,165 @@
+import threading
+from multiprocessing.pool import ThreadPool
+
+from .deadline import carry_deadline, get_deadline
+from .exceptions import DeadlineExceeded
+
+
+class WorkerPool(object):
+
+    """
+    A lazily started pool of worker threads. Work submitted to the pool
+    returns an ``AsyncResult``: call ``.get()`` on it to wait for (and
+    receive) the result, or re-raise the exception the work raised.
+
+    :param size: number of worker threads, ie: how many requests may be in
+        flight at once
+    """
+
+    def __init__(self, size=10):
+        self.size = size
+        self._pool = None
+        self._lock = threading.Lock()
+
+    @property
+    def pool(self):
+        with self._lock:
+            if self._pool is None:
+                self._pool = ThreadPool(self.size)
+
+        return self._pool
+
+    def submit(self, func, *args, **kwargs):
+        return self.pool.apply_async(carry_deadline(func), args, kwargs)
+
+    def close(self):
+        "Wait for submitted work to finish, then stop the worker threads"
+        with self._lock:
+            pool, self._pool = self._pool, None
+
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+
+class _Call(object):
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.private_error = False
+
+
+class SingleFlight(object):
+
+    """
+    Collapses concurrent calls that share a key into a single call. Callers
+    arriving while a call for their key is in flight wait for it and share
+    its result (or its exception) instead of making their own.
+
+    :param is_private_error: an optional function, called in the failing
+        call's thread, telling whether an exception only concerns the
+        caller that made the call (eg: its own deadline passed). Callers
+        that joined a call failing with such an error make their own call
+        instead of raising it
+    """
+
+    def __init__(self, is_private_error=None):
+        self.is_private_error = is_private_error
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, func, *args, **kwargs):
+        """Call ``func``, unless a call for ``key`` is already in flight.
+
+        Returns a ``(result, joined)`` pair, where ``joined`` is True when the
+        result came from another caller's call. Waiting for another caller's
+        call is bounded by the current thread's deadline, if any, raising
+        DeadlineExceeded once it passes.
+        """
+        while True:
+            with self._lock:
+                call = self._calls.get(key)
+                joined = call is not None
+                if not joined:
+                    call = _Call()
+                    self._calls[key] = call
+
+            if not joined:
+                break
+
+            current_deadline = get_deadline()
+            timeout = None
+            if current_deadline is not None:
+                timeout = max(current_deadline.remaining(), 0)
+            if not call.done.wait(timeout):
+                raise DeadlineExceeded(key)
+
+            if call.error is None:
+                return call.result, True
+            if not call.private_error:
+                raise call.error
+
+        return self.run(key, call, func, *args, **kwargs), False
+
+    def reserve(self, key):
+        """Register a call for ``key`` that will be made later with
+        :meth:`run`, eg: once queued work starts. Returns the call, or None
+        if a call for ``key`` is already in flight
+        """
+        with self._lock:
+            if key in self._calls:
+                return None
+            call = self._calls[key] = _Call()
+            return call
+
+    def run(self, key, call, func, *args, **kwargs):
+        "Make the ``call`` registered for ``key`` by calling ``func``"
+        try:
+            call.result = func(*args, **kwargs)
+        except Exception as e:
+            call.error = e
+            call.private_error = self.is_private_error is not None and \
+                self.is_private_error(e)
+            raise
+        finally:
+            self.release(key, call)
+
+        return call.result
+
+    def release(self, key, call):
+        "Unregister ``call``, and wake the callers waiting on it"
+        with self._lock:
+            if self._calls.get(key) is call:
+                del self._calls[key]
+        call.done.set()
+
+
+def map_with_errors(func, items, max_workers=10):
+    """Call ``func`` on each of ``items`` using up to ``max_workers`` threads.
+
+    Returns a list of ``(result, exception)`` pairs in the order of
+    ``items``, so one failing item does not fail the whole batch.
+    """
+    func = carry_deadline(func)
+
+    def call(item):
+        try:
+            return func(item), None
+        except Exception as e:
+            return None, e
+
+    items = list(items)
+    if not items:
+        return []
+
+    pool = ThreadPool(min(max_workers, len(items)))
+    try:
+        return pool.map(call, items)
+    finally:
+        pool.close()
+        pool.join()
+
+
+default_worker_pool = WorkerPool(size=20)
@@ -27,6 +27,26 @@ DEFAULT_CONFIG = {
     'log_level': 'CRITICAL',
     'cache_backend': BaseCacheBackend(),
     'cached_methods': ('GET', ),
+    'coalesce_requests': True,
+    'connection_pool': None,
+    'transport': None,
+    'worker_pool': None,
+    'retry_policy': None,
+    'circuit_breaker': None,
+    'rate_limiter': None,
+    'compression': None,
+    'connect_timeout': None,
+    'read_timeout': None,
+    'hedge_policy': None,
+    'warmup_urls': (),
+    'stale_while_revalidate': None,
+    'cache_collection_items': False,
+    'invalidate_on_write': False,
+    'write_through': False,
+    'cache_parsed_objects': False,
+    'negative_cache_timeout': None,
+    'negative_cache_status': (404, 410),
+    'max_workers': 10,
     'request_args': {},
     'headers': {},
     'content_type': 'application/json'
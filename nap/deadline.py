@@ -0,0 +1,87 @@
+"""
+Deadlines bound the total time spent on an operation that may send several
+requests. A deadline applies to every request sent by the current thread
+(and by the worker threads it hands bulk work to) until it is left.
+"""
+import contextlib
+import functools
+import threading
+import time
+
+_local = threading.local()
+
+
+class Deadline(object):
+
+    def __init__(self, timeout):
+        self.expires_at = time.time() + timeout
+
+    def remaining(self):
+        return self.expires_at - time.time()
+
+    @property
+    def expired(self):
+        return self.remaining() <= 0
+
+
+def get_deadline():
+    "Return the current thread's Deadline, or None"
+    return getattr(_local, 'deadline', None)
+
+
+@contextlib.contextmanager
+def use_deadline(deadline):
+    "Make ``deadline`` the current thread's deadline within the block"
+    previous_deadline = get_deadline()
+    _local.deadline = deadline
+    try:
+        yield deadline
+    finally:
+        _local.deadline = previous_deadline
+
+
+@contextlib.contextmanager
+def deadline(timeout):
+    """Give every request sent within the block ``timeout`` seconds in total.
+    A deadline nested in another can only shorten it
+    """
+    new_deadline = Deadline(timeout)
+    current_deadline = get_deadline()
+    if current_deadline is not None and \
+            current_deadline.expires_at < new_deadline.expires_at:
+        new_deadline = current_deadline
+
+    with use_deadline(new_deadline):
+        yield new_deadline
+
+
+def accepts_deadline(method):
+    """Let ``method`` take a ``deadline=`` keyword argument of seconds, and
+    run it within that deadline
+    """
+    @functools.wraps(method)
+    def wrapper(*args, **kwargs):
+        timeout = kwargs.pop('deadline', None)
+        if timeout is None:
+            return method(*args, **kwargs)
+
+        with deadline(timeout):
+            return method(*args, **kwargs)
+
+    return wrapper
+
+
+def carry_deadline(func):
+    """Wrap ``func`` so it runs within the current thread's deadline, even
+    when called from another thread
+    """
+    current_deadline = get_deadline()
+    if current_deadline is None:
+        return func
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        with use_deadline(current_deadline):
+            return func(*args, **kwargs)
+
+    return wrapper
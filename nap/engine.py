@@ -1,14 +1,87 @@
 import copy
-
-from .collection import ListWithAttributes
-from .exceptions import InvalidStatusError
-from .http import NapRequest, NapResponse
+import cPickle
+import datetime
+import decimal
+import marshal
+import Queue
+import time
+import urlparse
+
+from requests.structures import CaseInsensitiveDict
+
+from .collection import BulkResult, ListWithAttributes
+from .concurrency import SingleFlight, default_worker_pool, map_with_errors
+from .deadline import accepts_deadline, get_deadline, use_deadline
+from .exceptions import CircuitOpenError, DeadlineExceeded, InvalidStatusError
+from .http import NapRequest, NapResponse, get_conditional_headers
 from .serializers import JSONSerializer
+from .transports import RequestsTransport
 from .utils import handle_slash, make_url
 
 
+# seconds a warmup request may take, for models with no timeout
+WARMUP_TIMEOUT = 10
+
+# field values that copies of an object can share
+IMMUTABLE_TYPES = (basestring, int, long, float, bool, type(None),
+    datetime.date, datetime.time, decimal.Decimal)
+
+
+class FrozenObject(object):
+
+    """
+    A snapshot of a model object. Its mutable data (raw field data, extra
+    data and mutable field values) is kept serialized, so each thawed copy
+    gets its own, with a single C call rather than a deep copy
+    """
+
+    def __init__(self, resource_obj, mutable_field_names):
+        self.template = copy.copy(resource_obj)
+        data = (
+            resource_obj._raw_field_data,
+            resource_obj.extra_data,
+            dict([
+                (name, getattr(resource_obj, name))
+                for name in mutable_field_names
+            ]),
+        )
+        try:
+            # fastest, but only for builtin types, ie: what JSON decodes to
+            self.data = marshal.dumps(data)
+            self.loads = marshal.loads
+        except ValueError:
+            self.data = cPickle.dumps(data, cPickle.HIGHEST_PROTOCOL)
+            self.loads = cPickle.loads
+
+    def thaw(self):
+        "Return a new copy of the object"
+        obj = copy.copy(self.template)
+        obj._raw_field_data, obj.extra_data, field_values = \
+            self.loads(self.data)
+        for name, value in field_values.iteritems():
+            setattr(obj, name, value)
+
+        return obj
+
+
+def is_deadline_error(error):
+    """Whether ``error`` was caused by the current thread's deadline rather
+    than by the request itself
+    """
+    if isinstance(error, DeadlineExceeded):
+        return True
+
+    current_deadline = get_deadline()
+    return current_deadline is not None and current_deadline.expired
+
+
 class ResourceEngine(object):
 
+    # GETs currently in flight, shared by every engine so concurrent
+    # identical requests can be coalesced. A request failing on its
+    # sender's deadline is sent again by the others
+    in_flight = SingleFlight(is_private_error=is_deadline_error)
+
     def __init__(self, model):
         self.model = model
         self._tmp_request_args = {}
@@ -20,27 +93,208 @@ class ResourceEngine(object):
 
         self.logger.info("Trying to hit %s" % full_url)
 
+        request = self.build_request(request_method, full_url, *args, **kwargs)
+        response = self.send_request(request)
+        response.request_method = request_method
+        response.request = request
+
+        for mw in reversed(self.model._meta['middleware']):
+            response = mw.handle_response(request, response)
+
+        return response
+
+    def build_request(self, request_method, full_url, *args, **kwargs):
+        """Construct the NapRequest this engine sends to ``full_url``, as
+        changed by the model's compression and request middleware
+        """
         request_args = self.get_request_args(kwargs)
+        timeout = self.get_timeout()
+        if timeout is not None and 'timeout' not in request_args:
+            request_args['timeout'] = timeout
 
         request = NapRequest(request_method, full_url, *args, **request_args)
 
+        compressor = self.model._meta['compression']
+        if compressor is not None:
+            bytes_saved = compressor.compress_request(request)
+            if bytes_saved:
+                self.logger.debug("Compression saved %s bytes" % bytes_saved)
+
         for mw in self.model._meta['middleware']:
             request = mw.handle_request(request)
 
-        resource_response = request.send()
-        response = NapResponse(
-            url=request.url,
-            status_code=resource_response.status_code,
-            headers=resource_response.headers,
-            content=resource_response.content,
-            request_method=request_method,
-        )
+        return request
 
-        for mw in reversed(self.model._meta['middleware']):
-            response = mw.handle_response(request, response)
+    def send_request(self, request):
+        """Send ``request`` with the model's transport. GET requests are
+        hedged if the model has a ``hedge_policy``
+        """
+        hedge_policy = self.model._meta['hedge_policy']
+        if hedge_policy is not None and request.method.upper() == 'GET':
+            return self.send_hedged(request, hedge_policy)
+
+        return self.send_with_retries(request)
+
+    def send_hedged(self, request, hedge_policy):
+        """Send ``request``, and an identical hedge request if it is slow to
+        answer. Both attempts run on the hedge policy's own worker pool. The
+        first successful response is returned
+        """
+        outcomes = Queue.Queue()
+
+        def send(attempt_request):
+            start = time.time()
+            try:
+                response = self.send_with_retries(attempt_request)
+                outcomes.put((response, None, time.time() - start))
+            except Exception as e:
+                outcomes.put((None, e, None))
+
+        def start_attempt():
+            attempt_request = copy.copy(request)
+            attempt_request.headers = request.headers.copy()
+            attempt_request.extra_kwargs = request.extra_kwargs.copy()
+
+            hedge_policy.workers.submit(send, attempt_request)
+
+        hedge_policy.record_request()
+        start_attempt()
+        attempts = 1
+        try:
+            outcome = outcomes.get(timeout=hedge_policy.get_delay())
+        except Queue.Empty:
+            if hedge_policy.allow_hedge():
+                self.logger.debug("Hedging request to %s" % request.url)
+                start_attempt()
+                attempts += 1
+            outcome = outcomes.get()
+
+        # an error only counts once every attempt has failed
+        for i in range(attempts - 1):
+            if outcome[1] is None:
+                break
+            outcome = outcomes.get()
+
+        response, error, elapsed = outcome
+        if error is not None:
+            raise error
+
+        hedge_policy.record_latency(elapsed)
+        return response
+
+    def send_with_retries(self, request):
+        """Send ``request`` with the model's transport, retrying failures
+        as allowed by the model's ``retry_policy``
+        """
+        transport = self.get_transport()
+        retry_policy = self.model._meta['retry_policy']
+        if retry_policy is None:
+            return self.send_once(transport, request)
+
+        retry_policy.record_request()
+        attempt = 0
+        while True:
+            try:
+                response = self.send_once(transport, request)
+                error = None
+            except retry_policy.retryable_errors as e:
+                response = None
+                error = e
+
+            if not retry_policy.should_retry(request.method, attempt,
+                    response=response, error=error):
+                if error is not None:
+                    raise error
+                return response
+
+            backoff = retry_policy.get_backoff(attempt, response=response)
+            current_deadline = get_deadline()
+            if current_deadline is not None and \
+                    backoff >= current_deadline.remaining():
+                if error is not None:
+                    raise error
+                return response
+
+            self.logger.info("Retrying %s in %.2f seconds" % (request.url, backoff))
+            retry_policy.sleep(backoff)
+            attempt += 1
+
+    def send_once(self, transport, request):
+        """Send ``request`` a single time, through the model's
+        ``circuit_breaker`` and ``rate_limiter`` if they are set
+        """
+        breaker = self.model._meta['circuit_breaker']
+        rate_limiter = self.model._meta['rate_limiter']
+        if breaker is None and rate_limiter is None:
+            self.apply_deadline(request)
+            return transport.send(request)
+
+        host = urlparse.urlsplit(request.url).netloc
+        # fail on a passed deadline before using up a half-open probe
+        self.apply_deadline(request)
+        if breaker is not None:
+            breaker.before_request(host)
+
+        try:
+            if rate_limiter is not None:
+                rate_limiter.acquire(host)
+                # the wait for the limiter used up some of the deadline
+                self.apply_deadline(request)
+
+            start = time.time()
+            response = transport.send(request)
+        except DeadlineExceeded:
+            # never sent, so the host isn't to blame
+            if breaker is not None:
+                breaker.release(host)
+            raise
+        except Exception:
+            if breaker is not None:
+                breaker.record(host, failed=True)
+            raise
+
+        elapsed = time.time() - start
+        if breaker is not None:
+            breaker.record(host, failed=breaker.is_failure(response, elapsed))
+        if rate_limiter is not None:
+            rate_limiter.update_from_response(host, response)
 
         return response
 
+    def get_timeout(self):
+        """The model's per-request timeout, if any. The ``requests`` version
+        nap supports takes a single timeout that bounds both connecting and
+        each read, so the larger of ``connect_timeout`` and ``read_timeout``
+        is used
+        """
+        timeouts = [
+            timeout for timeout in (
+                self.model._meta['connect_timeout'],
+                self.model._meta['read_timeout'],
+            )
+            if timeout is not None
+        ]
+        if not timeouts:
+            return None
+
+        return max(timeouts)
+
+    def apply_deadline(self, request):
+        """Shorten ``request``'s timeout to fit within the current deadline,
+        failing fast if the deadline has already passed
+        """
+        current_deadline = get_deadline()
+        if current_deadline is None:
+            return
+
+        remaining = current_deadline.remaining()
+        if remaining <= 0:
+            raise DeadlineExceeded(request.url)
+
+        timeout = request.extra_kwargs.get('timeout')
+        if timeout is None or timeout > remaining:
+            request.extra_kwargs['timeout'] = remaining
+
     # url methods
     def _generate_url(self, url_type='lookup', resource_obj=None, **kwargs):
         """Iterates through object's URL list to find an approrpiate match
@@ -138,6 +392,7 @@ class ResourceEngine(object):
         return self._generate_url(url_type='update', resource_obj=resource_obj, **kwargs)
 
     # access methods
+    @accepts_deadline
     def get(self, uri=None, skip_cache=False, **kwargs):
         """Issues a get request to the API. If ``uri`` is passed, will send a
         request directly to that URL. otherwise, attempt a lookup request.
@@ -152,6 +407,7 @@ class ResourceEngine(object):
 
         return self.lookup(skip_cache=skip_cache, **kwargs)
 
+    @accepts_deadline
     def lookup(self, skip_cache=False, **lookup_vars):
         """Creates a get request to the API to the first URL found based on
         ``lookup_vars``
@@ -162,30 +418,315 @@ class ResourceEngine(object):
         uri = self.get_lookup_url(**lookup_vars)
         return self.get_from_uri(uri, skip_cache=skip_cache)
 
+    @accepts_deadline
     def get_from_uri(self, url, skip_cache=False, *args, **kwargs):
         """instance method to perform all non-collection get requests
         """
         cleaned_url = handle_slash(url, self.model._meta['add_slash'])
+        response = self.cached_get(cleaned_url, skip_cache, *args, **kwargs)
+
+        return self.obj_from_get_response(response, cleaned_url)
 
+    def cached_get(self, url, skip_cache=False, *args, **kwargs):
+        """Get a response for ``url`` from the cache while it is fresh (or
+        may be served stale), and from the API otherwise. Callers validate
+        the response, and cache it once it is found valid
+        """
         if skip_cache:
             cached_response = None
         else:
-            cached_response = self.get_from_cache('GET', cleaned_url)
+            cached_response = self.get_from_cache('GET', url,
+                allow_stale=True)
 
-        if cached_response:
-            response = cached_response
-        else:
-            response = self._request('GET', cleaned_url, *args, **kwargs)
+        return self.get_response_for_cached(url, cached_response, skip_cache,
+            *args, **kwargs)
+
+    def get_response_for_cached(self, url, cached_response, skip_cache=False,
+            *args, **kwargs):
+        """Return ``cached_response``, the cached response for ``url`` (or
+        None), if it may be served. Otherwise get a new response, by
+        revalidating ``cached_response`` when it has validators
+        """
+        if cached_response and cached_response.is_fresh:
+            return cached_response
+
+        if cached_response and cached_response.can_serve_stale:
+            self.refresh_in_background(url, cached_response)
+            return cached_response
+
+        try:
+            if cached_response and cached_response.get_conditional_headers():
+                return self.revalidate(url, cached_response)
+
+            return self.get_response(url, skip_cache, *args, **kwargs)
+        except CircuitOpenError:
+            response = self.get_from_cache_when_open(url)
+            if not response:
+                raise
+
+            return response
+
+    def get_response(self, url, skip_cache=False, *args, **kwargs):
+        "Send a GET request to ``url``, coalescing it when possible"
+        if skip_cache or args or kwargs or self._tmp_request_args \
+                or not self.model._meta['coalesce_requests']:
+            return self._request('GET', url, *args, **kwargs)
 
-        self.validate_get_response(response)
-        self.handle_get_response(response)
+        return self.coalesced_request('GET', url)
+
+    def get_from_cache_when_open(self, url):
+        """Get a cached response for ``url`` after its circuit opened, if
+        the model's circuit breaker serves from cache
+        """
+        breaker = self.model._meta['circuit_breaker']
+        if not breaker.serve_from_cache:
+            return None
+
+        response = self.get_from_cache('GET', url, allow_stale=True)
+        if response and not response.is_fresh and \
+                not self.cache.allows_stale(response):
+            return None
+
+        return response
+
+    def coalesced_request(self, request_method, url):
+        """Send a request, unless an identical one is already in flight, in
+        which case wait for it and share its response
+        """
+        cache_key = self.cache.get_cache_key(
+            model=self.model,
+            url=self.get_full_url(url),
+        )
+        in_flight_key = (request_method, cache_key)
+        response, joined = self.in_flight.do(
+            in_flight_key, self._request, request_method, url
+        )
+        if joined:
+            self.logger.debug("Shared in-flight response for %s" % cache_key)
+
+            # The request's sender caches the response, so others don't
+            response = copy.copy(response)
+            response.use_cache = False
+
+        return response
+
+    def obj_from_get_response(self, response, url):
+        """Validate and handle a get response, returning a new object built
+        from it
+        """
+        try:
+            self.validate_get_response(response)
+        except InvalidStatusError:
+            self.cache_negative_response(response)
+            raise
+
+        # build the object first, so a response that can't be parsed is
+        # never handled (and cached), and is parsed only once
+        obj = self.parsed_obj_from_response(response)
+        self.handle_get_response(response,
+            getattr(obj, '_raw_field_data', None))
+
+        obj._full_url = url
+        obj._conditional_headers = get_conditional_headers(response.headers)
+        return obj
+
+    def parsed_obj_from_response(self, response):
+        """Build an object from a get ``response``. With the
+        ``cache_parsed_objects`` option, a frozen snapshot of the object is
+        kept on the response before it is cached. Responses with a snapshot
+        return a copy thawed from it, without parsing their content again
+        """
+        if response.parsed_object is not None:
+            return response.parsed_object.thaw()
 
-        # should this be handled by handle_get_response? i think probably.
         obj = self.obj_from_response(response)
+        if self.model._meta['cache_parsed_objects'] and response.use_cache:
+            response.parsed_object = self.freeze_obj(obj)
 
-        obj._full_url = cleaned_url
         return obj
 
+    def freeze_obj(self, resource_obj):
+        """A FrozenObject snapshot of ``resource_obj``, or None if its data
+        can't be serialized
+        """
+        mutable_field_names = [
+            field_name for field_name in self.model._meta['fields']
+            if not isinstance(getattr(resource_obj, field_name),
+                IMMUTABLE_TYPES)
+        ]
+        try:
+            return FrozenObject(resource_obj, mutable_field_names)
+        except (cPickle.PicklingError, TypeError):
+            return None
+
+    def revalidate(self, url, stale_response):
+        """Check whether ``stale_response`` is still current with a
+        conditional GET. A 304 answer refreshes the stale response's headers
+        (and, once it is cached again, its TTL) instead of downloading it
+        again
+        """
+        response = self.conditional_request(url,
+            stale_response.get_conditional_headers())
+        if response.status_code != 304:
+            return response
+
+        self.logger.debug("Revalidated cached response for %s" % url)
+        refreshed_response = copy.copy(stale_response)
+        refreshed_response.headers = self.merge_headers(
+            stale_response.headers, response.headers)
+        refreshed_response.use_cache = True
+        refreshed_response.expires_at = None
+        refreshed_response.stale_until = None
+
+        return refreshed_response
+
+    def refresh_in_background(self, url, stale_response):
+        """Refresh the cached ``stale_response`` for ``url`` on a worker
+        thread, unless a refresh of it is already under way
+        """
+        cache_key = self.cache.get_cache_key(
+            model=self.model,
+            url=self.get_full_url(url),
+        )
+        # registered before the refresh is queued, so stale hits made while
+        # it waits for a worker don't queue refreshes of their own
+        refresh_key = ('refresh', cache_key)
+        call = self.in_flight.reserve(refresh_key)
+        if call is None:
+            return None
+
+        engine = self.modify_request()
+        try:
+            return self.workers.submit(self.in_flight.run, refresh_key, call,
+                engine.refresh_cached_response, url, stale_response)
+        except Exception:
+            self.in_flight.release(refresh_key, call)
+            raise
+
+    def refresh_cached_response(self, url, stale_response):
+        """Fetch ``url`` again and cache the new response in place of
+        ``stale_response``. Errors are logged, leaving the stale response
+        cached until its stale window runs out
+        """
+        tag_versions = stale_response.tag_versions
+        if tag_versions:
+            tag_versions = self.cache.get_tag_versions(list(tag_versions.keys()))
+
+        # the refresh outlives the call that started it, and its deadline
+        with use_deadline(None):
+            try:
+                if stale_response.get_conditional_headers():
+                    response = self.revalidate(url, stale_response)
+                else:
+                    response = self._request('GET', url)
+                self.validate_get_response(response)
+            except Exception as e:
+                self.logger.warning("Refreshing %s failed: %s" % (url, e))
+                return None
+
+        response.tag_versions = tag_versions
+        self.cache_response(response)
+        return response
+
+    def conditional_request(self, url, conditional_headers):
+        "Send a GET request to ``url`` with additional conditional headers"
+        headers = self.get_request_args().get('headers', {}).copy()
+        headers.update(conditional_headers)
+
+        return self._request('GET', url, headers=headers)
+
+    def merge_headers(self, headers, new_headers):
+        merged_headers = copy.copy(headers)
+        merged_headers.update(new_headers)
+
+        return merged_headers
+
+    @accepts_deadline
+    def refresh(self, resource_obj):
+        """Re-fetch ``resource_obj``, conditionally when it was fetched with
+        an ETag or Last-Modified header. Returns a new object, or None if the
+        API answered that ``resource_obj`` has not been modified
+        """
+        url = resource_obj.full_url or self.get_lookup_url(resource_obj=resource_obj)
+        url = handle_slash(url, self.model._meta['add_slash'])
+
+        conditional_headers = getattr(resource_obj, '_conditional_headers', {})
+        response = self.conditional_request(url, conditional_headers)
+        if response.status_code == 304:
+            return None
+
+        return self.obj_from_get_response(response, url)
+
+    @accepts_deadline
+    def get_many(self, uris, skip_cache=False, max_workers=None):
+        """Get an object for each of ``uris`` concurrently. Cached responses
+        are fetched in a single cache call before any request is sent. Like
+        :meth:`get`, expired responses are revalidated and requests are
+        coalesced with identical ones in flight.
+
+        Returns a :class:`~nap.collection.BulkResult` in the order of
+        ``uris``. A failed get leaves ``None`` in the result and its
+        exception in the result's ``errors``.
+
+        :param uris: iterable of API uris
+        :param max_workers: maximum concurrent requests. Defaults to the
+            model's ``max_workers`` option
+        """
+        return self._get_many(list(uris), skip_cache=skip_cache,
+            max_workers=max_workers)
+
+    @accepts_deadline
+    def lookup_many(self, lookup_vars_list, skip_cache=False, max_workers=None):
+        """Like :meth:`get_many`, but looks up each object from a dictionary
+        of lookup variables, as :meth:`lookup` does
+
+        :param lookup_vars_list: iterable of dictionaries of lookup variables
+        """
+        uris = []
+        errors = {}
+        for index, lookup_vars in enumerate(lookup_vars_list):
+            try:
+                uris.append(self.get_lookup_url(**lookup_vars))
+            except ValueError as e:
+                uris.append(None)
+                errors[index] = e
+
+        return self._get_many(uris, errors=errors, skip_cache=skip_cache,
+            max_workers=max_workers)
+
+    def _get_many(self, uris, errors=None, skip_cache=False, max_workers=None):
+        add_slash = self.model._meta['add_slash']
+        cleaned_urls = [
+            handle_slash(uri, add_slash) if uri is not None else None
+            for uri in uris
+        ]
+        to_fetch = [url for url in cleaned_urls if url is not None]
+
+        if skip_cache:
+            cached_responses = {}
+        else:
+            cached_responses = self.get_many_from_cache('GET', to_fetch,
+                allow_stale=True)
+
+        def fetch(url):
+            # each request gets its own engine, as engines keep per-request
+            # state
+            engine = self.modify_request()
+            response = engine.get_response_for_cached(url,
+                cached_responses.get(url), skip_cache)
+
+            return engine.obj_from_get_response(response, url)
+
+        if max_workers is None:
+            max_workers = self.model._meta['max_workers']
+        fetched = iter(map_with_errors(fetch, to_fetch, max_workers))
+
+        pairs = [
+            next(fetched) if url is not None else (None, None)
+            for url in cleaned_urls
+        ]
+        return BulkResult.from_pairs(pairs, errors=errors)
+
     def validate_get_response(self, response):
         """Validate get response is valid to use for updating our object
         """
@@ -194,11 +735,14 @@ class ResourceEngine(object):
         if response.status_code not in self.model._meta['valid_get_status']:
             raise InvalidStatusError(self.model._meta['valid_get_status'], response)
 
-    def handle_get_response(self, response):
+    def handle_get_response(self, response, resource_data=None):
         """Handle any actions needed after a HTTP Response has ben validated
         for a get (get, refresh, lookup) action
+
+        :param resource_data: the response's already deserialized content
         """
-        resource_data = self.deserialize(response.content)
+        if resource_data is None:
+            resource_data = self.deserialize(response.content)
 
         self._raw_response_content = resource_data
         self.handle_response(response)
@@ -216,21 +760,34 @@ class ResourceEngine(object):
         url = self._generate_url(url_type='collection', **kwargs)
         return url
 
-    def all(self):
+    @accepts_deadline
+    def all(self, skip_cache=False):
         """Creates a get request to the API to the first collection URL with
         no parameters passed
         """
-        return self.filter()
+        return self.filter(skip_cache=skip_cache)
 
-    def filter(self, **lookup_vars):
+    @accepts_deadline
+    def filter(self, skip_cache=False, **lookup_vars):
         """
         Accesses the first URL set as a collections URL with no additional
         parameters passed. Returns a list of current ResourceModel objects
 
+        Collection responses are cached like any other GET, keyed by their
+        full URL, query string included.
+
+        :param skip_cache: fetch the collection from the API even if a
+            cached response exists
         :param lookup_vars: variables to pass to _generate_url
         """
         url = self.get_collection_url(**lookup_vars)
-        response = self._request('GET', url)
+        tag_versions = None
+        if self.model._meta['invalidate_on_write']:
+            # read before the request, so a purge made while it is in flight
+            # isn't lost
+            tag_versions = self.cache.get_tag_versions(
+                self.get_collection_tags())
+        response = self.cached_get(url, skip_cache)
 
         self.validate_collection_response(response)
 
@@ -254,8 +811,81 @@ class ResourceEngine(object):
                 raise ValueError('expected list of dictionaries')
 
         resource_list = [self.model(**obj_dict) for obj_dict in obj_list]
+        if self.model._meta['cache_collection_items'] and response.use_cache:
+            self.cache_collection_items(response, zip(obj_list, resource_list))
+        if tag_versions and response.use_cache:
+            response.tag_versions = tag_versions
+        self.handle_response(response)
+
         return ListWithAttributes(resource_list, extra_data)
 
+    def get_collection_tags(self):
+        """Tags collection responses are cached with. Purging either tag
+        invalidates them
+        """
+        return (
+            "resource::%s" % self.model._meta['resource_name'],
+            "model::%s.%s" % (self.model.__module__, self.model.__name__),
+        )
+
+    def purge_cache_tags(self, *tags):
+        "Invalidate every cached response tagged with any of ``tags``"
+        self.cache.purge_tags(tags)
+
+    def cache_collection_items(self, response, items):
+        """Cache each item of a collection ``response`` as if it had been
+        looked up on its own, so lookups right after a ``filter`` are served
+        from the cache
+
+        :param items: ``(field_data, resource_obj)`` pairs
+        """
+        item_responses = [
+            self.get_item_response(field_data, resource_obj, response.headers)
+            for field_data, resource_obj in items
+        ]
+        self.cache_responses([
+            item_response for item_response in item_responses
+            if item_response is not None
+        ])
+
+    def cache_item(self, field_data, resource_obj, headers):
+        """Cache ``field_data`` as the response to a lookup of
+        ``resource_obj``. Returns the cache key used, or None if
+        ``resource_obj`` has no lookup URL
+
+        :param headers: headers of the response ``field_data`` came from
+        """
+        item_response = self.get_item_response(field_data, resource_obj,
+            headers)
+        if item_response is None:
+            return None
+
+        self.cache_response(item_response)
+        return self.cache.get_cache_key(model=self.model,
+            url=item_response.url)
+
+    def get_item_response(self, field_data, resource_obj, headers):
+        """Build the response a lookup of ``resource_obj`` would get, holding
+        ``field_data``. Returns None if ``resource_obj`` has no lookup URL
+        """
+        lookup_url = self.get_canonical_lookup_url(resource_obj)
+        if not lookup_url:
+            return None
+
+        # validators of a collection or write response don't apply to the
+        # item on its own
+        item_headers = CaseInsensitiveDict(headers)
+        for header in ('etag', 'last-modified'):
+            item_headers.pop(header, None)
+
+        return NapResponse(
+            content=self.get_serializer().serialize(field_data),
+            url=lookup_url,
+            status_code=200,
+            headers=item_headers,
+            request_method='GET',
+        )
+
     def validate_collection_response(self, response):
         """Validate get response is valid to use for updating our object
         """
@@ -265,6 +895,7 @@ class ResourceEngine(object):
             raise InvalidStatusError(self.model._meta['valid_get_status'], response)
 
     # write methods
+    @accepts_deadline
     def update(self, resource_obj, **kwargs):
         """Sends a create request to the API, validating and handling any
         response received.
@@ -282,7 +913,11 @@ class ResourceEngine(object):
         )
 
         self.validate_update_response(response)
-        return self.handle_update_response(response)
+        obj = self.handle_update_response(response)
+        self.invalidate_cache(resource_obj, response, obj)
+        self.invalidate_negative_cache()
+
+        return obj
 
     def validate_update_response(self, response):
 
@@ -311,6 +946,7 @@ class ResourceEngine(object):
 
         return obj
 
+    @accepts_deadline
     def create(self, resource_obj, **kwargs):
         """Sends a create request to the API, validating and handling any
         response received.
@@ -325,8 +961,13 @@ class ResourceEngine(object):
         )
 
         self.validate_create_response(response)
-        return self.handle_create_response(response)
+        obj = self.handle_create_response(response)
+        self.invalidate_cache(resource_obj, response, obj)
+        self.invalidate_negative_cache()
+
+        return obj
 
+    @accepts_deadline
     def delete(self, resource_obj, **kwargs):
         """Sends a delete request to the API, validating and handling any
         response received.
@@ -339,6 +980,102 @@ class ResourceEngine(object):
 
         self.validate_delete_response(response)
         self.handle_delete_response(response)
+        self.invalidate_cache(resource_obj, response)
+
+    def invalidate_cache(self, resource_obj, response, obj=None):
+        """Drop cached responses that a write of ``resource_obj`` made
+        stale: its lookup, and, with ``invalidate_on_write``, every
+        collection of this resource. With ``write_through``, the object
+        returned by the write is cached instead of dropped
+
+        :param obj: the object built from the write's response, if any
+        """
+        if self.model._meta['invalidate_on_write']:
+            self.cache.purge_tags(self.get_collection_tags()[:1])
+
+        stale_keys = self.get_lookup_cache_keys(resource_obj, obj)
+        field_data = getattr(obj, '_raw_field_data', None)
+        if field_data is not None and self.model._meta['write_through']:
+            stale_keys.discard(
+                self.cache_item(field_data, obj, response.headers))
+
+        for cache_key in stale_keys:
+            self.cache.delete(cache_key)
+
+    def invalidate_negative_cache(self):
+        """Invalidate every cached "not found" lookup of this resource, as
+        a create or update may have made any of them exist, whatever URL
+        they were looked up with. Done even when writes don't otherwise
+        invalidate the cache
+        """
+        if not self.model._meta['negative_cache_timeout']:
+            return
+
+        self.cache.purge_tags([self.get_negative_cache_tag()])
+
+    def get_negative_cache_tag(self):
+        """Tag "not found" responses are cached with. Purging it invalidates
+        them all
+        """
+        return "not-found::%s" % self.model._meta['resource_name']
+
+    def get_lookup_cache_keys(self, *resource_objs):
+        """The set of lookup cache keys of ``resource_objs``, skipping any
+        that aren't objects, eg: None for a write with no response body
+        """
+        cache_keys = set([
+            self.get_lookup_cache_key(resource_obj)
+            for resource_obj in resource_objs
+            if getattr(resource_obj, '_raw_field_data', None) is not None
+        ])
+        cache_keys.discard(None)
+
+        return cache_keys
+
+    @accepts_deadline
+    def bulk_save(self, resource_objs, max_workers=None, **kwargs):
+        """Save many objects concurrently. Each object is created or updated
+        just as :meth:`~nap.resources.ResourceModel.save` would, including
+        updating its fields from the response when ``update_from_write``
+        is set.
+
+        Returns a :class:`~nap.collection.BulkResult` holding each saved
+        object in input order. Failed saves leave ``None`` in the result
+        and their exception (usually an ``InvalidStatusError``) in the
+        result's ``errors``.
+
+        :param resource_objs: iterable of ResourceModel objects
+        :param max_workers: maximum concurrent requests. Defaults to the
+            model's ``max_workers`` option
+        :param kwargs: keyword arguments passed to each object's ``save``
+        """
+        def save(resource_obj):
+            resource_obj.save(request_kwargs=self._tmp_request_args, **kwargs)
+            return resource_obj
+
+        return self._bulk_write(save, resource_objs, max_workers)
+
+    @accepts_deadline
+    def bulk_delete(self, resource_objs, max_workers=None, **kwargs):
+        """Delete many objects concurrently. Reports results the same way as
+        :meth:`bulk_save`
+
+        :param kwargs: keyword arguments passed to get_delete_url
+        """
+        def delete(resource_obj):
+            engine = self.modify_request()
+            engine.resolve(engine.delete(resource_obj, **kwargs))
+            resource_obj.resource_id = None
+            return resource_obj
+
+        return self._bulk_write(delete, resource_objs, max_workers)
+
+    def _bulk_write(self, write, resource_objs, max_workers=None):
+        if max_workers is None:
+            max_workers = self.model._meta['max_workers']
+
+        pairs = map_with_errors(write, resource_objs, max_workers)
+        return BulkResult.from_pairs(pairs)
 
     def validate_create_response(self, response):
 
@@ -424,8 +1161,10 @@ class ResourceEngine(object):
         Default handler for all response types. Ran as the last step in a
         request/response cycle
         """
-        self._tmp_request_args = {}
+        # cached before the temporary request args are cleared, since the
+        # response may vary on their headers
         self.cache_response(response)
+        self._tmp_request_args = {}
 
     def obj_from_response(self, response):
         """Update object's values to values of field_data
@@ -440,8 +1179,32 @@ class ResourceEngine(object):
 
         return obj
 
-    def get_from_cache(self, request_method, url):
-        # Handle caching, unless skipped
+    def get_canonical_lookup_url(self, resource_obj):
+        """The full URL a lookup of ``resource_obj`` is sent to, or None if
+        it has no lookup URL
+        """
+        try:
+            lookup_url = self.get_lookup_url(resource_obj=resource_obj)
+        except ValueError:
+            return None
+
+        lookup_url = handle_slash(lookup_url, self.model._meta['add_slash'])
+        return self.get_full_url(lookup_url)
+
+    def get_lookup_cache_key(self, resource_obj):
+        """The cache key a lookup of ``resource_obj`` is cached under, or
+        None if it has no lookup URL
+        """
+        lookup_url = self.get_canonical_lookup_url(resource_obj)
+        if not lookup_url:
+            return None
+
+        return self.cache.get_cache_key(model=self.model, url=lookup_url)
+
+    def get_from_cache(self, request_method, url, allow_stale=False):
+        """Get a cached response for ``url``. Expired responses kept for
+        revalidation are only returned when ``allow_stale`` is set
+        """
 
         if request_method not in self.model._meta['cached_methods']:
             return
@@ -452,32 +1215,274 @@ class ResourceEngine(object):
             url=full_url,
         )
         self.logger.debug("Trying to get cached response for %s" % cache_key)
-        cached_response = self.cache.get(cache_key)
+        cached_response = self.get_cached_value(cache_key, full_url)
         if cached_response:
+            if not allow_stale and not cached_response.is_fresh:
+                return None
+
+            if self.is_purged(cached_response):
+                return None
+
             self.logger.debug("Got cached response for %s" % cache_key)
 
             # Cached responses should not get re-cached to allow for
             # expected timeouts. Now that we've retrieved the cached
             # response, behave as if cache is turned off.
+            cached_response = copy.copy(cached_response)
             cached_response.use_cache = False
             return cached_response
 
+    def get_many_from_cache(self, request_method, urls, allow_stale=False):
+        """Get cached responses for many ``urls`` in a single cache call.
+        Returns a dictionary of url->response for urls that had one. Expired
+        responses are only returned when ``allow_stale`` is set
+        """
+        if request_method not in self.model._meta['cached_methods']:
+            return {}
+
+        full_urls = dict([(url, self.get_full_url(url)) for url in urls])
+        url_keys = dict([
+            (self.cache.get_cache_key(
+                model=self.model,
+                url=full_urls[url],
+            ), url)
+            for url in urls
+        ])
+        cached_responses = self.cache.get_many(list(url_keys.keys()))
+
+        # follow Vary markers to the variants matching our request headers
+        variant_keys = {}
+        for cache_key, value in cached_responses.items():
+            vary = self.cache.get_vary_from_marker(value)
+            if vary is not None:
+                del cached_responses[cache_key]
+                vary_headers = self.get_lookup_vary_headers(
+                    full_urls[url_keys[cache_key]])
+                if vary_headers is None:
+                    continue
+                variant_key = self.cache.get_variant_key(cache_key, vary,
+                    vary_headers)
+                variant_keys[variant_key] = cache_key
+
+        if variant_keys:
+            variants = self.cache.get_many(list(variant_keys.keys()))
+            for variant_key, value in variants.items():
+                cached_responses[variant_keys[variant_key]] = value
+
+        responses = {}
+        for cache_key, cached_response in cached_responses.items():
+            if cached_response and \
+                    (allow_stale or cached_response.is_fresh) and \
+                    not self.is_purged(cached_response):
+                # see get_from_cache
+                cached_response = copy.copy(cached_response)
+                cached_response.use_cache = False
+                responses[url_keys[cache_key]] = cached_response
+
+        return responses
+
+    def is_purged(self, cached_response):
+        "Whether one of the cache tags of ``cached_response`` was purged"
+        tag_versions = cached_response.tag_versions
+        return bool(tag_versions) and self.cache.is_purged(tag_versions)
+
+    @property
+    def workers(self):
+        worker_pool = self.model._meta['worker_pool']
+        if worker_pool is None:
+            worker_pool = default_worker_pool
+
+        return worker_pool
+
     def cache_response(self, response):
+        for cache_key, value, set_kwargs in self.get_cache_entries(response):
+            self.cache.set(cache_key, value, response=response, **set_kwargs)
+
+    def cache_responses(self, responses):
+        """Cache many ``responses``, with one cache call for all the entries
+        kept for the same time
+        """
+        values_by_timeout = {}
+        for response in responses:
+            for cache_key, value, set_kwargs in self.get_cache_entries(response):
+                timeout = set_kwargs.get('timeout')
+                if timeout is None:
+                    timeout = self.cache.get_storage_timeout(response)
+                values_by_timeout.setdefault(timeout, {})[cache_key] = value
+
+        for timeout, values in values_by_timeout.items():
+            self.cache.set_many(values, timeout=timeout)
+
+    def get_cache_entries(self, response):
+        """The ``(cache_key, value, set_kwargs)`` entries that cache
+        ``response``, if it is cached at all
+        """
         if response.request_method not in self.model._meta['cached_methods']\
                 or not response.use_cache:
-            return
+            return []
+
+        if not self.cache.is_cacheable(response):
+            return []
 
         cache_key = self.cache.get_cache_key(
             model=self.model,
             url=response.url,
         )
 
+        set_kwargs = {}
+        stale_window = self.get_stale_window(response)
+        if self.cache.stale_timeout or stale_window:
+            # expired responses will outlive their freshness, so keep track
+            # of when that is
+            timeout = self.cache.get_timeout(response)
+            response.expires_at = time.time() + timeout
+
+            if stale_window:
+                response.stale_until = response.expires_at + stale_window
+                if stale_window > self.cache.stale_timeout:
+                    set_kwargs['timeout'] = timeout + stale_window
+
+        storage_timeout = set_kwargs.get('timeout',
+            self.cache.get_storage_timeout(response))
+        if storage_timeout <= 0:
+            # stale on arrival, with nothing to revalidate it for
+            return []
+
+        return self.get_store_entries(cache_key, response, **set_kwargs)
+
+    def store_response(self, cache_key, response, **set_kwargs):
+        """Store ``response`` under ``cache_key``, or under the key of its
+        variant if it varies on request headers
+        """
+        for cache_key, value, set_kwargs in self.get_store_entries(
+                cache_key, response, **set_kwargs):
+            self.cache.set(cache_key, value, response=response, **set_kwargs)
+
+    def get_store_entries(self, cache_key, response, **set_kwargs):
+        """The ``(cache_key, value, set_kwargs)`` entries that store
+        ``response`` under ``cache_key``: the response itself, preceded by a
+        Vary marker if it varies on request headers
+        """
+        entries = []
+        vary = self.cache.get_vary(response)
+        if vary:
+            if response.request is not None:
+                vary_headers = self.get_vary_headers(response.request)
+            else:
+                # eg: a collection item, stored as its own lookup's response
+                vary_headers = self.get_lookup_vary_headers(response.url)
+            if vary_headers is None:
+                self.logger.debug("Not caching %s: it varies on credentials "
+                    "nap can't tell apart" % cache_key)
+                return []
+
+            entries.append(
+                (cache_key, self.cache.make_vary_marker(vary), set_kwargs))
+            cache_key = self.cache.get_variant_key(cache_key, vary,
+                vary_headers)
+
         # Cache backends are meant to possibly store more than just
         # NapResponse objects, so if future features need to cache
         # anything else it's possible.
-        # Thus, we pass response both as `value` and the response
-        # object
-        self.cache.set(cache_key, response, response=response)
+        # Thus, the response is both the `value` stored and the response
+        # passed to the backend
+        entries.append((cache_key, response, set_kwargs))
+        return entries
+
+    def get_vary_headers(self, request):
+        """The headers of ``request``, for picking the variant of a cached
+        response that varies on them. None if the request's ``auth`` can't
+        be told apart from other credentials
+        """
+        headers = CaseInsensitiveDict(request.headers)
+        if request.auth and 'authorization' not in headers:
+            # requests builds the header itself from the auth argument
+            credentials = self.get_auth_credentials(request.auth)
+            if credentials is None:
+                return None
+            headers['authorization'] = credentials
+
+        return headers
+
+    def get_auth_credentials(self, auth):
+        """A string identifying the credentials of a request's ``auth``,
+        the same for every request sent with them, or None if they can't be
+        read. Auth objects are often copied per request, so nothing may
+        depend on their identity
+        """
+        if isinstance(auth, (tuple, list)):
+            parts = ('basic',) + tuple(auth)
+        elif hasattr(auth, 'username') and hasattr(auth, 'password'):
+            # eg: requests' HTTPBasicAuth and HTTPDigestAuth
+            parts = (type(auth).__name__, auth.username, auth.password)
+        else:
+            return None
+
+        return '\n'.join(
+            part if isinstance(part, basestring) else str(part)
+            for part in parts
+        )
+
+    def get_lookup_vary_headers(self, full_url):
+        """The headers a GET of ``full_url`` would be sent with, after the
+        model's request middleware has run
+        """
+        return self.get_vary_headers(self.build_request('GET', full_url))
+
+    def get_cached_value(self, cache_key, full_url):
+        """Get the value cached under ``cache_key``, following a Vary marker
+        to the variant matching this engine's request headers for
+        ``full_url``
+        """
+        value = self.cache.get(cache_key)
+        vary = self.cache.get_vary_from_marker(value)
+        if vary is not None:
+            vary_headers = self.get_lookup_vary_headers(full_url)
+            if vary_headers is None:
+                return None
+            value = self.cache.get(self.cache.get_variant_key(cache_key, vary,
+                vary_headers))
+
+        return value
+
+    def cache_negative_response(self, response):
+        """Cache a "not found" get ``response`` for the model's
+        ``negative_cache_timeout``, so lookups of a missing object raise
+        again without a request
+        """
+        timeout = self.model._meta['negative_cache_timeout']
+        if not timeout or not response.use_cache or \
+                response.status_code not in self.model._meta['negative_cache_status'] or \
+                response.request_method not in self.model._meta['cached_methods']:
+            return
+
+        cache_key = self.cache.get_cache_key(
+            model=self.model,
+            url=response.url,
+        )
+        response.expires_at = time.time() + timeout
+        response.tag_versions = self.cache.get_tag_versions(
+            [self.get_negative_cache_tag()])
+        self.store_response(cache_key, response, timeout=timeout)
+
+    def get_stale_window(self, response):
+        """Seconds after ``response`` expires during which it is still
+        served while being refreshed in the background. Once the model's
+        ``stale_while_revalidate`` option is set, a ``stale-while-revalidate``
+        Cache-Control directive overrides it. Responses that must be
+        revalidated once stale have no window
+        """
+        default_window = self.model._meta['stale_while_revalidate']
+        if default_window is None or not self.cache.allows_stale(response):
+            return 0
+
+        if self.cache.obey_cache_headers:
+            header_window = \
+                self.cache.get_stale_while_revalidate_from_header(response)
+            if header_window is not None:
+                return header_window
+
+        return default_window
 
     @property
     def logger(self):
@@ -501,6 +1506,12 @@ class ResourceEngine(object):
 
         return request_args
 
+    def resolve(self, result):
+        """Return the final value of something returned by an access or write
+        method. Synchronous engines already return final values
+        """
+        return result
+
     def modify_request(self, **kwargs):
         new_eng = self.__class__(self.model)
         new_eng._tmp_request_args.update(self._tmp_request_args)
@@ -508,6 +1519,57 @@ class ResourceEngine(object):
 
         return new_eng
 
+    def warmup(self, connections=1, prime_cache=True, timeout=None):
+        """Get ready to serve traffic: resolve ``root_url``'s host, open
+        ``connections`` pooled connections to it and, if ``prime_cache`` is
+        set, fetch the model's ``warmup_urls`` into the cache.
+
+        Connections are opened with HEAD requests sent like any other
+        request, through the model's circuit breaker and rate limiter.
+
+        Returns a :class:`~nap.collection.BulkResult` of the objects fetched
+        from ``warmup_urls``
+
+        :param timeout: seconds each connection-opening request may take.
+            Defaults to the model's timeout, or ``WARMUP_TIMEOUT`` if it
+            has none
+        """
+        root_url = self.model._meta['root_url']
+        if not root_url:
+            raise ValueError("Nap requests require root_url to be defined")
+
+        if timeout is None:
+            timeout = self.get_timeout()
+        if timeout is None:
+            timeout = WARMUP_TIMEOUT
+
+        transport = self.get_transport()
+
+        def send(request):
+            request.extra_kwargs.setdefault('timeout', timeout)
+            return self.send_once(transport, request)
+
+        self.logger.info("Warming up %s" % root_url)
+        transport.warmup(root_url, connections, send=send)
+
+        warmup_urls = self.model._meta['warmup_urls']
+        if not prime_cache or not warmup_urls:
+            return BulkResult([])
+
+        return self.get_many(warmup_urls, skip_cache=True)
+
+    def get_transport(self):
+        """Return the transport used to send this model's requests. Defaults
+        to a RequestsTransport using the model's connection_pool
+        """
+        transport = self.model._meta['transport']
+        if transport is None:
+            transport = RequestsTransport(
+                session_pool=self.model._meta['connection_pool']
+            )
+
+        return transport
+
     @property
     def cache(self):
         return self.model._meta['cache_backend']
@@ -520,3 +1582,57 @@ class ResourceEngine(object):
 
         full_url = "%s%s" % (root_url, uri)
         return full_url
+
+
+class AsyncResourceEngine(ResourceEngine):
+
+    """
+    An engine whose access and write methods (get, lookup, get_from_uri,
+    filter, all, refresh, create, update and delete) return an ``AsyncResult`` right
+    away instead of blocking. Call ``.get()`` on the result to wait for the
+    object, or to re-raise any error.
+
+    The work runs on the model's ``worker_pool``, each call through its own
+    ``sync_engine_class`` instance, so many requests can be in flight against
+    the same model at once. Middleware and cache backends run on the worker
+    threads and need no changes.
+    """
+
+    sync_engine_class = ResourceEngine
+
+    def get_sync_engine(self):
+        engine = self.sync_engine_class(self.model)
+        engine._tmp_request_args.update(self._tmp_request_args)
+
+        return engine
+
+    def _submit(self, method_name, *args, **kwargs):
+        method = getattr(self.get_sync_engine(), method_name)
+        return self.workers.submit(method, *args, **kwargs)
+
+    def get(self, *args, **kwargs):
+        return self._submit('get', *args, **kwargs)
+
+    def lookup(self, *args, **kwargs):
+        return self._submit('lookup', *args, **kwargs)
+
+    def get_from_uri(self, *args, **kwargs):
+        return self._submit('get_from_uri', *args, **kwargs)
+
+    def filter(self, *args, **kwargs):
+        return self._submit('filter', *args, **kwargs)
+
+    def update(self, *args, **kwargs):
+        return self._submit('update', *args, **kwargs)
+
+    def create(self, *args, **kwargs):
+        return self._submit('create', *args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        return self._submit('delete', *args, **kwargs)
+
+    def refresh(self, *args, **kwargs):
+        return self._submit('refresh', *args, **kwargs)
+
+    def resolve(self, result):
+        return result.get()
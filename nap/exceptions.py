@@ -17,3 +17,21 @@ class EmptyResponseError(Exception):
 
 class DoesNotExist(Exception):
     pass
+
+
+class CircuitOpenError(Exception):
+
+    ERROR_MSG = "Circuit open for %s, request not sent"
+
+    def __init__(self, host):
+        self.host = host
+        super(CircuitOpenError, self).__init__(self.ERROR_MSG % host)
+
+
+class DeadlineExceeded(Exception):
+
+    ERROR_MSG = "Deadline exceeded before sending request to %s"
+
+    def __init__(self, url):
+        self.url = url
+        super(DeadlineExceeded, self).__init__(self.ERROR_MSG % (url,))
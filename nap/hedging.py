@@ -0,0 +1,71 @@
+import collections
+import threading
+
+from .concurrency import WorkerPool
+
+
+class HedgePolicy(object):
+
+    """
+    Sends a second, identical GET request when the first hasn't answered
+    within ``delay`` seconds, and uses whichever response arrives first.
+    The slower request can't be aborted mid-flight, so its response is
+    simply thrown away.
+
+    :param delay: seconds to wait before hedging. ``None`` uses the
+        ``percentile`` of recently observed latencies instead
+    :param percentile: latency percentile (0 to 100) used as the delay
+    :param min_delay: shortest delay, and the delay used until
+        ``min_samples`` latencies have been observed
+    :param min_samples: latencies needed before the percentile is used
+    :param sample_size: number of recent latencies kept
+    :param max_hedge_ratio: the most requests, as a fraction of all
+        requests, that may be hedged. Keeps the extra load bounded
+    :param max_workers: threads sending attempts. They are the policy's
+        own, so callers running on a model's ``worker_pool`` (eg: through
+        an ``AsyncResourceEngine``) never wait on the pool they run on
+    """
+
+    def __init__(self, delay=None, percentile=95, min_delay=0.05,
+            min_samples=20, sample_size=500, max_hedge_ratio=0.05,
+            max_workers=20):
+        self.workers = WorkerPool(size=max_workers)
+        self.delay = delay
+        self.percentile = percentile
+        self.min_delay = min_delay
+        self.min_samples = min_samples
+        self.max_hedge_ratio = max_hedge_ratio
+
+        self.requests = 0
+        self.hedges = 0
+        self.latencies = collections.deque(maxlen=sample_size)
+        self._lock = threading.Lock()
+
+    def record_latency(self, seconds):
+        with self._lock:
+            self.latencies.append(seconds)
+
+    def get_delay(self):
+        if self.delay is not None:
+            return self.delay
+
+        with self._lock:
+            latencies = sorted(self.latencies)
+
+        if len(latencies) < self.min_samples:
+            return self.min_delay
+
+        index = int(round(self.percentile / 100.0 * (len(latencies) - 1)))
+        return max(latencies[index], self.min_delay)
+
+    def record_request(self):
+        with self._lock:
+            self.requests += 1
+
+    def allow_hedge(self):
+        "Whether another hedge fits in ``max_hedge_ratio``. Counts it if so"
+        with self._lock:
+            if self.hedges + 1 > self.max_hedge_ratio * self.requests:
+                return False
+            self.hedges += 1
+            return True
@@ -1,8 +1,40 @@
+import cookielib
+import threading
+import time
+
 import requests
+from requests.adapters import HTTPAdapter
+
+
+def get_conditional_headers(headers):
+    """Build If-None-Match/If-Modified-Since request headers from a
+    response's ETag and Last-Modified ``headers``
+    """
+    conditional_headers = {}
+    etag = headers.get('etag')
+    if etag:
+        conditional_headers['If-None-Match'] = etag
+
+    last_modified = headers.get('last-modified')
+    if last_modified:
+        conditional_headers['If-Modified-Since'] = last_modified
+
+    return conditional_headers
 
 
 class NapResponse(object):
 
+    # set when the response is cached: the time it stops being fresh
+    expires_at = None
+    # the time an expired response stops being served while it is refreshed
+    stale_until = None
+    # versions of the cache tags the response was cached with
+    tag_versions = None
+    # a snapshot of the object built from the response, kept in memory only
+    parsed_object = None
+    # the NapRequest the response answers, kept in memory only
+    request = None
+
     def __init__(self, content, url, status_code,
             use_cache=None, headers=None, request_method=None):
         self.status_code = status_code
@@ -14,6 +46,17 @@ class NapResponse(object):
         self.headers = headers
         self.request_method = request_method
 
+    def __copy__(self):
+        response = self.__class__.__new__(self.__class__)
+        response.__dict__.update(self.__dict__)
+        return response
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state.pop('parsed_object', None)
+        state.pop('request', None)
+        return state
+
     @property
     def use_cache(self):
         """
@@ -26,6 +69,18 @@ class NapResponse(object):
     def use_cache(self, val):
         self._use_cache = val
 
+    @property
+    def is_fresh(self):
+        return self.expires_at is None or time.time() < self.expires_at
+
+    @property
+    def can_serve_stale(self):
+        "Whether the expired response may be served while it is refreshed"
+        return self.stale_until is not None and time.time() < self.stale_until
+
+    def get_conditional_headers(self):
+        return get_conditional_headers(self.headers)
+
 
 class NapRequest(object):
 
@@ -60,8 +115,13 @@ class NapRequest(object):
             raise ValueError("Invalid method")
         self._method = value
 
-    def send(self):
-        response = requests.request(self.method, self.url,
+    def send(self, session=None):
+        if session is not None:
+            send_request = session.request
+        else:
+            send_request = requests.request
+
+        response = send_request(self.method, self.url,
             data=self.data,
             headers=self.headers,
             auth=self.auth,
@@ -69,3 +129,78 @@ class NapRequest(object):
             **self.extra_kwargs)
 
         return response
+
+
+class NoCookiesPolicy(cookielib.DefaultCookiePolicy):
+
+    "Keeps no cookies, so calls sharing a pooled session share no state"
+
+    def set_ok(self, cookie, request):
+        return False
+
+
+class SessionPool(object):
+
+    """
+    Keeps one keep-alive ``requests.Session`` per key (usually the scheme
+    and host of a request url) so repeated requests reuse pooled connections
+    instead of paying for a new TCP/TLS handshake every time.
+
+    Pooled sessions never store cookies, so, like unpooled requests, each
+    request only sends the cookies passed to it.
+
+    :param pool_connections: number of per-host connection pools to cache
+    :param pool_maxsize: maximum connections kept open per host
+    :param pool_block: block when all ``pool_maxsize`` connections are busy
+    :param keep_alive: seconds a session is reused before being recycled.
+        ``None`` keeps sessions open until :meth:`close` is called
+    """
+
+    def __init__(self, pool_connections=10, pool_maxsize=10, pool_block=False,
+            keep_alive=None):
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self.pool_block = pool_block
+        self.keep_alive = keep_alive
+
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    def create_session(self):
+        session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=self.pool_connections,
+            pool_maxsize=self.pool_maxsize,
+            pool_block=self.pool_block,
+        )
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        session.cookies.set_policy(NoCookiesPolicy())
+
+        return session
+
+    def get_session(self, key):
+        now = time.time()
+        with self._lock:
+            session, created = self._sessions.get(key, (None, None))
+            if session is not None and self.keep_alive is not None \
+                    and now - created > self.keep_alive:
+                # other threads may still be sending requests through the
+                # old session, so it isn't closed: its connections close
+                # once it is no longer used
+                session = None
+
+            if session is None:
+                session = self.create_session()
+                self._sessions[key] = (session, now)
+
+        return session
+
+    def close(self):
+        "Close every pooled session. Safe to call at process shutdown"
+        with self._lock:
+            sessions = [session for (session, created) in self._sessions.values()]
+            self._sessions = {}
+
+        for session in sessions:
+            session.close()
@@ -0,0 +1,153 @@
+import threading
+import time
+
+from .deadline import get_deadline
+from .exceptions import DeadlineExceeded
+
+
+class TokenBucket(object):
+
+    """
+    Hands out ``rate`` tokens a second, saving up at most ``capacity``.
+    Callers that find the bucket empty reserve a future token and wait for
+    it, so bursts are spread out instead of rejected.
+    """
+
+    def __init__(self, rate, capacity):
+        self.default_rate = self.rate = float(rate)
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.time()
+        # when a slowed down rate goes back to ``default_rate``
+        self.slowed_until = None
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        if now <= self.updated:
+            return
+        elapsed = now - self.updated
+        self.tokens = min(self.tokens + elapsed * self.rate, self.capacity)
+        self.updated = now
+
+        if self.slowed_until is not None and now >= self.slowed_until:
+            self.rate = self.default_rate
+            self.slowed_until = None
+
+    def reserve(self):
+        "Take a token, returning the seconds to wait before using it"
+        with self._lock:
+            now = time.time()
+            self._refill(now)
+            self.tokens -= 1
+
+            wait = max(self.updated - now, 0)
+            if self.tokens < 0:
+                wait += -self.tokens / self.rate
+
+            return wait
+
+    def cancel(self):
+        "Give back a reserved token that won't be used"
+        with self._lock:
+            self.tokens = min(self.tokens + 1, self.capacity)
+
+    def slow_down(self, rate, until):
+        "Hand out no more than ``rate`` tokens a second until ``until``"
+        with self._lock:
+            self._refill(time.time())
+            self.rate = min(float(rate), self.default_rate)
+            self.slowed_until = until
+
+    def pause_until(self, timestamp):
+        "Hand out no tokens before ``timestamp``, and just one right at it"
+        with self._lock:
+            self.updated = max(self.updated, timestamp)
+            self.tokens = min(self.tokens, 1)
+
+
+class RateLimiter(object):
+
+    """
+    A client-side limit of ``rate`` requests a second per host, shared by
+    every thread (and model) using this limiter.
+
+    If ``respect_headers`` is set, ``X-RateLimit-Remaining`` and
+    ``X-RateLimit-Reset`` response headers slow the limiter down to spread
+    the remaining quota until the reset, and stop it entirely once the
+    quota is used up. The configured ``rate`` applies again once the quota
+    resets.
+
+    :param rate: requests allowed per second
+    :param burst: requests that may be sent back to back after a quiet
+        period. Defaults to ``rate``
+    :param respect_headers: adapt to upstream rate-limit headers
+    """
+
+    remaining_header = 'x-ratelimit-remaining'
+    reset_header = 'x-ratelimit-reset'
+
+    def __init__(self, rate, burst=None, respect_headers=True):
+        self.rate = rate
+        self.burst = burst or max(int(rate), 1)
+        self.respect_headers = respect_headers
+
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def get_bucket(self, key):
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = TokenBucket(self.rate, self.burst)
+
+        return bucket
+
+    def acquire(self, key):
+        """Block until a request to ``key`` may be sent. Raises
+        DeadlineExceeded right away if that is after the current deadline
+        """
+        bucket = self.get_bucket(key)
+        wait = bucket.reserve()
+        if wait <= 0:
+            return
+
+        current_deadline = get_deadline()
+        if current_deadline is not None and \
+                wait >= current_deadline.remaining():
+            bucket.cancel()
+            raise DeadlineExceeded(key)
+
+        self.sleep(wait)
+
+    def get_reset_time(self, reset_value, now):
+        reset = float(reset_value)
+        # Reset headers are either an epoch timestamp or seconds from now
+        if reset < 10 ** 9:
+            reset += now
+        return reset
+
+    def update_from_response(self, key, response):
+        if not self.respect_headers:
+            return
+
+        remaining = response.headers.get(self.remaining_header)
+        reset = response.headers.get(self.reset_header)
+        if remaining is None or reset is None:
+            return
+
+        try:
+            remaining = int(remaining)
+            now = time.time()
+            reset = self.get_reset_time(reset, now)
+        except ValueError:
+            return
+
+        bucket = self.get_bucket(key)
+        if remaining <= 0:
+            bucket.pause_until(reset)
+        else:
+            quota_rate = remaining / max(reset - now, 1.0)
+            bucket.slow_down(quota_rate, reset)
+
+    def sleep(self, seconds):
+        time.sleep(seconds)
@@ -106,7 +106,7 @@ class ResourceModel(object):
         """
         Shortcut function to force an update on an object
         """
-        obj = self.objects.update(self, **kwargs)
+        obj = self.objects.resolve(self.objects.update(self, **kwargs))
         if self._meta['update_from_write']:
             if not obj:
                 raise EmptyResponseError("Cannot update fields: "
@@ -114,7 +114,7 @@ class ResourceModel(object):
             self.update_fields(obj._raw_field_data)
 
     def delete(self, **kwargs):
-        self.objects.delete(self, **kwargs)
+        self.objects.resolve(self.objects.delete(self, **kwargs))
         self.resource_id = None
 
     def save(self, **kwargs):
@@ -124,10 +124,11 @@ class ResourceModel(object):
 
         request_kwargs = kwargs.pop('request_kwargs', {})
         update_url = self.objects.get_update_url(self)
+        engine = self.objects.modify_request(**request_kwargs)
         if self._saved or self.full_url or update_url:
-            obj = self.objects.modify_request(**request_kwargs).update(self, **kwargs)
+            obj = engine.resolve(engine.update(self, **kwargs))
         else:
-            obj = self.objects.modify_request(**request_kwargs).create(self, **kwargs)
+            obj = engine.resolve(engine.create(self, **kwargs))
 
         if self._meta['update_from_write']:
             if not obj:
@@ -135,6 +136,20 @@ class ResourceModel(object):
                     "update_from_write is True but no object was returned")
             self.update_fields(obj._raw_field_data)
 
+    def refresh(self):
+        """Re-fetch the object's field data from the API. Sends a
+        conditional request when possible, so an unchanged object is not
+        downloaded again. Returns True if the object changed
+        """
+        obj = self.objects.resolve(self.objects.refresh(self))
+        if obj is None:
+            return False
+
+        self.update_fields(obj._raw_field_data)
+        self._full_url = obj.full_url
+        self._conditional_headers = obj._conditional_headers
+        return True
+
     # utility methods
     def to_python(self, for_read=False):
         """Converts editable field data to a python dictionary
@@ -151,13 +166,7 @@ class ResourceModel(object):
 
     @property
     def cache_key(self):
-
-        # This really needs to be cleaned up
-        lookup_url = self.objects.get_lookup_url(self)
-        full_url = self.objects.get_full_url(lookup_url)
-        cache_key = self.objects.cache.get_cache_key(self.__class__, full_url)
-
-        return cache_key
+        return self.objects.get_lookup_cache_key(self)
 
     # properties
     @property
@@ -0,0 +1,125 @@
+import random
+import threading
+import time
+from email.utils import mktime_tz, parsedate_tz
+
+from requests.exceptions import ConnectionError, Timeout
+
+
+class RetryBudget(object):
+
+    """
+    Caps retries to a fraction of the requests sent, so retries can't
+    multiply load on an upstream that is already failing. Every request
+    deposits ``ratio`` tokens and every retry spends one.
+
+    :param ratio: retries allowed per request sent
+    :param initial: tokens available before any request is sent
+    :param max_tokens: the most tokens the budget can save up
+    """
+
+    def __init__(self, ratio=0.1, initial=10, max_tokens=100):
+        self.ratio = ratio
+        self.max_tokens = max_tokens
+        self.tokens = initial
+        self._lock = threading.Lock()
+
+    def deposit(self):
+        with self._lock:
+            self.tokens = min(self.tokens + self.ratio, self.max_tokens)
+
+    def withdraw(self):
+        with self._lock:
+            if self.tokens < 1:
+                return False
+            self.tokens -= 1
+            return True
+
+
+class RetryPolicy(object):
+
+    """
+    Decides whether, and how long after, a failed request is sent again.
+
+    :param max_retries: the most times a single request is retried
+    :param backoff_factor: base delay in seconds. The delay before retry
+        ``n`` (counting from 0) is ``backoff_factor * 2 ** n``
+    :param max_backoff: longest delay, in seconds, between attempts
+    :param jitter: pick a random delay between 0 and the computed backoff,
+        so clients don't retry in lockstep
+    :param status_codes: response status codes worth retrying
+    :param methods: HTTP methods safe to send more than once
+    :param respect_retry_after: wait as long as a response's
+        ``Retry-After`` header asks, up to ``max_backoff``
+    :param budget: an optional :class:`RetryBudget` shared by every request
+        using this policy
+    """
+
+    retryable_errors = (ConnectionError, Timeout)
+
+    def __init__(self, max_retries=3, backoff_factor=0.5, max_backoff=30,
+            jitter=True, status_codes=(429, 502, 503, 504),
+            methods=('GET', 'PUT', 'DELETE'), respect_retry_after=True,
+            budget=None):
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.max_backoff = max_backoff
+        self.jitter = jitter
+        self.status_codes = status_codes
+        self.methods = methods
+        self.respect_retry_after = respect_retry_after
+        self.budget = budget
+
+    def record_request(self):
+        if self.budget is not None:
+            self.budget.deposit()
+
+    def should_retry(self, method, attempt, response=None, error=None):
+        """Whether to retry after ``attempt`` (counting from 0) failed with
+        ``response`` or ``error``
+        """
+        if attempt >= self.max_retries:
+            return False
+
+        if method.upper() not in self.methods:
+            return False
+
+        if error is None and response.status_code not in self.status_codes:
+            return False
+
+        if self.budget is not None and not self.budget.withdraw():
+            return False
+
+        return True
+
+    def get_retry_after(self, response):
+        "Seconds to wait according to ``response``'s Retry-After header"
+        retry_after = response.headers.get('retry-after')
+        if not retry_after:
+            return None
+
+        try:
+            return max(int(retry_after), 0)
+        except ValueError:
+            pass
+
+        retry_date = parsedate_tz(retry_after)
+        if retry_date is None:
+            return None
+
+        return max(mktime_tz(retry_date) - time.time(), 0)
+
+    def get_backoff(self, attempt, response=None):
+        if self.respect_retry_after and response is not None:
+            retry_after = self.get_retry_after(response)
+            if retry_after is not None:
+                return min(retry_after, self.max_backoff)
+
+        backoff = min(self.backoff_factor * (2 ** attempt), self.max_backoff)
+        if self.jitter:
+            backoff = random.uniform(0, backoff)
+
+        return backoff
+
+    def sleep(self, seconds):
+        time.sleep(seconds)
@@ -0,0 +1,292 @@
+"""
+Transports send a :class:`~nap.http.NapRequest` over the wire (or not) and
+return a :class:`~nap.http.NapResponse`. A model picks its transport with
+the ``transport`` Meta option.
+"""
+import io
+import socket
+import sys
+import urllib
+import urlparse
+
+from requests.exceptions import ConnectionError, SSLError, Timeout
+from requests.structures import CaseInsensitiveDict
+
+try:
+    import urllib3
+except ImportError:
+    from requests.packages import urllib3
+
+from .compression import decompress
+from .concurrency import map_with_errors
+from .http import NapRequest, NapResponse
+
+
+class BaseTransport(object):
+
+    def send(self, request):
+        """Send ``request`` and return a NapResponse
+
+        :param request: a NapRequest object
+        """
+        raise NotImplementedError
+
+    def close(self):
+        "Release any resources (connections, sessions) held by the transport"
+        pass
+
+    def warmup(self, url, connections=1, send=None):
+        """Prepare to send requests to ``url``. By default, resolves its
+        host, so a host that can't be resolved fails at startup. Python
+        doesn't cache DNS lookups itself, so later requests only resolve it
+        faster if the system's resolver caches lookups
+
+        :param send: a function that sends a NapRequest, used by transports
+            that open connections ahead of time. Defaults to :meth:`send`
+        """
+        split_url = urlparse.urlsplit(url)
+        default_port = 443 if split_url.scheme == 'https' else 80
+        socket.getaddrinfo(split_url.hostname, split_url.port or default_port)
+
+    def open_connections(self, url, connections, send=None):
+        """Open up to ``connections`` pooled connections to ``url`` at once,
+        by sending HEAD requests through ``send``
+        """
+        if send is None:
+            send = self.send
+
+        def send_head(i):
+            return send(NapRequest('HEAD', url, allow_redirects=False))
+
+        results = map_with_errors(send_head, range(connections), connections)
+        errors = [error for (result, error) in results if error is not None]
+        if errors:
+            raise errors[0]
+
+
+class RequestsTransport(BaseTransport):
+
+    """
+    Sends requests with the ``requests`` library. If ``session_pool`` is
+    given, requests reuse a keep-alive session per host.
+
+    :param session_pool: an optional :class:`~nap.http.SessionPool`
+    """
+
+    def __init__(self, session_pool=None):
+        self.session_pool = session_pool
+
+    def get_session(self, request):
+        if self.session_pool is None:
+            return None
+
+        split_url = urlparse.urlsplit(request.url)
+        pool_key = "%s://%s" % (split_url.scheme, split_url.netloc)
+        return self.session_pool.get_session(pool_key)
+
+    def send(self, request):
+        response = request.send(session=self.get_session(request))
+        return NapResponse(
+            url=request.url,
+            status_code=response.status_code,
+            headers=response.headers,
+            content=response.content,
+            request_method=request.method,
+        )
+
+    def close(self):
+        if self.session_pool is not None:
+            self.session_pool.close()
+
+    def warmup(self, url, connections=1, send=None):
+        super(RequestsTransport, self).warmup(url, connections)
+        if self.session_pool is None:
+            # nothing to keep the connections in
+            return
+
+        self.open_connections(url, connections, send)
+
+
+class Urllib3Transport(BaseTransport):
+
+    """
+    Sends requests straight through a urllib3 ``PoolManager``, skipping the
+    session and hook machinery of ``requests``. Only tuple-style
+    ``(username, password)`` auth is supported, and of the other request
+    arguments, only ``timeout`` and ``allow_redirects``. urllib3 errors are
+    raised as the ``requests`` errors they correspond to, so retry policies
+    treat them the same way.
+
+    :param num_pools: number of per-host connection pools to cache
+    :param maxsize: maximum connections kept open per host
+    :param block: block when all ``maxsize`` connections are busy
+    """
+
+    def __init__(self, num_pools=10, maxsize=10, block=False, **pool_kwargs):
+        self.pool_manager = urllib3.PoolManager(
+            num_pools=num_pools,
+            maxsize=maxsize,
+            block=block,
+            **pool_kwargs
+        )
+
+    def get_headers(self, request):
+        headers = dict(request.headers)
+        if request.auth:
+            auth_headers = urllib3.util.make_headers(
+                basic_auth="%s:%s" % tuple(request.auth)
+            )
+            headers.update(auth_headers)
+
+        return headers
+
+    def get_urlopen_kwargs(self, request):
+        unsupported_args = sorted(
+            set(request.extra_kwargs) - set(['timeout', 'allow_redirects'])
+        )
+        if request.extra_args or unsupported_args:
+            raise TypeError("Urllib3Transport doesn't support request "
+                "arguments: %s" % (list(request.extra_args) + unsupported_args))
+
+        urlopen_kwargs = {}
+        if 'timeout' in request.extra_kwargs:
+            urlopen_kwargs['timeout'] = request.extra_kwargs['timeout']
+        if 'allow_redirects' in request.extra_kwargs:
+            urlopen_kwargs['redirect'] = request.extra_kwargs['allow_redirects']
+
+        return urlopen_kwargs
+
+    def urlopen(self, method, url, **kwargs):
+        "Call the pool manager's urlopen, raising errors as ``requests`` does"
+        try:
+            return self.pool_manager.urlopen(method, url, **kwargs)
+        except socket.error as e:
+            raise ConnectionError(e)
+        except urllib3.exceptions.MaxRetryError as e:
+            if isinstance(e.reason, urllib3.exceptions.TimeoutError):
+                raise Timeout(e)
+            raise ConnectionError(e)
+        except urllib3.exceptions.SSLError as e:
+            raise SSLError(e)
+        except urllib3.exceptions.TimeoutError as e:
+            raise Timeout(e)
+        except urllib3.exceptions.HTTPError as e:
+            raise ConnectionError(e)
+
+    def send(self, request):
+        response = self.urlopen(
+            request.method, request.url,
+            body=request.data,
+            headers=self.get_headers(request),
+            preload_content=True,
+            decode_content=True,
+            **self.get_urlopen_kwargs(request)
+        )
+        return NapResponse(
+            url=request.url,
+            status_code=response.status,
+            headers=CaseInsensitiveDict(response.headers),
+            content=response.data,
+            request_method=request.method,
+        )
+
+    def close(self):
+        self.pool_manager.clear()
+
+    def warmup(self, url, connections=1, send=None):
+        super(Urllib3Transport, self).warmup(url, connections)
+        self.open_connections(url, connections, send)
+
+
+class WSGITransport(BaseTransport):
+
+    """
+    Calls a WSGI application in-process instead of opening a socket. Useful
+    for measuring nap's own overhead and for load tests with no network.
+
+    :param app: a WSGI callable
+    :param script_name: the mount point of ``app``, stripped from request
+        paths before they are passed on
+    """
+
+    def __init__(self, app, script_name=''):
+        self.app = app
+        self.script_name = script_name.rstrip('/')
+
+    def get_environ(self, request):
+        split_url = urlparse.urlsplit(request.url)
+        default_port = '443' if split_url.scheme == 'https' else '80'
+
+        path = urllib.unquote(split_url.path)
+        if self.script_name and path.startswith(self.script_name):
+            path = path[len(self.script_name):]
+
+        body = request.data or ''
+        if isinstance(body, unicode):
+            body = body.encode('utf-8')
+
+        environ = {
+            'REQUEST_METHOD': request.method.upper(),
+            'SCRIPT_NAME': self.script_name,
+            'PATH_INFO': path,
+            'QUERY_STRING': split_url.query,
+            'SERVER_NAME': split_url.hostname or 'localhost',
+            'SERVER_PORT': str(split_url.port or default_port),
+            'SERVER_PROTOCOL': 'HTTP/1.1',
+            'CONTENT_LENGTH': str(len(body)),
+            'wsgi.version': (1, 0),
+            'wsgi.url_scheme': split_url.scheme or 'http',
+            'wsgi.input': io.BytesIO(body),
+            'wsgi.errors': sys.stderr,
+            'wsgi.multithread': True,
+            'wsgi.multiprocess': False,
+            'wsgi.run_once': False,
+        }
+
+        headers = dict(request.headers)
+        if request.auth:
+            headers.update(urllib3.util.make_headers(
+                basic_auth="%s:%s" % tuple(request.auth)
+            ))
+
+        for name, value in headers.items():
+            key = name.upper().replace('-', '_')
+            if key not in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+                key = 'HTTP_%s' % key
+            environ[key] = value
+
+        return environ
+
+    def send(self, request):
+        response_start = {}
+        # written by apps using the write callable, before their iterable
+        written = []
+
+        def start_response(status, response_headers, exc_info=None):
+            response_start['status'] = status
+            response_start['headers'] = response_headers
+            return written.append
+
+        app_iter = self.app(self.get_environ(request), start_response)
+        try:
+            content = ''.join(written + list(app_iter))
+        finally:
+            if hasattr(app_iter, 'close'):
+                app_iter.close()
+
+        status_code = int(response_start['status'].split(' ', 1)[0])
+        headers = CaseInsensitiveDict(response_start['headers'])
+        if content and 'content-encoding' in headers:
+            content = decompress(content, headers['content-encoding'])
+
+        return NapResponse(
+            url=request.url,
+            status_code=status_code,
+            headers=headers,
+            content=content,
+            request_method=request.method,
+        )
+
+    def warmup(self, url, connections=1, send=None):
+        "There is nothing to warm up for an in-process app"
+        pass
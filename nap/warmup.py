@@ -0,0 +1,21 @@
+from .collection import BulkResult
+from .concurrency import map_with_errors
+
+
+def warmup(models, connections=1, prime_cache=True, max_workers=10,
+        timeout=None):
+    """Warm up every model in ``models`` in parallel. See
+    :meth:`~nap.engine.ResourceEngine.warmup`
+
+    Returns a :class:`~nap.collection.BulkResult` holding each model's own
+    warmup result, with errors kept per model rather than raised
+    """
+    def warmup_model(model):
+        return model.objects.warmup(
+            connections=connections,
+            prime_cache=prime_cache,
+            timeout=timeout,
+        )
+
+    pairs = map_with_errors(warmup_model, models, max_workers)
+    return BulkResult.from_pairs(pairs)
@@ -0,0 +1,152 @@
+import json
+
+import mock
+import pytest
+
+from nap.breaker import Circuit, CircuitBreaker
+from nap.deadline import deadline
+from nap.exceptions import CircuitOpenError, DeadlineExceeded
+from nap.http import NapResponse
+
+from . import SampleResourceModel
+
+
+class TestCircuitBreaker(object):
+
+    def get_breaker(self, **kwargs):
+        defaults = {
+            'min_requests': 4,
+            'failure_threshold': 0.5,
+            'reset_timeout': 10,
+        }
+        defaults.update(kwargs)
+        return CircuitBreaker(**defaults)
+
+    def test_opens_on_failure_rate(self):
+        breaker = self.get_breaker()
+        for failed in (True, False, True):
+            breaker.record('foo.com', failed)
+        assert breaker.get_state('foo.com') == Circuit.CLOSED
+
+        breaker.record('foo.com', False)
+        assert breaker.get_state('foo.com') == Circuit.OPEN
+        assert breaker.get_state('bar.com') == Circuit.CLOSED
+
+        with pytest.raises(CircuitOpenError):
+            breaker.before_request('foo.com')
+        breaker.before_request('bar.com')
+
+    def test_half_open(self):
+        breaker = self.get_breaker(min_requests=1)
+        with mock.patch('time.time') as now:
+            now.return_value = 100
+            breaker.record('foo.com', True)
+
+            now.return_value = 111
+            breaker.before_request('foo.com')
+            assert breaker.get_state('foo.com') == Circuit.HALF_OPEN
+            with pytest.raises(CircuitOpenError):
+                breaker.before_request('foo.com')
+
+            breaker.record('foo.com', True)
+            assert breaker.get_state('foo.com') == Circuit.OPEN
+
+            now.return_value = 122
+            breaker.before_request('foo.com')
+            breaker.record('foo.com', False)
+            assert breaker.get_state('foo.com') == Circuit.CLOSED
+
+    def test_release(self):
+        breaker = self.get_breaker(min_requests=1)
+        with mock.patch('time.time') as now:
+            now.return_value = 100
+            breaker.record('foo.com', True)
+
+            now.return_value = 111
+            breaker.before_request('foo.com')
+            breaker.release('foo.com')
+            assert breaker.get_state('foo.com') == Circuit.HALF_OPEN
+            breaker.before_request('foo.com')
+
+    def test_is_failure(self):
+        breaker = self.get_breaker(slow_request_threshold=2)
+        ok = NapResponse('', 'foo.com', 200)
+        assert not breaker.is_failure(ok, 1)
+        assert breaker.is_failure(ok, 3)
+        assert breaker.is_failure(NapResponse('', 'foo.com', 503), 1)
+
+
+class TestEngineCircuitBreaker(object):
+
+    def setup_method(self, method):
+        self.breaker = CircuitBreaker(min_requests=1)
+        SampleResourceModel._meta['circuit_breaker'] = self.breaker
+
+    def teardown_method(self, method):
+        SampleResourceModel._meta['circuit_breaker'] = None
+
+    def test_fails_fast_when_open(self):
+        with mock.patch('requests.request') as request:
+            request.return_value = mock.Mock(status_code=503, content='')
+            SampleResourceModel.objects._request('GET', 'note/')
+            with pytest.raises(CircuitOpenError):
+                SampleResourceModel.objects._request('GET', 'note/')
+            assert request.call_count == 1
+
+    def test_serve_from_cache_when_open(self):
+        self.breaker.serve_from_cache = True
+        self.breaker.record('foo.com', True)
+        cached_response = NapResponse(
+            content=json.dumps({'title': 'cached'}),
+            url='xyz/',
+            status_code=200,
+            request_method='GET',
+        )
+        with mock.patch('nap.cache.base.BaseCacheBackend.get') as get:
+            get.return_value = cached_response
+            obj = SampleResourceModel.objects.get_from_uri('xyz', skip_cache=True)
+
+        assert obj.title == 'cached'
+
+    def test_no_cache_raises(self):
+        self.breaker.serve_from_cache = True
+        self.breaker.record('foo.com', True)
+        with pytest.raises(CircuitOpenError):
+            SampleResourceModel.objects.get_from_uri('xyz')
+
+    def open_then_half_open(self, now):
+        now.return_value = 100
+        self.breaker.record('foo.com', True)
+        now.return_value = 200
+
+    def test_expired_deadline_keeps_probe(self):
+        with mock.patch('time.time') as now:
+            self.open_then_half_open(now)
+            with deadline(-1):
+                with pytest.raises(DeadlineExceeded):
+                    SampleResourceModel.objects._request('GET', 'note/')
+
+            assert self.breaker.get_state('foo.com') == Circuit.OPEN
+            with mock.patch('requests.request') as request:
+                request.return_value = mock.Mock(status_code=200, content='')
+                SampleResourceModel.objects._request('GET', 'note/')
+            assert self.breaker.get_state('foo.com') == Circuit.CLOSED
+
+    def test_rate_limited_past_deadline_releases_probe(self):
+        rate_limiter = mock.Mock()
+        rate_limiter.acquire.side_effect = DeadlineExceeded('foo.com')
+        SampleResourceModel._meta['rate_limiter'] = rate_limiter
+        try:
+            with mock.patch('time.time') as now:
+                self.open_then_half_open(now)
+                with pytest.raises(DeadlineExceeded):
+                    SampleResourceModel.objects._request('GET', 'note/')
+
+                rate_limiter.acquire.side_effect = None
+                with mock.patch('requests.request') as request:
+                    request.return_value = mock.Mock(status_code=200,
+                        content='', headers={})
+                    SampleResourceModel.objects._request('GET', 'note/')
+                assert self.breaker.get_state('foo.com') == Circuit.CLOSED
+        finally:
+            SampleResourceModel._meta['rate_limiter'] = None
@@ -1,8 +1,20 @@
+import multiprocessing
+import os
+import pickle
+import shutil
+import tempfile
+
 import mock
 import pytest
 from . import SampleResourceModel
 
-from nap.cache.base import BaseCacheBackend, DEFAULT_TIMEOUT
+from nap.cache.base import (BaseCacheBackend, DEFAULT_TIMEOUT,
+    decode_response, encode_response, is_encoded_response)
+from nap.cache.disk import DiskCacheBackend
+from nap.cache.memory import MemoryCacheBackend
+from nap.cache.policy import FreshnessPolicy, parse_cache_control
+from nap.cache.tiered import TieredCacheBackend, TieredEntry
+from nap.http import NapResponse
 
 
 class TestBaseCacheBackend(object):
@@ -66,6 +78,45 @@ class TestBaseCacheBackend(object):
         timeout = cache_backend.get_timeout_from_header(mock_response)
         assert timeout == 2592000
 
+    def test_get_stale_while_revalidate_from_header(self):
+        cache_backend = self.get_backend()
+        mock_response = self.get_fake_response(headers={
+            'cache-control': 'max-age=60, stale-while-revalidate=30'
+        })
+        assert cache_backend.get_stale_while_revalidate_from_header(
+            mock_response) == 30
+
+        mock_response = self.get_fake_response(headers={
+            'cache-control': 'max-age=60'
+        })
+        assert cache_backend.get_stale_while_revalidate_from_header(
+            mock_response) is None
+
+    def test_get_timeout_without_max_age(self):
+        cache_backend = self.get_backend()
+        mock_response = self.get_fake_response(headers={
+            'cache-control': 'public'
+        })
+        assert cache_backend.get_timeout(mock_response) == DEFAULT_TIMEOUT
+
+        mock_response = self.get_fake_response(headers={
+            'cache-control': 'max-age=0'
+        })
+        assert cache_backend.get_timeout(mock_response) == 0
+
+    def test_variant_key(self):
+        cache_backend = self.get_backend()
+        marker = cache_backend.make_vary_marker(['accept-language'])
+        assert cache_backend.get_vary_from_marker(marker) == ['accept-language']
+        assert cache_backend.get_vary_from_marker('abc') is None
+
+        en_key = cache_backend.get_variant_key('key', ['accept-language'],
+            {'accept-language': 'en'})
+        fr_key = cache_backend.get_variant_key('key', ['accept-language'],
+            {'accept-language': 'fr'})
+        assert en_key.startswith('key::vary::')
+        assert en_key != fr_key
+
     def test_get_timeout(self):
         cache_backend = self.get_backend()
         mock_response = self.get_fake_response()
@@ -91,6 +142,182 @@ class TestBaseCacheBackend(object):
         assert timeout == 42
 
 
+    def test_get_storage_timeout(self):
+        cache_backend = self.get_backend(default_timeout=42, stale_timeout=100)
+        mock_response = self.get_fake_response()
+        assert cache_backend.get_storage_timeout(mock_response) == 142
+
+    def test_get_many(self):
+        cache_backend = self.get_backend()
+        with mock.patch.object(cache_backend, 'get') as get:
+            get.side_effect = lambda key: 'value' if key == 'a' else None
+            assert cache_backend.get_many(['a', 'b']) == {'a': 'value'}
+
+    def test_set_many(self):
+        cache_backend = self.get_backend()
+        with mock.patch.object(cache_backend, 'set') as cache_set:
+            cache_backend.set_many({'a': 'a value'}, timeout=42)
+            cache_set.assert_called_with('a', 'a value', timeout=42)
+
+
+def test_parse_cache_control():
+    assert parse_cache_control('public, Max-Age=60, no-cache="set-cookie"') == {
+        'public': None,
+        'max-age': '60',
+        'no-cache': 'set-cookie',
+    }
+    assert parse_cache_control(None) == {}
+
+
+class TestFreshnessPolicy(object):
+
+    def get_response(self, **headers):
+        return NapResponse('', 'http://www.foo.com/bar/', 200, headers=headers)
+
+    def get_lifetime(self, shared=False, **headers):
+        policy = FreshnessPolicy(shared=shared)
+        return policy.get_freshness_lifetime(self.get_response(**headers))
+
+    def test_max_age(self):
+        assert self.get_lifetime(**{'cache-control': 'public, max-age=60'}) == 60
+        assert self.get_lifetime(**{'cache-control': 'max-age=0'}) == 0
+        assert self.get_lifetime(**{'cache-control': 'public'}) is None
+        assert self.get_lifetime() is None
+
+    def test_s_maxage(self):
+        headers = {'cache-control': 'max-age=60, s-maxage=10'}
+        assert self.get_lifetime(**headers) == 60
+        assert self.get_lifetime(shared=True, **headers) == 10
+
+    def test_no_cache(self):
+        assert self.get_lifetime(**{'cache-control': 'no-cache, max-age=60'}) == 0
+
+    def test_expires(self):
+        headers = {
+            'date': 'Sun, 06 Nov 1994 08:49:37 GMT',
+            'expires': 'Sun, 06 Nov 1994 08:50:37 GMT',
+        }
+        assert self.get_lifetime(**headers) == 60
+        assert self.get_lifetime(expires='0') == 0
+
+        headers['cache-control'] = 'max-age=10'
+        assert self.get_lifetime(**headers) == 10
+
+    def test_age(self):
+        policy = FreshnessPolicy()
+        response = self.get_response(**{'cache-control': 'max-age=60'})
+        assert policy.get_time_to_live(response) == 60
+
+        response.headers['age'] = '20'
+        assert policy.get_time_to_live(response) == 40
+        response.headers['age'] = '60'
+        assert policy.get_time_to_live(response) == 0
+        response.headers['age'] = 'invalid'
+        assert policy.get_time_to_live(response) == 60
+
+        assert policy.get_time_to_live(self.get_response(age='20')) is None
+
+    def test_allows_stale(self):
+        policy = FreshnessPolicy()
+        shared_policy = FreshnessPolicy(shared=True)
+
+        response = self.get_response(**{'cache-control': 'max-age=60'})
+        assert policy.allows_stale(response)
+
+        for directive in ('no-cache', 'must-revalidate'):
+            response = self.get_response(**{'cache-control': directive})
+            assert not policy.allows_stale(response)
+
+        response = self.get_response(**{'cache-control': 'proxy-revalidate'})
+        assert policy.allows_stale(response)
+        assert not shared_policy.allows_stale(response)
+
+    def test_is_storable(self):
+        policy = FreshnessPolicy()
+        shared_policy = FreshnessPolicy(shared=True)
+
+        response = self.get_response(**{'cache-control': 'max-age=60'})
+        assert policy.is_storable(response)
+
+        response = self.get_response(**{'cache-control': 'no-store'})
+        assert not policy.is_storable(response)
+
+        response = self.get_response(**{'cache-control': 'private'})
+        assert policy.is_storable(response)
+        assert not shared_policy.is_storable(response)
+
+        response = self.get_response(vary='*')
+        assert not policy.is_storable(response)
+
+    def test_vary(self):
+        policy = FreshnessPolicy()
+        response = self.get_response(vary='Accept-Language, accept')
+        assert policy.get_vary(response) == ['accept', 'accept-language']
+
+        response = self.get_response(**{'cache-control': 'private'})
+        assert policy.get_vary(response) == ['authorization']
+
+
+class TestResponseEncoding(object):
+
+    def get_response(self, content='{"title": "a"}', **kwargs):
+        defaults = {
+            'url': 'http://www.foo.com/bar/',
+            'status_code': 200,
+            'request_method': 'GET',
+            'headers': {
+                'ETag': '"abc"',
+                'cache-control': 'max-age=10',
+                'x-request-id': '123',
+            },
+        }
+        defaults.update(kwargs)
+        return NapResponse(content, **defaults)
+
+    def test_round_trip(self):
+        response = self.get_response()
+        response.expires_at = 110.5
+        response.tag_versions = {'resource::note': 'abc'}
+
+        encoded = encode_response(response)
+        assert is_encoded_response(encoded)
+        decoded = decode_response(encoded)
+
+        assert decoded.content == response.content
+        assert decoded.url == response.url
+        assert decoded.status_code == 200
+        assert decoded.request_method == 'GET'
+        assert decoded.expires_at == 110.5
+        assert decoded.stale_until is None
+        assert decoded.tag_versions == {'resource::note': 'abc'}
+        assert decoded.headers['etag'] == '"abc"'
+        assert 'x-request-id' not in decoded.headers
+
+    def test_compression(self):
+        response = self.get_response('x' * 2000)
+        encoded = encode_response(response)
+        assert len(encoded) < 200
+        assert decode_response(encoded).content == 'x' * 2000
+
+        assert len(encode_response(response, compress_min_size=None)) > 2000
+
+    def test_unicode_content(self):
+        response = self.get_response(u'caf\xe9')
+        assert decode_response(encode_response(response)).content == u'caf\xe9'
+
+    def test_smaller_than_pickle(self):
+        response = self.get_response()
+        assert len(encode_response(response)) < len(pickle.dumps(response, 2))
+
+    def test_unknown_version(self):
+        encoded = encode_response(self.get_response())
+        assert decode_response(encoded[:3] + '\xff' + encoded[4:]) is None
+
+    def test_not_encoded(self):
+        assert not is_encoded_response('abc')
+        assert not is_encoded_response(self.get_response())
+
+
 class TestDjangoCacheBackend(TestBaseCacheBackend):
 
     def get_backend(self, **kwargs):
@@ -112,6 +339,57 @@ class TestDjangoCacheBackend(TestBaseCacheBackend):
             backend.get(res)
             assert dj_cache_get.called
 
+    def test_compact(self):
+        backend = self.get_backend(compact=True)
+        response = NapResponse('{}', 'http://www.foo.com/bar/', 200)
+        with mock.patch('django.core.cache.cache.set') as dj_cache_set:
+            backend.set('a', response, response=response)
+            assert is_encoded_response(dj_cache_set.call_args[0][1])
+
+        with mock.patch('django.core.cache.cache.get') as dj_cache_get:
+            dj_cache_get.return_value = dj_cache_set.call_args[0][1]
+            assert backend.get('a').content == '{}'
+
+    def test_compact_tiered_entries(self):
+        backend = self.get_backend(compact=True)
+        tiered = TieredCacheBackend(MemoryCacheBackend(), backend)
+        response = NapResponse('{}', 'http://www.foo.com/bar/', 200)
+        with mock.patch('django.core.cache.cache.set') as dj_cache_set:
+            tiered.set('a', response, response=response, timeout=60)
+
+        stored = dj_cache_set.call_args[0][1]
+        assert len(pickle.dumps(stored, 2)) < len(pickle.dumps(response, 2))
+
+        tiered.l1.clear()
+        with mock.patch('django.core.cache.cache.get') as dj_cache_get:
+            dj_cache_get.return_value = stored
+            assert tiered.get('a').content == '{}'
+        assert isinstance(tiered.l1.get('a'), TieredEntry)
+
+    def test_delete(self):
+        backend = self.get_backend()
+        with mock.patch('django.core.cache.cache.delete') as dj_delete:
+            backend.delete('a')
+            dj_delete.assert_called_with('a')
+
+    def test_get_many(self):
+        backend = self.get_backend()
+        with mock.patch('django.core.cache.cache.get_many') as dj_get_many:
+            dj_get_many.return_value = {'a': 'value'}
+            assert backend.get_many(['a', 'b']) == {'a': 'value'}
+            dj_get_many.assert_called_with(['a', 'b'])
+
+    def test_set_many(self):
+        backend = self.get_backend(compact=True)
+        response = NapResponse('{}', 'http://www.foo.com/bar/', 200)
+        with mock.patch('django.core.cache.cache.set_many') as dj_set_many:
+            backend.set_many({'a': response, 'b': 'value'}, timeout=42)
+
+        values, timeout = dj_set_many.call_args[0]
+        assert timeout == 42
+        assert is_encoded_response(values['a'])
+        assert values['b'] == 'value'
+
     def test_set(self):
 
         backend = self.get_backend()
@@ -122,3 +400,355 @@ class TestDjangoCacheBackend(TestBaseCacheBackend):
 
             backend.set(res)
             assert dj_cache_set.called
+
+
+class TestMemoryCacheBackend(TestBaseCacheBackend):
+
+    def get_backend(self, **kwargs):
+        defaults = {
+            'default_timeout': DEFAULT_TIMEOUT,
+            'obey_cache_headers': True,
+        }
+        defaults.update(kwargs)
+        return MemoryCacheBackend(**defaults)
+
+    def get_response(self, content='', **kwargs):
+        return NapResponse(content, 'http://www.foo.com/bar/', 200, **kwargs)
+
+    def test_get_set(self):
+        backend = self.get_backend()
+        response = self.get_response('{}')
+        assert backend.get('key') is None
+        backend.set('key', response, response=response)
+        assert backend.get('key') is response
+
+        assert backend.hits == 1
+        assert backend.misses == 1
+
+    def test_get_many(self):
+        backend = self.get_backend()
+        backend.set('a', 'value')
+        assert backend.get_many(['a', 'b']) == {'a': 'value'}
+
+    def test_expires(self):
+        backend = self.get_backend()
+        response = self.get_response(headers={'cache-control': 'max-age=10'})
+        with mock.patch('time.time') as now:
+            now.return_value = 100
+            backend.set('key', response, response=response)
+            now.return_value = 109
+            assert backend.get('key') is response
+            now.return_value = 110
+            assert backend.get('key') is None
+
+        assert len(backend) == 0
+        assert backend.total_bytes == 0
+
+    def test_lru_eviction_by_entries(self):
+        backend = self.get_backend(max_entries=2)
+        backend.set('a', 'a')
+        backend.set('b', 'b')
+        backend.get('a')
+        backend.set('c', 'c')
+
+        assert backend.get('b') is None
+        assert backend.get('a') == 'a'
+        assert backend.get('c') == 'c'
+        assert backend.evictions == 1
+
+    def test_eviction_by_bytes(self):
+        backend = self.get_backend(max_bytes=10)
+        backend.set('a', self.get_response('x' * 6))
+        backend.set('b', self.get_response('x' * 6))
+
+        assert backend.get('a') is None
+        assert backend.get('b') is not None
+        assert backend.total_bytes == 6
+
+        backend.set('c', self.get_response('x' * 11))
+        assert backend.get('c') is None
+        assert backend.get('b') is not None
+
+    def test_too_big_replacement_drops_old_value(self):
+        backend = self.get_backend(max_bytes=10)
+        backend.set('a', self.get_response('x' * 6))
+        backend.set('a', self.get_response('x' * 11))
+
+        assert backend.get('a') is None
+        assert backend.total_bytes == 0
+
+    def test_replace_and_delete(self):
+        backend = self.get_backend()
+        backend.set('a', 'xxx')
+        backend.set('a', 'xx')
+        assert backend.total_bytes == 2
+
+        backend.delete('a')
+        backend.delete('missing')
+        assert backend.get('a') is None
+        assert backend.total_bytes == 0
+
+    def test_clear(self):
+        backend = self.get_backend()
+        backend.set('a', 'a')
+        backend.clear()
+        assert len(backend) == 0
+
+    def test_tag_versions(self):
+        backend = self.get_backend()
+        tag_versions = backend.get_tag_versions(['a', 'b'])
+        assert backend.get_tag_versions(['a', 'b']) == tag_versions
+        assert not backend.is_purged(tag_versions)
+
+        backend.purge_tags(['b'])
+        assert backend.is_purged(tag_versions)
+        assert backend.get_tag_versions(['a'])['a'] == tag_versions['a']
+        assert backend.get_tag_versions(['b'])['b'] != tag_versions['b']
+
+
+def write_disk_entries(path, prefix):
+    backend = DiskCacheBackend(path, cull_interval=10)
+    for i in range(50):
+        backend.set('%s%s' % (prefix, i), 'value')
+
+
+class TestDiskCacheBackend(TestBaseCacheBackend):
+
+    def setup_method(self, method):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp_dir, 'cache.db')
+
+    def teardown_method(self, method):
+        shutil.rmtree(self.tmp_dir)
+
+    def get_backend(self, **kwargs):
+        defaults = {
+            'default_timeout': DEFAULT_TIMEOUT,
+            'obey_cache_headers': True,
+        }
+        defaults.update(kwargs)
+        return DiskCacheBackend(self.path, **defaults)
+
+    def test_get_set_response(self):
+        backend = self.get_backend()
+        response = NapResponse('{"a": 1}', 'http://www.foo.com/bar/', 200,
+            headers={'etag': '"abc"'})
+        assert backend.get('key') is None
+        backend.set('key', response, response=response)
+
+        cached_response = backend.get('key')
+        assert cached_response.content == '{"a": 1}'
+        assert cached_response.status_code == 200
+        assert cached_response.headers['etag'] == '"abc"'
+
+    def test_string_values(self):
+        backend = self.get_backend()
+        backend.set('tag', 'abc123')
+        backend.set('text', u'caf\xe9')
+        assert backend.get('tag') == 'abc123'
+        assert backend.get('text') == u'caf\xe9'
+
+        with pytest.raises(TypeError):
+            backend.set('key', {'a': 1})
+
+    def test_persists_across_backends(self):
+        self.get_backend().set('key', 'value')
+        assert self.get_backend().get('key') == 'value'
+
+    def test_get_many(self):
+        backend = self.get_backend()
+        backend.set('a', 'a value')
+        backend.set('b', 'b value')
+        assert backend.get_many(['a', 'b', 'c']) == {
+            'a': 'a value',
+            'b': 'b value',
+        }
+
+    def test_delete(self):
+        backend = self.get_backend()
+        backend.set('key', 'value')
+        backend.delete('key')
+        assert backend.get('key') is None
+
+    def test_expires(self):
+        backend = self.get_backend()
+        with mock.patch('time.time') as now:
+            now.return_value = 100
+            backend.set('key', 'value', timeout=10)
+            now.return_value = 109
+            assert backend.get('key') == 'value'
+            assert backend.get_many(['key']) == {'key': 'value'}
+            now.return_value = 110
+            assert backend.get('key') is None
+            assert backend.get_many(['key']) == {}
+            assert len(backend) == 0
+
+    def test_cull_expired(self):
+        backend = self.get_backend(cull_interval=2)
+        with mock.patch('time.time') as now:
+            now.return_value = 100
+            backend.set('a', 'value', timeout=10)
+            now.return_value = 120
+            backend.set('b', 'value', timeout=10)
+
+        assert backend.get_total_bytes() == 5
+
+    def test_evicts_soonest_to_expire(self):
+        backend = self.get_backend(max_bytes=10, cull_interval=1)
+        backend.set('a', 'x' * 4, timeout=30)
+        backend.set('b', 'x' * 4, timeout=10)
+        backend.set('c', 'x' * 4, timeout=20)
+
+        assert backend.get('a') is not None
+        assert backend.get('b') is None
+        assert backend.get('c') is not None
+        assert backend.get_total_bytes() == 8
+
+        # too big to ever fit
+        backend.set('d', 'x' * 11)
+        assert backend.get('d') is None
+
+    def test_too_big_replacement_drops_old_value(self):
+        backend = self.get_backend(max_bytes=10)
+        backend.set('key', 'x' * 4)
+        backend.set('key', 'x' * 11)
+        assert backend.get('key') is None
+        assert backend.get_total_bytes() == 0
+
+    def test_tiered_entries(self):
+        backend = self.get_backend()
+        backend.set('key', TieredEntry('value', 1234.5), timeout=10)
+
+        entry = backend.get('key')
+        assert isinstance(entry, TieredEntry)
+        assert entry.value == 'value'
+        assert backend.get_many(['key'])['key'].value == 'value'
+
+    def test_shared_by_processes(self):
+        processes = [
+            multiprocessing.Process(target=write_disk_entries,
+                args=(self.path, prefix))
+            for prefix in 'abc'
+        ]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+
+        assert [process.exitcode for process in processes] == [0, 0, 0]
+        assert len(self.get_backend()) == 150
+
+    def test_wal_mode(self):
+        backend = self.get_backend()
+        journal_mode, = backend.connection.execute(
+            'PRAGMA journal_mode').fetchone()
+        assert journal_mode == 'wal'
+
+
+class TestTieredCacheBackend(object):
+
+    def get_backend(self, **kwargs):
+        l1 = MemoryCacheBackend(default_timeout=10)
+        l2 = MemoryCacheBackend(default_timeout=100, stale_timeout=5)
+        return TieredCacheBackend(l1, l2, **kwargs)
+
+    def test_set_writes_both_tiers(self):
+        backend = self.get_backend(l1_timeout=30)
+        with mock.patch('time.time') as now:
+            now.return_value = 1000
+            backend.set('key', 'value')
+
+            now.return_value = 1029
+            assert backend.l1.get('key') is not None
+            now.return_value = 1030
+            assert backend.l1.get('key') is None
+            assert backend.get('key') == 'value'
+
+            now.return_value = 1105
+            assert backend.get('key') is None
+
+    def test_promotes_with_remaining_ttl(self):
+        backend = self.get_backend(l1_timeout=30)
+        with mock.patch('time.time') as now:
+            now.return_value = 1000
+            backend.set('key', 'value')
+            backend.l1.clear()
+
+            now.return_value = 1090
+            assert backend.get('key') == 'value'
+            assert backend.l1.get('key') is not None
+
+            # the promoted entry doesn't outlive the L2 entry
+            now.return_value = 1105
+            assert backend.l1.get('key') is None
+
+    def test_foreign_l2_values(self):
+        backend = self.get_backend()
+        backend.l2.set('key', 'value')
+        assert backend.get('key') == 'value'
+        assert backend.l1.get('key') is None
+
+    def test_get_many(self):
+        backend = self.get_backend()
+        backend.set('a', 'a value')
+        backend.set('b', 'b value')
+        backend.l1.delete('b')
+
+        assert backend.get_many(['a', 'b', 'c']) == {
+            'a': 'a value',
+            'b': 'b value',
+        }
+        assert backend.l1.get('b') is not None
+
+    def test_set_many(self):
+        backend = self.get_backend(l1_timeout=30)
+        with mock.patch('time.time') as now:
+            now.return_value = 1000
+            with mock.patch.object(backend.l2, 'set_many',
+                    wraps=backend.l2.set_many) as l2_set_many:
+                backend.set_many({'a': 'a value', 'b': 'b value'}, timeout=60)
+                assert l2_set_many.call_count == 1
+
+            now.return_value = 1030
+            assert backend.l1.get('a') is None
+            assert backend.get_many(['a', 'b']) == {
+                'a': 'a value',
+                'b': 'b value',
+            }
+            assert backend.l1.get('a').expires_at == 1060
+
+    def test_delete(self):
+        backend = self.get_backend()
+        backend.set('key', 'value')
+        backend.delete('key')
+        assert backend.l1.get('key') is None
+        assert backend.l2.get('key') is None
+
+    def test_timeouts_from_l2(self):
+        backend = self.get_backend()
+        assert backend.stale_timeout == 5
+        assert backend.get_timeout() == 100
+        assert backend.get_storage_timeout() == 105
+        assert backend.get_cache_key(SampleResourceModel, 'http://foo.com/') == \
+            'note::http://foo.com/'
+
+    def test_base_settings_from_l2(self):
+        backend = self.get_backend()
+        assert backend.default_timeout == 100
+        assert backend.obey_cache_headers
+        assert backend.policy is backend.l2.policy
+
+    def test_tag_versions_kept_in_l2(self):
+        backend = self.get_backend()
+        tag_versions = backend.get_tag_versions(['tag'])
+        assert len(backend.l1) == 0
+        assert backend.l2.get_tag_versions(['tag']) == tag_versions
+
+        # eg: another process's purge, with this process's l1 untouched
+        backend.l2.purge_tags(['tag'])
+        assert backend.is_purged(tag_versions)
+
+    def test_sizes_tracked_in_l1(self):
+        backend = self.get_backend()
+        backend.set('key', NapResponse('x' * 5, 'http://foo.com/', 200))
+        assert backend.l1.total_bytes == 5
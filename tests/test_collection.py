@@ -1,4 +1,4 @@
-from nap.collection import ListWithAttributes
+from nap.collection import BulkResult, ListWithAttributes
 
 
 class TestListWithAttributes(object):
@@ -15,4 +15,18 @@ class TestListWithAttributes(object):
         ed = {'some_data': 'Hello'}
         lwa = ListWithAttributes([1,2,3], extra_data=ed)
 
-        assert lwa.extra_data['some_data'] == ed['some_data']
\ No newline at end of file
+        assert lwa.extra_data['some_data'] == ed['some_data']
+
+class TestBulkResult(object):
+
+    def test_from_pairs(self):
+        error = ValueError('bad')
+        result = BulkResult.from_pairs([(1, None), (None, error), (3, None)])
+
+        assert result == [1, None, 3]
+        assert result.errors == {1: error}
+        assert result.successes == [1, 3]
+        assert not result.ok
+
+    def test_ok(self):
+        assert BulkResult([1, 2]).ok
@@ -0,0 +1,87 @@
+import gzip
+import io
+import json
+import zlib
+
+import mock
+import pytest
+
+from nap.compression import Compressor, compress, decompress
+from nap.http import NapRequest
+
+from . import SampleResourceModel
+
+
+def test_compress_roundtrip():
+    data = 'nap ' * 100
+    for encoding in ('gzip', 'deflate'):
+        compressed = compress(data, encoding)
+        assert len(compressed) < len(data)
+        assert decompress(compressed, encoding) == data
+
+    with pytest.raises(ValueError):
+        compress(data, 'br')
+
+
+def test_decompress():
+    data = 'nap ' * 100
+    gzip_file = io.BytesIO()
+    with gzip.GzipFile(fileobj=gzip_file, mode='wb') as f:
+        f.write(data)
+    assert decompress(gzip_file.getvalue(), 'gzip') == data
+
+    raw_deflate = zlib.compressobj(6, zlib.DEFLATED, -zlib.MAX_WBITS)
+    raw_data = raw_deflate.compress(data) + raw_deflate.flush()
+    assert decompress(raw_data, 'deflate') == data
+
+    assert decompress(data, 'identity') == data
+
+
+class TestCompressor(object):
+
+    def test_compress_request(self):
+        compressor = Compressor(min_size=100)
+        data = json.dumps({'content': 'nap ' * 100})
+        request = NapRequest('POST', 'http://foo.com/', data=data)
+
+        bytes_saved = compressor.compress_request(request)
+
+        assert bytes_saved > 0
+        assert request.headers['Content-Encoding'] == 'gzip'
+        assert request.headers['Accept-Encoding'] == 'gzip, deflate'
+        assert decompress(request.data, 'gzip') == data
+        assert compressor.bytes_saved == bytes_saved
+        assert compressor.bytes_in == len(data)
+
+    def test_small_request_not_compressed(self):
+        compressor = Compressor(min_size=100)
+        request = NapRequest('POST', 'http://foo.com/', data='{}')
+
+        assert compressor.compress_request(request) == 0
+        assert request.data == '{}'
+        assert 'Content-Encoding' not in request.headers
+        assert request.headers['Accept-Encoding'] == 'gzip, deflate'
+
+    def test_already_encoded(self):
+        compressor = Compressor(min_size=1, accept_encoding=None)
+        request = NapRequest('POST', 'http://foo.com/', data='nap ' * 100,
+            headers={'content-encoding': 'br'})
+
+        assert compressor.compress_request(request) == 0
+        assert 'Accept-Encoding' not in request.headers
+
+    def test_engine_compresses(self):
+        SampleResourceModel._meta['compression'] = Compressor(min_size=10)
+        obj = SampleResourceModel(content='nap ' * 100)
+        try:
+            with mock.patch('requests.request') as request:
+                request.return_value = mock.Mock(status_code=201, content='',
+                    headers={})
+                SampleResourceModel.objects.create(obj)
+                kwargs = request.call_args[1]
+        finally:
+            SampleResourceModel._meta['compression'] = None
+
+        assert kwargs['headers']['Content-Encoding'] == 'gzip'
+        data = json.loads(decompress(kwargs['data'], 'gzip'))
+        assert data['content'] == obj.content
@@ -0,0 +1,162 @@
+import threading
+import time
+
+import pytest
+
+from nap.concurrency import SingleFlight, WorkerPool, map_with_errors
+from nap.deadline import deadline
+from nap.exceptions import DeadlineExceeded
+
+
+class TestWorkerPool(object):
+
+    def test_submit(self):
+        workers = WorkerPool(size=2)
+        result = workers.submit(lambda x, y=1: x + y, 1, y=2)
+        assert result.get(timeout=5) == 3
+        workers.close()
+
+    def test_submit_raises(self):
+        workers = WorkerPool(size=2)
+
+        def fail():
+            raise ValueError('fail')
+
+        result = workers.submit(fail)
+        with pytest.raises(ValueError):
+            result.get(timeout=5)
+        workers.close()
+
+    def test_lazy_start_and_restart(self):
+        workers = WorkerPool(size=2)
+        assert workers._pool is None
+        workers.close()
+        assert workers.submit(lambda: 1).get(timeout=5) == 1
+        workers.close()
+        assert workers._pool is None
+
+
+def test_map_with_errors():
+    def invert(x):
+        return 1.0 / x
+
+    pairs = map_with_errors(invert, [1, 0, 2], max_workers=2)
+    assert pairs[0] == (1.0, None)
+    assert pairs[1][0] is None
+    assert isinstance(pairs[1][1], ZeroDivisionError)
+    assert pairs[2] == (0.5, None)
+
+    assert map_with_errors(invert, []) == []
+
+
+class TestSingleFlight(object):
+
+    def test_concurrent_calls_share_result(self):
+        single_flight = SingleFlight()
+        release = threading.Event()
+        calls = []
+
+        def slow_call():
+            calls.append(1)
+            release.wait(5)
+            return 'result'
+
+        workers = WorkerPool(size=5)
+        results = [
+            workers.submit(single_flight.do, 'key', slow_call)
+            for i in range(5)
+        ]
+        # wait until the first call is in flight
+        while len(single_flight._calls) == 0:
+            pass
+        release.set()
+
+        pairs = [r.get(timeout=5) for r in results]
+        workers.close()
+
+        assert set(result for (result, joined) in pairs) == set(['result'])
+        assert len(calls) + sum(joined for (result, joined) in pairs) == 5
+        assert len([joined for (result, joined) in pairs if not joined]) == len(calls)
+
+    def test_sequential_calls_not_shared(self):
+        single_flight = SingleFlight()
+        assert single_flight.do('key', lambda: 1) == (1, False)
+        assert single_flight.do('key', lambda: 2) == (2, False)
+
+    def test_error_raised(self):
+        single_flight = SingleFlight()
+
+        def fail():
+            raise ValueError('fail')
+
+        with pytest.raises(ValueError):
+            single_flight.do('key', fail)
+        assert single_flight._calls == {}
+
+    def fail_with_follower(self, single_flight, error):
+        """Make a call for 'key' that fails with ``error`` once another
+        caller has joined it. Returns the joining caller's AsyncResult
+        """
+        follower_waiting = threading.Event()
+        workers = WorkerPool(size=1)
+        followers = []
+
+        def leader_call():
+            call = single_flight._calls['key']
+            wait = call.done.wait
+
+            def signaling_wait(*args):
+                follower_waiting.set()
+                return wait(*args)
+
+            call.done.wait = signaling_wait
+            followers.append(
+                workers.submit(single_flight.do, 'key', lambda: 'own'))
+            follower_waiting.wait(5)
+            raise error
+
+        with pytest.raises(type(error)):
+            single_flight.do('key', leader_call)
+
+        workers.close()
+        return followers[0]
+
+    def test_private_error_not_shared(self):
+        single_flight = SingleFlight(
+            is_private_error=lambda e: isinstance(e, KeyError))
+        follower = self.fail_with_follower(single_flight, KeyError('leader'))
+        assert follower.get(timeout=5) == ('own', False)
+
+    def test_shared_error_raised_by_followers(self):
+        single_flight = SingleFlight(
+            is_private_error=lambda e: isinstance(e, KeyError))
+        follower = self.fail_with_follower(single_flight, ValueError('all'))
+        with pytest.raises(ValueError):
+            follower.get(timeout=5)
+
+    def test_reserve_and_run(self):
+        single_flight = SingleFlight()
+        call = single_flight.reserve('key')
+        assert single_flight.reserve('key') is None
+
+        workers = WorkerPool(size=1)
+        joined = workers.submit(single_flight.do, 'key', lambda: 'own')
+        assert single_flight.run('key', call, lambda: 'reserved') == 'reserved'
+        assert joined.get(timeout=5) in [('reserved', True), ('own', False)]
+        workers.close()
+
+        assert single_flight._calls == {}
+        assert single_flight.reserve('key') is not None
+
+    def test_joined_wait_bounded_by_deadline(self):
+        single_flight = SingleFlight()
+        call = single_flight.reserve('key')
+
+        start = time.time()
+        with deadline(0.1):
+            with pytest.raises(DeadlineExceeded):
+                single_flight.do('key', lambda: 'own')
+        assert time.time() - start < 1
+
+        single_flight.release('key', call)
+        assert single_flight._calls == {}
@@ -0,0 +1,139 @@
+import threading
+import time
+
+import mock
+import pytest
+
+from nap.concurrency import WorkerPool, map_with_errors
+from nap.deadline import (Deadline, accepts_deadline, carry_deadline,
+    deadline, get_deadline)
+from nap.exceptions import DeadlineExceeded
+from nap.retry import RetryPolicy
+
+from . import SampleResourceModel
+
+
+class TestDeadline(object):
+
+    def test_remaining(self):
+        with mock.patch('time.time') as now:
+            now.return_value = 100
+            d = Deadline(5)
+            now.return_value = 103
+            assert d.remaining() == 2
+            assert not d.expired
+            now.return_value = 105
+            assert d.expired
+
+    def test_scope(self):
+        assert get_deadline() is None
+        with deadline(10) as outer:
+            assert get_deadline() is outer
+            with deadline(100) as inner:
+                # nested deadlines can't extend the outer one
+                assert inner is outer
+            with deadline(1) as inner:
+                assert inner is not outer
+                assert get_deadline() is inner
+            assert get_deadline() is outer
+        assert get_deadline() is None
+
+    def test_accepts_deadline(self):
+
+        @accepts_deadline
+        def get_current():
+            return get_deadline()
+
+        assert get_current() is None
+        assert get_current(deadline=5).remaining() <= 5
+
+    def test_carry_deadline(self):
+        results = []
+
+        def worker():
+            results.append(get_deadline())
+
+        with deadline(5) as current:
+            thread = threading.Thread(target=carry_deadline(worker))
+            thread.start()
+            thread.join()
+
+        assert results == [current]
+
+    def test_worker_threads_inherit_deadline(self):
+        workers = WorkerPool(size=2)
+        with deadline(5) as current:
+            result = workers.submit(get_deadline)
+            pairs = map_with_errors(lambda x: get_deadline(), [1, 2])
+
+        assert result.get(timeout=5) is current
+        assert pairs == [(current, None), (current, None)]
+        workers.close()
+
+
+class TestEngineTimeouts(object):
+
+    def teardown_method(self, method):
+        SampleResourceModel._meta['connect_timeout'] = None
+        SampleResourceModel._meta['read_timeout'] = None
+        SampleResourceModel._meta['retry_policy'] = None
+
+    def get_response(self):
+        return mock.Mock(status_code=200, content='[]', headers={})
+
+    def test_meta_timeouts(self):
+        SampleResourceModel._meta['connect_timeout'] = 2
+        SampleResourceModel._meta['read_timeout'] = 5
+        with mock.patch('requests.request') as request:
+            request.return_value = self.get_response()
+            SampleResourceModel.objects.filter()
+            assert request.call_args[1]['timeout'] == 5
+
+    def test_deadline_shortens_timeout(self):
+        SampleResourceModel._meta['read_timeout'] = 30
+        with mock.patch('requests.request') as request:
+            request.return_value = self.get_response()
+            SampleResourceModel.objects.filter(deadline=3)
+            assert request.call_args[1]['timeout'] <= 3
+
+    def test_all_accepts_deadline(self):
+        SampleResourceModel._meta['read_timeout'] = 30
+        with mock.patch('requests.request') as request:
+            request.return_value = self.get_response()
+            SampleResourceModel.objects.all(deadline=3)
+            assert request.call_args[1]['timeout'] <= 3
+
+    def test_joined_request_bounded_by_deadline(self):
+        engine = SampleResourceModel.objects
+        cache_key = engine.cache.get_cache_key(model=SampleResourceModel,
+            url=engine.get_full_url('note/1/'))
+        # another caller's request for the same URL, still in flight
+        in_flight_key = ('GET', cache_key)
+        call = engine.in_flight.reserve(in_flight_key)
+        try:
+            start = time.time()
+            with pytest.raises(DeadlineExceeded):
+                engine.get('note/1/', deadline=0.1)
+            assert time.time() - start < 1
+        finally:
+            engine.in_flight.release(in_flight_key, call)
+
+    def test_deadline_exceeded(self):
+        with mock.patch('requests.request') as request:
+            with deadline(-1):
+                with pytest.raises(DeadlineExceeded):
+                    SampleResourceModel.objects.filter()
+            assert not request.called
+
+    def test_no_retry_past_deadline(self):
+        policy = RetryPolicy(backoff_factor=10, jitter=False)
+        SampleResourceModel._meta['retry_policy'] = policy
+        with mock.patch('requests.request') as request:
+            request.return_value = mock.Mock(status_code=503, content='',
+                headers={})
+            with mock.patch.object(policy, 'sleep') as sleep:
+                with deadline(5):
+                    response = SampleResourceModel.objects._request('GET', 'note/')
+                assert not sleep.called
+
+        assert response.status_code == 503
@@ -1,13 +1,20 @@
 import json
+import threading
+import time
 import unittest
 
 import pytest
 import mock
+from requests.auth import HTTPBasicAuth
 
 import nap
+from nap.auth import HttpAuthorization
+from nap.cache.memory import MemoryCacheBackend
+from nap.concurrency import WorkerPool
+from nap.deadline import deadline
+from nap.engine import AsyncResourceEngine, ResourceEngine, is_deadline_error
+from nap.exceptions import DeadlineExceeded, InvalidStatusError
 from nap.http import NapResponse
-from nap.engine import ResourceEngine
-from nap.exceptions import InvalidStatusError
 
 from . import SampleResourceModel
 
@@ -23,6 +30,7 @@ class BaseResourceModelTest(object):
         default_kwargs = {
             'status_code': 200,
             'content': '',
+            'headers': {},
         }
         default_kwargs.update(kwargs)
         r = mock.Mock(**default_kwargs)
@@ -94,6 +102,7 @@ class TestResourceEngineAccessMethods(BaseResourceModelTest):
             expected_url = "xyz/"
             stubbed_response.url = expected_url
             stubbed_response.status_code = 200
+            stubbed_response.headers = {}
 
             get.return_value = stubbed_response
             obj = engine.get_from_uri('xyz', skip_cache=skip_cache)
@@ -115,6 +124,48 @@ class TestResourceEngineAccessMethods(BaseResourceModelTest):
         self.test_get_from_uri()
         assert get_from_cache.called
 
+    def test_coalesced_request(self):
+        engine = self.get_engine()
+        response = NapResponse(content='{}', url='xyz/', status_code=200,
+            request_method='GET')
+
+        def joined_request(key, func, *args):
+            assert key == ('GET', 'note::http://foo.com/v1/xyz/')
+            return response, True
+
+        with mock.patch.object(engine.in_flight, 'do') as do:
+            do.side_effect = joined_request
+            shared_response = engine.coalesced_request('GET', 'xyz/')
+
+        assert shared_response is not response
+        assert shared_response.content == response.content
+        assert not shared_response.use_cache
+        assert response.use_cache
+
+    def test_is_deadline_error(self):
+        assert is_deadline_error(DeadlineExceeded('xyz/'))
+        assert not is_deadline_error(ValueError())
+        with deadline(0):
+            # eg: a timeout shortened to fit the deadline
+            assert is_deadline_error(ValueError())
+        with deadline(10):
+            assert not is_deadline_error(ValueError())
+
+    def test_get_from_uri_coalesces(self):
+        engine = self.get_engine()
+        with mock.patch('nap.engine.ResourceEngine.coalesced_request') as cr:
+            cr.return_value = NapResponse(content='{}', url='xyz/',
+                status_code=200, request_method='GET')
+            engine.get_from_uri('xyz')
+            assert cr.called
+
+            cr.reset_mock()
+            with mock.patch('requests.request') as request:
+                request.return_value = self.get_mock_response(content='{}')
+                engine.get_from_uri('xyz', skip_cache=True)
+                engine.modify_request(headers={'x': '1'}).get_from_uri('xyz')
+            assert not cr.called
+
     def test_request_no_root_url(self):
         engine = self.get_engine()
         root_url = engine.model._meta['root_url']
@@ -188,6 +239,166 @@ class TestResourceEngineAccessMethods(BaseResourceModelTest):
         assert obj.content == res_dict['content']
 
 
+class TestResourceEngineBulkGetMethods(BaseResourceModelTest):
+
+    def fake_request(self, method, url, **kwargs):
+        if 'missing' in url:
+            return self.get_mock_response(status_code=404)
+
+        title = url.rstrip('/').split('/')[-1]
+        return self.get_mock_response(content=json.dumps({'title': title}))
+
+    def test_get_many(self):
+        engine = self.get_engine()
+        uris = ['one', 'missing', 'three']
+        with mock.patch('requests.request') as request:
+            request.side_effect = self.fake_request
+            results = engine.get_many(uris, max_workers=2)
+
+        assert [obj and obj.title for obj in results] == ['one', None, 'three']
+        assert results[0].full_url == 'one/'
+        assert list(results.errors.keys()) == [1]
+        assert isinstance(results.errors[1], InvalidStatusError)
+        assert not results.ok
+        assert len(results.successes) == 2
+
+    @mock.patch('nap.cache.base.BaseCacheBackend.get_many')
+    def test_get_many_uses_cache(self, get_many):
+        engine = self.get_engine()
+        cache_key = engine.cache.get_cache_key(engine.model,
+            engine.get_full_url('two/'))
+        get_many.return_value = {
+            cache_key: NapResponse(
+                content=json.dumps({'title': 'cached'}),
+                url='two/',
+                status_code=200,
+                request_method='GET',
+            ),
+        }
+        with mock.patch('requests.request') as request:
+            request.side_effect = self.fake_request
+            results = engine.get_many(['one', 'two'])
+            assert request.call_count == 1
+
+        assert get_many.call_count == 1
+        assert [obj.title for obj in results] == ['one', 'cached']
+
+    @mock.patch('nap.cache.base.BaseCacheBackend.get_many')
+    def test_get_many_skip_cache(self, get_many):
+        engine = self.get_engine()
+        with mock.patch('requests.request') as request:
+            request.side_effect = self.fake_request
+            engine.get_many(['one'], skip_cache=True)
+
+        assert not get_many.called
+
+    @mock.patch('nap.cache.base.BaseCacheBackend.get_many')
+    def test_get_many_revalidates(self, get_many):
+        engine = self.get_engine()
+        cache_key = engine.cache.get_cache_key(engine.model,
+            engine.get_full_url('two/'))
+        stale_response = NapResponse(
+            content=json.dumps({'title': 'stale'}),
+            url='two/',
+            status_code=200,
+            request_method='GET',
+            headers={'etag': '"abc"'},
+        )
+        stale_response.expires_at = 1
+        get_many.return_value = {cache_key: stale_response}
+        with mock.patch('requests.request') as request:
+            request.return_value = self.get_mock_response(status_code=304)
+            results = engine.get_many(['two'])
+
+            headers = request.call_args[1]['headers']
+            assert headers['If-None-Match'] == '"abc"'
+
+        assert results[0].title == 'stale'
+
+    def test_get_many_coalesces(self):
+        engine = self.get_engine()
+        response = NapResponse(content=json.dumps({'title': 'shared'}),
+            url='one/', status_code=200, request_method='GET')
+
+        with mock.patch.object(ResourceEngine.in_flight, 'do') as do:
+            do.return_value = (response, True)
+            results = engine.get_many(['one'])
+
+            key = do.call_args[0][0]
+            assert key == ('GET', 'note::http://foo.com/v1/one/')
+
+        assert results[0].title == 'shared'
+
+    def test_lookup_many(self):
+        engine = self.get_engine()
+        lookups = [
+            {'hello': 'a', 'what': 'b'},
+            {'bad_hello': 'a'},
+        ]
+        with mock.patch('requests.request') as request:
+            request.side_effect = self.fake_request
+            results = engine.lookup_many(lookups)
+            assert request.call_count == 1
+
+        assert results[0].title == 'b'
+        assert results[1] is None
+        assert isinstance(results.errors[1], ValueError)
+
+
+class TestResourceEngineBulkWriteMethods(BaseResourceModelTest):
+
+    def fake_request(self, method, url, **kwargs):
+        if 'bad' in url:
+            return self.get_mock_response(status_code=500)
+
+        if method == 'POST':
+            data = json.loads(kwargs['data'])
+            data['slug'] = 'created-%s' % data['content']
+            return self.get_mock_response(status_code=201,
+                content=json.dumps(data))
+
+        return self.get_mock_response(status_code=204)
+
+    def test_bulk_save(self):
+        engine = self.get_engine()
+        objs = [
+            SampleResourceModel(content='new'),
+            SampleResourceModel(title='bad', slug='bad'),
+        ]
+        with mock.patch('requests.request') as request:
+            request.side_effect = self.fake_request
+            results = engine.bulk_save(objs, max_workers=2)
+
+        assert results[0] is objs[0]
+        assert objs[0].slug == 'created-new'
+        assert results[1] is None
+        assert isinstance(results.errors[1], InvalidStatusError)
+        assert results.successes == [objs[0]]
+
+    def test_bulk_save_keeps_modified_request(self):
+        engine = self.get_engine().modify_request(headers={'x-test': '1'})
+        obj = SampleResourceModel(content='new')
+        with mock.patch('requests.request') as request:
+            request.side_effect = self.fake_request
+            engine.bulk_save([obj])
+            assert request.call_args[1]['headers']['x-test'] == '1'
+
+    def test_bulk_delete(self):
+        engine = self.get_engine()
+        objs = [
+            SampleResourceModel(title='good', slug='good'),
+            SampleResourceModel(title='bad', slug='bad'),
+        ]
+        with mock.patch('requests.request') as request:
+            request.side_effect = self.fake_request
+            results = engine.bulk_delete(objs)
+
+        assert results[0] is objs[0]
+        assert objs[0].resource_id is None
+        assert objs[1].resource_id == 'bad'
+        assert isinstance(results.errors[1], InvalidStatusError)
+
+
 class TestResourceCollectionMethods(BaseResourceModelTest):
 
     def test_collection_field(self):
@@ -205,6 +416,7 @@ class TestResourceCollectionMethods(BaseResourceModelTest):
             }
             r.content = json.dumps(collection_dict)
             r.status_code = 200
+            r.headers = {}
             request.return_value = r
             objects = SampleResourceModel.objects.all()
             assert request.called
@@ -215,6 +427,7 @@ class TestResourceCollectionMethods(BaseResourceModelTest):
         with mock.patch('requests.request') as request:
             r = mock.Mock()
             r.status_code = 200
+            r.headers = {}
             r.content = json.dumps([
                 {'title': 'hello', 'content': 'content'},
                 {'title': 'hello', 'content': 'content'}
@@ -228,6 +441,128 @@ class TestResourceCollectionMethods(BaseResourceModelTest):
             with pytest.raises(ValueError):
                 SampleResourceModel.objects.filter(title='title')
 
+    @mock.patch('nap.cache.base.BaseCacheBackend.set')
+    @mock.patch('nap.cache.base.BaseCacheBackend.get')
+    def test_filter_uses_cache(self, get, cache_set):
+        engine = self.get_engine()
+        get.return_value = NapResponse(
+            content=json.dumps([{'title': 'cached'}]),
+            url='http://foo.com/v1/note/?title=title',
+            status_code=200,
+            request_method='GET',
+        )
+        with mock.patch('requests.request') as request:
+            objects = engine.filter(title='title')
+            assert not request.called
+
+        assert [obj.title for obj in objects] == ['cached']
+        get.assert_called_with('note::http://foo.com/v1/note/?title=title')
+        assert not cache_set.called
+
+    @mock.patch('nap.cache.base.BaseCacheBackend.set')
+    @mock.patch('nap.cache.base.BaseCacheBackend.get')
+    def test_filter_caches_response(self, get, cache_set):
+        engine = self.get_engine()
+        get.return_value = None
+        with mock.patch('requests.request') as request:
+            request.return_value = self.get_mock_response(
+                content=json.dumps([{'title': 'a'}]),
+                url='http://foo.com/v1/note/',
+                headers={},
+            )
+            engine.all()
+
+        cache_key = cache_set.call_args[0][0]
+        assert cache_key == 'note::http://foo.com/v1/note/'
+
+    @mock.patch('nap.cache.base.BaseCacheBackend.set')
+    @mock.patch('nap.cache.base.BaseCacheBackend.get')
+    def test_filter_skip_cache(self, get, cache_set):
+        engine = self.get_engine()
+        with mock.patch('requests.request') as request:
+            request.return_value = self.get_mock_response(content='[]',
+                headers={})
+            engine.filter(skip_cache=True, title='title')
+            assert request.called
+
+        cache_key = 'note::http://foo.com/v1/note/?title=title'
+        assert mock.call(cache_key) not in get.call_args_list
+
+    @mock.patch('nap.cache.base.BaseCacheBackend.set')
+    def test_invalid_collection_not_cached(self, cache_set):
+        engine = self.get_engine()
+        with mock.patch('requests.request') as request:
+            request.return_value = self.get_mock_response(status_code=500)
+            with pytest.raises(InvalidStatusError):
+                engine.all()
+
+        cached_values = [call[0][1] for call in cache_set.call_args_list]
+        assert not any(isinstance(value, NapResponse) for value in cached_values)
+
+    def test_cache_collection_items(self):
+        engine = self.get_engine()
+        cache = MemoryCacheBackend()
+        meta = {'cache_backend': cache, 'cache_collection_items': True}
+        with mock.patch.dict(SampleResourceModel._meta, meta):
+            with mock.patch('requests.request') as request:
+                request.return_value = self.get_mock_response(
+                    content=json.dumps([
+                        {'title': 'a', 'slug': 'slug-a'},
+                        {'content': 'no lookup url'},
+                    ]),
+                    url='http://foo.com/v1/note/',
+                    headers={'etag': '"list"'},
+                )
+                engine.all()
+
+                obj = engine.lookup(slug='slug-a')
+                assert request.call_count == 1
+
+        assert obj.title == 'a'
+        assert cache.get('note::http://foo.com/v1/note/') is not None
+        item_response = cache.get('note::http://foo.com/v1/note/slug-a/')
+        assert 'etag' not in item_response.headers
+
+    def test_cache_collection_items_set_at_once(self):
+        engine = self.get_engine()
+        cache = MemoryCacheBackend()
+        meta = {'cache_backend': cache, 'cache_collection_items': True}
+        with mock.patch.dict(SampleResourceModel._meta, meta):
+            with mock.patch('requests.request') as request:
+                request.return_value = self.get_mock_response(
+                    content=json.dumps([
+                        {'title': 'a', 'slug': 'slug-a'},
+                        {'title': 'b', 'slug': 'slug-b'},
+                    ]),
+                    url='http://foo.com/v1/note/',
+                    headers={},
+                )
+                with mock.patch.object(cache, 'set_many',
+                        wraps=cache.set_many) as set_many:
+                    engine.all()
+
+        assert set_many.call_count == 1
+        assert sorted(set_many.call_args[0][0]) == [
+            'note::http://foo.com/v1/note/slug-a/',
+            'note::http://foo.com/v1/note/slug-b/',
+        ]
+        assert cache.get('note::http://foo.com/v1/note/slug-b/') is not None
+
+    def test_collection_items_not_cached_by_default(self):
+        engine = self.get_engine()
+        cache = MemoryCacheBackend()
+        with mock.patch.dict(SampleResourceModel._meta, {'cache_backend': cache}):
+            with mock.patch('requests.request') as request:
+                request.return_value = self.get_mock_response(
+                    content=json.dumps([{'title': 'a', 'slug': 'slug-a'}]),
+                    url='http://foo.com/v1/note/',
+                    headers={},
+                )
+                engine.all()
+
+        assert cache.get('note::http://foo.com/v1/note/') is not None
+        assert cache.get('note::http://foo.com/v1/note/slug-a/') is None
+
     def test_validate_collection_response(self):
         engine = self.get_engine()
         res = mock.Mock()
@@ -322,6 +657,752 @@ class TestCacheFunctions(object):
         assert not cache_set.called
 
 
+class TestCacheRevalidation(BaseResourceModelTest):
+
+    def get_stale_response(self, **kwargs):
+        defaults = {
+            'content': json.dumps({'title': 'stale'}),
+            'url': 'some-url/',
+            'status_code': 200,
+            'request_method': 'GET',
+            'headers': {'etag': '"abc"', 'cache-control': 'max-age=10'},
+        }
+        defaults.update(kwargs)
+        response = NapResponse(**defaults)
+        response.expires_at = 1
+        return response
+
+    @mock.patch('nap.cache.base.BaseCacheBackend.get')
+    def test_get_from_cache_stale(self, get):
+        engine = self.get_engine()
+        get.return_value = self.get_stale_response()
+
+        assert engine.get_from_cache('GET', 'some-url/') is None
+        cached_response = engine.get_from_cache('GET', 'some-url/',
+            allow_stale=True)
+        assert cached_response.content == get.return_value.content
+        assert not cached_response.use_cache
+        # the stored response is left untouched
+        assert get.return_value.use_cache
+
+    @mock.patch('nap.cache.base.BaseCacheBackend.set')
+    @mock.patch('nap.cache.base.BaseCacheBackend.get')
+    def test_not_modified(self, get, cache_set):
+        engine = self.get_engine()
+        get.return_value = self.get_stale_response()
+        with mock.patch('requests.request') as request:
+            request.return_value = mock.Mock(status_code=304, content='',
+                headers={'cache-control': 'max-age=60'})
+            obj = engine.get_from_uri('some-url/')
+
+            headers = request.call_args[1]['headers']
+            assert headers['If-None-Match'] == '"abc"'
+            assert headers['content-type'] == 'application/json'
+
+        assert obj.title == 'stale'
+        cached_response = cache_set.call_args[0][1]
+        assert cached_response.status_code == 200
+        assert cached_response.headers['cache-control'] == 'max-age=60'
+        assert cached_response.headers['etag'] == '"abc"'
+
+    @mock.patch('nap.cache.base.BaseCacheBackend.get')
+    def test_modified(self, get):
+        engine = self.get_engine()
+        get.return_value = self.get_stale_response()
+        with mock.patch('requests.request') as request:
+            request.return_value = mock.Mock(status_code=200,
+                content=json.dumps({'title': 'new'}), headers={})
+            obj = engine.get_from_uri('some-url/')
+
+        assert obj.title == 'new'
+
+    @mock.patch('nap.cache.base.BaseCacheBackend.get')
+    def test_stale_without_validators(self, get):
+        engine = self.get_engine()
+        get.return_value = self.get_stale_response(headers={})
+        with mock.patch('requests.request') as request:
+            request.return_value = mock.Mock(status_code=200,
+                content=json.dumps({'title': 'new'}), headers={})
+            obj = engine.get_from_uri('some-url/')
+            assert 'If-None-Match' not in request.call_args[1]['headers']
+
+        assert obj.title == 'new'
+
+    def test_set_expires_at_with_stale_timeout(self):
+        engine = self.get_engine()
+        response = NapResponse(content='{}', url='some-url/', status_code=200,
+            request_method='GET', headers={'cache-control': 'max-age=10'})
+        with mock.patch.object(engine.cache, 'stale_timeout', 60):
+            with mock.patch('time.time') as now:
+                now.return_value = 100
+                engine.cache_response(response)
+
+        assert response.expires_at == 110
+
+    def test_refresh(self):
+        obj = SampleResourceModel(title='old', slug='some-slug')
+        with mock.patch('requests.request') as request:
+            request.return_value = mock.Mock(status_code=200,
+                content=json.dumps({'title': 'new', 'slug': 'some-slug'}),
+                headers={'etag': '"v2"'})
+            assert obj.refresh()
+            assert request.call_args[0][1] == 'http://foo.com/v1/note/some-slug/'
+
+        assert obj.title == 'new'
+
+        with mock.patch('requests.request') as request:
+            request.return_value = mock.Mock(status_code=304, content='',
+                headers={})
+            assert not obj.refresh()
+            headers = request.call_args[1]['headers']
+            assert headers['If-None-Match'] == '"v2"'
+
+        assert obj.title == 'new'
+
+
+class TestStaleWhileRevalidate(BaseResourceModelTest):
+
+    def get_stale_response(self, **kwargs):
+        defaults = {
+            'content': json.dumps({'title': 'stale'}),
+            'url': 'some-url/',
+            'status_code': 200,
+            'request_method': 'GET',
+            'headers': {'cache-control': 'max-age=10'},
+        }
+        defaults.update(kwargs)
+        response = NapResponse(**defaults)
+        response.expires_at = 1
+        response.stale_until = time.time() + 30
+        return response
+
+    @mock.patch('nap.cache.base.BaseCacheBackend.set')
+    def test_cache_response_keeps_stale_window(self, cache_set):
+        engine = self.get_engine()
+        response = NapResponse(content='{}', url='some-url/', status_code=200,
+            request_method='GET', headers={'cache-control': 'max-age=10'})
+        with mock.patch.dict(SampleResourceModel._meta,
+                {'stale_while_revalidate': 30}):
+            with mock.patch('time.time') as now:
+                now.return_value = 100
+                engine.cache_response(response)
+
+        assert response.expires_at == 110
+        assert response.stale_until == 140
+        assert cache_set.call_args[1]['timeout'] == 40
+
+    def test_stale_window_from_header(self):
+        engine = self.get_engine()
+        response = NapResponse(content='{}', url='some-url/', status_code=200,
+            headers={'cache-control': 'max-age=10, stale-while-revalidate=5'})
+        assert engine.get_stale_window(response) == 0
+
+        with mock.patch.dict(SampleResourceModel._meta,
+                {'stale_while_revalidate': 30}):
+            assert engine.get_stale_window(response) == 5
+            response.headers = {'cache-control': 'max-age=10'}
+            assert engine.get_stale_window(response) == 30
+
+    def test_no_stale_window_when_revalidation_required(self):
+        engine = self.get_engine()
+        with mock.patch.dict(SampleResourceModel._meta,
+                {'stale_while_revalidate': 30}):
+            for directive in ('no-cache', 'max-age=10, must-revalidate'):
+                response = NapResponse(content='{}', url='some-url/',
+                    status_code=200, headers={'cache-control': directive})
+                assert engine.get_stale_window(response) == 0
+
+    def test_no_cache_revalidated_before_use(self):
+        engine = self.get_engine()
+        cache = MemoryCacheBackend()
+        meta = {'cache_backend': cache, 'stale_while_revalidate': 30}
+        with mock.patch.dict(SampleResourceModel._meta, meta):
+            with mock.patch('requests.request') as request:
+                request.return_value = self.get_mock_response(
+                    content=json.dumps({'title': 'a'}),
+                    url='http://foo.com/v1/some-url/',
+                    headers={'cache-control': 'no-cache', 'etag': '"a"'},
+                )
+                engine.get_from_uri('some-url/')
+                request.return_value = self.get_mock_response(
+                    content=json.dumps({'title': 'b'}),
+                    url='http://foo.com/v1/some-url/',
+                    headers={'cache-control': 'no-cache', 'etag': '"b"'},
+                )
+                obj = engine.get_from_uri('some-url/')
+
+                assert request.call_count == 2
+
+        assert obj.title == 'b'
+
+    @mock.patch('nap.concurrency.default_worker_pool.submit')
+    @mock.patch('nap.cache.base.BaseCacheBackend.get')
+    def test_serves_stale_and_refreshes(self, get, submit):
+        engine = self.get_engine()
+        get.return_value = self.get_stale_response()
+        with mock.patch('requests.request') as request:
+            obj = engine.get_from_uri('some-url/')
+            assert not request.called
+
+        assert obj.title == 'stale'
+        assert submit.call_count == 1
+        run, refresh_key, call = submit.call_args[0][:3]
+        assert refresh_key == ('refresh', 'note::http://foo.com/v1/some-url/')
+
+        # the refresh is registered while it waits for a worker
+        engine.get_from_uri('some-url/')
+        assert submit.call_count == 1
+        engine.in_flight.release(refresh_key, call)
+
+    @mock.patch('nap.concurrency.default_worker_pool.submit')
+    @mock.patch('nap.cache.base.BaseCacheBackend.get')
+    def test_single_refresh(self, get, submit):
+        engine = self.get_engine()
+        get.return_value = self.get_stale_response()
+        refresh_key = ('refresh', 'note::http://foo.com/v1/some-url/')
+        call = engine.in_flight.reserve(refresh_key)
+        try:
+            engine.get_from_uri('some-url/')
+        finally:
+            engine.in_flight.release(refresh_key, call)
+
+        assert not submit.called
+
+    def test_queued_refreshes(self):
+        engine = self.get_engine()
+        workers = WorkerPool(size=1)
+        busy = threading.Event()
+        workers.submit(busy.wait, 5)
+        stale_response = self.get_stale_response()
+
+        with mock.patch('requests.request') as request:
+            request.return_value = mock.Mock(status_code=200,
+                content=json.dumps({'title': 'new'}), headers={})
+            with mock.patch.object(engine, 'get_from_cache') as get_from_cache:
+                get_from_cache.return_value = stale_response
+                with mock.patch.dict(SampleResourceModel._meta,
+                        {'worker_pool': workers}):
+                    for i in range(5):
+                        engine.get_from_uri('some-url/')
+                    busy.set()
+                    workers.close()
+
+            assert request.call_count == 1
+
+    @mock.patch('nap.cache.base.BaseCacheBackend.get')
+    def test_expired_stale_window(self, get):
+        engine = self.get_engine()
+        get.return_value = self.get_stale_response()
+        get.return_value.stale_until = 1
+        with mock.patch('requests.request') as request:
+            request.return_value = mock.Mock(status_code=200,
+                content=json.dumps({'title': 'new'}), headers={})
+            obj = engine.get_from_uri('some-url/')
+
+        assert obj.title == 'new'
+
+    @mock.patch('nap.cache.base.BaseCacheBackend.set')
+    def test_refresh_cached_response(self, cache_set):
+        engine = self.get_engine()
+        with mock.patch('requests.request') as request:
+            request.return_value = mock.Mock(status_code=200,
+                content=json.dumps({'title': 'new'}), headers={})
+            response = engine.refresh_cached_response('some-url/',
+                self.get_stale_response())
+
+        assert response.content == json.dumps({'title': 'new'})
+        assert cache_set.call_args[0][1] is response
+
+    @mock.patch('nap.cache.base.BaseCacheBackend.set')
+    def test_failed_refresh(self, cache_set):
+        engine = self.get_engine()
+        with mock.patch('requests.request') as request:
+            request.return_value = mock.Mock(status_code=500, content='',
+                headers={})
+            response = engine.refresh_cached_response('some-url/',
+                self.get_stale_response())
+
+        assert response is None
+        assert not cache_set.called
+
+
+class TestCacheInvalidation(BaseResourceModelTest):
+
+    lookup_key = 'note::http://foo.com/v1/note/some-slug/'
+    collection_key = 'note::http://foo.com/v1/note/'
+
+    def get_cache(self):
+        cache = MemoryCacheBackend()
+        cache.set(self.lookup_key, NapResponse(
+            content=json.dumps({'title': 'old', 'slug': 'some-slug'}),
+            url='http://foo.com/v1/note/some-slug/',
+            status_code=200,
+        ))
+        return cache
+
+    def get_meta(self, cache, **meta):
+        meta.update(cache_backend=cache, invalidate_on_write=True)
+        return meta
+
+    def fill_collection_cache(self, engine):
+        with mock.patch('requests.request') as request:
+            request.return_value = self.get_mock_response(
+                content=json.dumps([{'title': 'old', 'slug': 'some-slug'}]),
+                url='http://foo.com/v1/note/',
+                headers={},
+            )
+            engine.all()
+
+    def test_update_invalidates(self):
+        engine = self.get_engine()
+        cache = self.get_cache()
+        obj = SampleResourceModel(title='new', slug='some-slug')
+        with mock.patch.dict(SampleResourceModel._meta, self.get_meta(cache)):
+            self.fill_collection_cache(engine)
+            with mock.patch('requests.request') as request:
+                request.return_value = self.get_mock_response(status_code=204,
+                    headers={})
+                engine.update(obj)
+
+            assert cache.get(self.lookup_key) is None
+            assert engine.get_from_cache('GET', 'note/') is None
+
+    def test_delete_invalidates(self):
+        engine = self.get_engine()
+        cache = self.get_cache()
+        obj = SampleResourceModel(title='old', slug='some-slug')
+        with mock.patch.dict(SampleResourceModel._meta, self.get_meta(cache)):
+            with mock.patch('requests.request') as request:
+                request.return_value = self.get_mock_response(status_code=204,
+                    headers={})
+                engine.delete(obj)
+
+        assert cache.get(self.lookup_key) is None
+
+    def test_collection_invalidation_disabled_by_default(self):
+        engine = self.get_engine()
+        cache = self.get_cache()
+        obj = SampleResourceModel(title='old', slug='some-slug')
+        with mock.patch.dict(SampleResourceModel._meta, {'cache_backend': cache}):
+            with mock.patch.object(cache, 'get_tag_versions') as get_tag_versions:
+                self.fill_collection_cache(engine)
+                assert not get_tag_versions.called
+            with mock.patch('requests.request') as request:
+                request.return_value = self.get_mock_response(status_code=204,
+                    headers={})
+                with mock.patch.object(cache, 'purge_tags') as purge_tags:
+                    engine.delete(obj)
+                    assert not purge_tags.called
+
+            assert cache.get(self.lookup_key) is None
+            assert engine.get_from_cache('GET', 'note/') is not None
+
+    def test_get_after_save_not_stale_by_default(self):
+        engine = self.get_engine()
+        cache = self.get_cache()
+        obj = SampleResourceModel(title='new', slug='some-slug')
+        with mock.patch.dict(SampleResourceModel._meta, {'cache_backend': cache}):
+            assert engine.lookup(slug='some-slug').title == 'old'
+            with mock.patch('requests.request') as request:
+                request.return_value = self.get_mock_response(status_code=204,
+                    headers={})
+                engine.update(obj)
+
+                request.return_value = self.get_mock_response(
+                    content=json.dumps({'title': 'new', 'slug': 'some-slug'}),
+                    url='http://foo.com/v1/note/some-slug/',
+                    headers={},
+                )
+                assert engine.lookup(slug='some-slug').title == 'new'
+
+    def test_write_through(self):
+        engine = self.get_engine()
+        cache = self.get_cache()
+        obj = SampleResourceModel(title='new', slug='some-slug')
+        meta = self.get_meta(cache,
+            write_through=True,
+            valid_update_status=(200,),
+        )
+        with mock.patch.dict(SampleResourceModel._meta, meta):
+            with mock.patch('requests.request') as request:
+                request.return_value = self.get_mock_response(
+                    content=json.dumps({'title': 'new', 'slug': 'some-slug'}),
+                    headers={'etag': '"v2"'},
+                )
+                engine.update(obj)
+
+                obj = engine.lookup(slug='some-slug')
+                assert request.call_count == 1
+
+        assert obj.title == 'new'
+        assert 'etag' not in cache.get(self.lookup_key).headers
+
+    def test_purge_cache_tags(self):
+        engine = self.get_engine()
+        cache = self.get_cache()
+        with mock.patch.dict(SampleResourceModel._meta, self.get_meta(cache)):
+            self.fill_collection_cache(engine)
+            assert engine.get_from_cache('GET', 'note/') is not None
+
+            engine.purge_cache_tags('model::tests.SampleResourceModel')
+            assert engine.get_from_cache('GET', 'note/') is None
+
+        assert cache.get(self.lookup_key) is not None
+
+
+class TestParsedObjectCache(BaseResourceModelTest):
+
+    def get_response(self):
+        return self.get_mock_response(
+            content=json.dumps({'title': 'a', 'content': ['x']}),
+            url='http://foo.com/v1/note/some-slug/',
+            headers={},
+        )
+
+    def test_get_parses_once(self):
+        engine = self.get_engine()
+        with mock.patch('requests.request') as request:
+            request.return_value = self.get_response()
+            with mock.patch('json.loads', side_effect=json.loads) as loads:
+                engine.get_from_uri('note/some-slug/')
+
+        assert loads.call_count == 1
+
+    def test_cached_hits_skip_parsing(self):
+        engine = self.get_engine()
+        cache = MemoryCacheBackend()
+        meta = {'cache_backend': cache, 'cache_parsed_objects': True}
+        with mock.patch.dict(SampleResourceModel._meta, meta):
+            with mock.patch('requests.request') as request:
+                request.return_value = self.get_response()
+                first = engine.get_from_uri('note/some-slug/')
+                first.content.append('y')
+
+            with mock.patch('json.loads') as loads:
+                second = engine.get_from_uri('note/some-slug/')
+                second.title = 'changed'
+                third = engine.get_from_uri('note/some-slug/')
+                assert not loads.called
+
+        assert second.content == ['x']
+        assert third.title == 'a'
+        assert third.full_url == 'note/some-slug/'
+
+    def test_cached_hits_copy_nested_values(self):
+        engine = self.get_engine()
+        cache = MemoryCacheBackend()
+        meta = {'cache_backend': cache, 'cache_parsed_objects': True}
+        with mock.patch.dict(SampleResourceModel._meta, meta):
+            with mock.patch('requests.request') as request:
+                request.return_value = self.get_mock_response(
+                    content=json.dumps({
+                        'title': 'a',
+                        'extra': {'tags': ['x']},
+                    }),
+                    url='http://foo.com/v1/note/some-slug/',
+                    headers={},
+                )
+                engine.get_from_uri('note/some-slug/')
+
+            obj = engine.get_from_uri('note/some-slug/')
+            obj.extra_data['extra']['tags'].append('y')
+            obj._raw_field_data['extra']['tags'].append('z')
+
+            obj = engine.get_from_uri('note/some-slug/')
+
+        assert obj.extra_data['extra'] == {'tags': ['x']}
+        assert obj._raw_field_data['extra'] == {'tags': ['x']}
+
+    def test_cached_hits_skip_deep_copies(self):
+        engine = self.get_engine()
+        cache = MemoryCacheBackend()
+        meta = {'cache_backend': cache, 'cache_parsed_objects': True}
+        with mock.patch.dict(SampleResourceModel._meta, meta):
+            with mock.patch('requests.request') as request:
+                request.return_value = self.get_response()
+                engine.get_from_uri('note/some-slug/')
+
+            # a deep copy costs more than parsing the response again
+            with mock.patch('copy.deepcopy') as deepcopy:
+                obj = engine.get_from_uri('note/some-slug/')
+                assert not deepcopy.called
+
+        assert obj.content == ['x']
+
+    def test_snapshot_of_values_marshal_cant_store(self):
+        engine = self.get_engine()
+        cache = MemoryCacheBackend()
+        meta = {'cache_backend': cache, 'cache_parsed_objects': True}
+        with mock.patch.dict(SampleResourceModel._meta, meta):
+            with mock.patch('requests.request') as request:
+                request.return_value = self.get_response()
+                with mock.patch('marshal.dumps', side_effect=ValueError):
+                    engine.get_from_uri('note/some-slug/')
+
+            first = engine.get_from_uri('note/some-slug/')
+            first.content.append('y')
+            second = engine.get_from_uri('note/some-slug/')
+            assert request.call_count == 1
+
+        assert second.content == ['x']
+
+    def test_parsed_objects_not_cached_by_default(self):
+        engine = self.get_engine()
+        cache = MemoryCacheBackend()
+        with mock.patch.dict(SampleResourceModel._meta, {'cache_backend': cache}):
+            with mock.patch('requests.request') as request:
+                request.return_value = self.get_response()
+                engine.get_from_uri('note/some-slug/')
+
+        cached_response = cache.get('note::http://foo.com/v1/note/some-slug/')
+        assert cached_response.parsed_object is None
+
+
+class TestNegativeCache(BaseResourceModelTest):
+
+    lookup_key = 'note::http://foo.com/v1/note/some-slug/'
+
+    def get_not_found(self, status_code=404):
+        return self.get_mock_response(status_code=status_code, content='',
+            url='http://foo.com/v1/note/some-slug/', headers={})
+
+    def lookup_missing(self, engine, status_code=404):
+        with mock.patch('requests.request') as request:
+            request.return_value = self.get_not_found(status_code)
+            for i in range(2):
+                with pytest.raises(InvalidStatusError) as excinfo:
+                    engine.lookup(slug='some-slug')
+                assert excinfo.value.response.status_code == status_code
+
+        return request.call_count
+
+    def test_not_found_cached(self):
+        engine = self.get_engine()
+        cache = MemoryCacheBackend()
+        meta = {'cache_backend': cache, 'negative_cache_timeout': 30}
+        with mock.patch.dict(SampleResourceModel._meta, meta):
+            with mock.patch('time.time') as now:
+                now.return_value = 100
+                assert self.lookup_missing(engine, 410) == 1
+                assert cache.get(self.lookup_key).expires_at == 130
+
+    def test_not_found_not_cached_by_default(self):
+        engine = self.get_engine()
+        cache = MemoryCacheBackend()
+        with mock.patch.dict(SampleResourceModel._meta, {'cache_backend': cache}):
+            assert self.lookup_missing(engine) == 2
+
+    def test_other_errors_not_cached(self):
+        engine = self.get_engine()
+        cache = MemoryCacheBackend()
+        meta = {'cache_backend': cache, 'negative_cache_timeout': 30}
+        with mock.patch.dict(SampleResourceModel._meta, meta):
+            assert self.lookup_missing(engine, 500) == 2
+
+    def create(self, engine):
+        with mock.patch('requests.request') as request:
+            request.return_value = self.get_mock_response(
+                status_code=201,
+                content=json.dumps({'title': 'new', 'slug': 'some-slug'}),
+                headers={},
+            )
+            engine.create(SampleResourceModel(title='new'))
+
+    def test_create_invalidates(self):
+        engine = self.get_engine()
+        cache = MemoryCacheBackend()
+        meta = {'cache_backend': cache, 'negative_cache_timeout': 30}
+        with mock.patch.dict(SampleResourceModel._meta, meta):
+            assert self.lookup_missing(engine) == 1
+            self.create(engine)
+            assert self.lookup_missing(engine) == 1
+
+    def test_create_invalidates_other_lookup_urls(self):
+        engine = self.get_engine()
+        cache = MemoryCacheBackend()
+        meta = {'cache_backend': cache, 'negative_cache_timeout': 30}
+        url = 'note/?slug=some-slug'
+        with mock.patch.dict(SampleResourceModel._meta, meta):
+            with mock.patch('requests.request') as request:
+                request.return_value = self.get_not_found()
+                with pytest.raises(InvalidStatusError):
+                    engine.get_from_uri(url)
+                assert engine.get_from_cache('GET', url) is not None
+
+            self.create(engine)
+            assert engine.get_from_cache('GET', url) is None
+
+
+class TestCacheHeaders(BaseResourceModelTest):
+
+    def get_response(self, title, **headers):
+        return self.get_mock_response(
+            content=json.dumps({'title': title}),
+            url='http://foo.com/v1/note/some-slug/',
+            headers=headers,
+        )
+
+    def test_vary(self):
+        cache = MemoryCacheBackend()
+
+        def get(language):
+            engine = SampleResourceModel.objects.modify_request(
+                headers={'Accept-Language': language})
+            return engine.get_from_uri('note/some-slug/')
+
+        with mock.patch.dict(SampleResourceModel._meta, {'cache_backend': cache}):
+            with mock.patch('requests.request') as request:
+                request.return_value = self.get_response('hello',
+                    vary='Accept-Language')
+                get('en')
+                request.return_value = self.get_response('bonjour',
+                    vary='Accept-Language')
+                get('fr')
+                assert request.call_count == 2
+
+                assert get('en').title == 'hello'
+                assert get('fr').title == 'bonjour'
+                assert request.call_count == 2
+
+    def test_vary_on_header_set_by_middleware(self):
+        engine = self.get_engine()
+        cache = MemoryCacheBackend()
+
+        class TokenMiddleware(object):
+            token = 'a'
+
+            def handle_request(self, request):
+                request.headers['Authorization'] = self.token
+                return request
+
+            def handle_response(self, request, response):
+                return response
+
+        middleware = TokenMiddleware()
+        meta = {'cache_backend': cache, 'middleware': [middleware]}
+        with mock.patch.dict(SampleResourceModel._meta, meta):
+            with mock.patch('requests.request') as request:
+                request.return_value = self.get_response('a',
+                    **{'cache-control': 'private'})
+                engine.get_from_uri('note/some-slug/')
+                assert engine.get_from_uri('note/some-slug/').title == 'a'
+                assert request.call_count == 1
+
+                middleware.token = 'b'
+                request.return_value = self.get_response('b',
+                    **{'cache-control': 'private'})
+                assert engine.get_from_uri('note/some-slug/').title == 'b'
+                assert request.call_count == 2
+
+    def test_vary_on_auth_set_by_middleware(self):
+        engine = self.get_engine()
+        cache = MemoryCacheBackend()
+        meta = {
+            'cache_backend': cache,
+            'middleware': [HttpAuthorization('user', 'secret')],
+        }
+        with mock.patch.dict(SampleResourceModel._meta, meta):
+            with mock.patch('requests.request') as request:
+                request.return_value = self.get_response('a',
+                    vary='Authorization')
+                engine.get_from_uri('note/some-slug/')
+                engine.get_from_uri('note/some-slug/')
+                assert request.call_count == 1
+
+            # without credentials, the variant stored for the user is missed
+            SampleResourceModel._meta['middleware'] = []
+            assert engine.get_from_cache('GET', 'note/some-slug/') is None
+
+    def test_vary_on_auth_object(self):
+        engine = self.get_engine()
+        cache = MemoryCacheBackend()
+        meta = {
+            'cache_backend': cache,
+            'default_request_args': {'auth': HTTPBasicAuth('user', 'secret')},
+        }
+        with mock.patch.dict(SampleResourceModel._meta, meta):
+            with mock.patch('requests.request') as request:
+                request.return_value = self.get_response('a',
+                    **{'cache-control': 'private'})
+                for i in range(3):
+                    engine.get_from_uri('note/some-slug/')
+                assert request.call_count == 1
+
+        # the Vary marker and the one variant
+        assert len(cache) == 2
+
+    def test_vary_on_unreadable_auth_not_cached(self):
+        engine = self.get_engine()
+        cache = MemoryCacheBackend()
+
+        class TokenAuth(object):
+            def __call__(self, request):
+                return request
+
+        meta = {
+            'cache_backend': cache,
+            'default_request_args': {'auth': TokenAuth()},
+        }
+        with mock.patch.dict(SampleResourceModel._meta, meta):
+            with mock.patch('requests.request') as request:
+                request.return_value = self.get_response('a',
+                    **{'cache-control': 'private'})
+                engine.get_from_uri('note/some-slug/')
+
+        assert len(cache) == 0
+
+    def test_age_shortens_freshness(self):
+        engine = self.get_engine()
+        cache = MemoryCacheBackend()
+        with mock.patch.dict(SampleResourceModel._meta, {'cache_backend': cache}):
+            with mock.patch('requests.request') as request:
+                request.return_value = self.get_response('a',
+                    **{'cache-control': 'max-age=60', 'age': '50'})
+                with mock.patch('time.time') as now:
+                    now.return_value = 100
+                    engine.get_from_uri('note/some-slug/')
+                    now.return_value = 109
+                    engine.get_from_uri('note/some-slug/')
+                    assert request.call_count == 1
+
+                    now.return_value = 111
+                    engine.get_from_uri('note/some-slug/')
+                    assert request.call_count == 2
+
+    def test_fully_aged_response_not_stored(self):
+        engine = self.get_engine()
+        cache = MemoryCacheBackend()
+        with mock.patch.dict(SampleResourceModel._meta, {'cache_backend': cache}):
+            with mock.patch('requests.request') as request:
+                request.return_value = self.get_response('a',
+                    **{'cache-control': 'max-age=60', 'age': '60'})
+                engine.get_from_uri('note/some-slug/')
+
+        assert len(cache) == 0
+
+    def test_no_store(self):
+        engine = self.get_engine()
+        cache = MemoryCacheBackend()
+        with mock.patch.dict(SampleResourceModel._meta, {'cache_backend': cache}):
+            with mock.patch('requests.request') as request:
+                request.return_value = self.get_response('a',
+                    **{'cache-control': 'no-store'})
+                engine.get_from_uri('note/some-slug/')
+
+        assert len(cache) == 0
+
+    def test_stale_on_arrival_not_stored(self):
+        engine = self.get_engine()
+        cache = MemoryCacheBackend()
+        with mock.patch.dict(SampleResourceModel._meta, {'cache_backend': cache}):
+            with mock.patch('requests.request') as request:
+                request.return_value = self.get_response('a',
+                    **{'cache-control': 'max-age=0'})
+                engine.get_from_uri('note/some-slug/')
+
+        assert len(cache) == 0
+
+
 class TestResourceEngineWriteMethods(BaseResourceModelTest, unittest.TestCase):
 
     headers = {'content-type': 'application/json'}
@@ -504,6 +1585,7 @@ def test_modify_request():
         r = mock.Mock()
         r.content = '{}'
         r.status_code = 200
+        r.headers = {}
         post.return_value = r
         SampleResourceModel.objects.modify_request(headers=new_headers).filter()
         post.assert_called_with(
@@ -518,6 +1600,7 @@ def test_modify_request():
         r = mock.Mock()
         r.content = '{}'
         r.status_code = 200
+        r.headers = {}
         post2.return_value = r
         SampleResourceModel.objects.filter()
         post2.assert_called_with(
@@ -528,3 +1611,74 @@ def test_modify_request():
         )
 
     SampleResourceModel._lookup_urls = []
+
+
+class TestAsyncResourceEngine(BaseResourceModelTest):
+
+    def get_engine(self):
+        return AsyncResourceEngine(SampleResourceModel)
+
+    def test_get_from_uri(self):
+        engine = self.get_engine()
+        with mock.patch('requests.request') as request:
+            request.return_value = self.get_mock_response(
+                content=json.dumps({'title': 'async title'}),
+            )
+            result = engine.get_from_uri('xyz')
+            obj = result.get(timeout=5)
+
+        assert obj.title == 'async title'
+
+    def test_many_in_flight(self):
+        engine = self.get_engine()
+        sent = []
+
+        def fake_request(method, url, **kwargs):
+            sent.append(url)
+            return self.get_mock_response(content='[]')
+
+        with mock.patch('requests.request') as request:
+            request.side_effect = fake_request
+            results = [engine.filter(skip_cache=True) for i in range(50)]
+            assert all(r.get(timeout=5) == [] for r in results)
+
+        assert len(sent) == 50
+
+    def test_errors_raised_on_get(self):
+        engine = self.get_engine()
+        with mock.patch('requests.request') as request:
+            request.return_value = self.get_mock_response(status_code=500)
+            result = engine.lookup(hello='1', what='2')
+            with pytest.raises(InvalidStatusError):
+                result.get(timeout=5)
+
+    def test_modified_request_args_kept(self):
+        engine = self.get_engine().modify_request(headers={'x-test': '1'})
+        assert engine.get_sync_engine()._tmp_request_args == {
+            'headers': {'x-test': '1'},
+        }
+
+    def test_model_save_resolves(self):
+        obj = SampleResourceModel(title='expected_title')
+        with mock.patch('nap.engine.ResourceEngine.update') as update:
+            update.return_value = SampleResourceModel(title='new_title')
+            with mock.patch.object(SampleResourceModel, 'objects', self.get_engine()):
+                obj.save()
+
+        assert obj.title == 'new_title'
+
+    def test_model_refresh_resolves(self):
+        obj = SampleResourceModel(title='old_title')
+        obj._full_url = 'note/1/'
+        with mock.patch('requests.request') as request:
+            request.return_value = self.get_mock_response(
+                content=json.dumps({'title': 'new_title'}),
+            )
+            with mock.patch.object(SampleResourceModel, 'objects', self.get_engine()):
+                assert obj.refresh()
+
+            request.return_value = self.get_mock_response(status_code=304)
+            with mock.patch.object(SampleResourceModel, 'objects', self.get_engine()):
+                assert not obj.refresh()
+
+        assert obj.title == 'new_title'
@@ -1,6 +1,6 @@
 import mock
 
-from nap.exceptions import InvalidStatusError
+from nap.exceptions import CircuitOpenError, DeadlineExceeded, InvalidStatusError
 
 
 def test_invalid_status():
@@ -14,3 +14,14 @@ def test_invalid_status():
     except InvalidStatusError as e:
         expected = InvalidStatusError.ERROR_MSG % (statuses, 404, "naprulez.org")
         assert str(e) == expected
+
+
+def test_circuit_open_error():
+    error = CircuitOpenError('foo.com')
+    assert error.host == 'foo.com'
+    assert 'foo.com' in str(error)
+
+
+def test_deadline_exceeded():
+    error = DeadlineExceeded('http://foo.com/')
+    assert error.url == 'http://foo.com/'
@@ -0,0 +1,140 @@
+import threading
+
+import mock
+import pytest
+
+from nap.concurrency import WorkerPool
+from nap.engine import AsyncResourceEngine
+from nap.hedging import HedgePolicy
+from nap.http import NapResponse
+from nap.transports import BaseTransport
+
+from . import SampleResourceModel
+
+
+class SlowFirstTransport(BaseTransport):
+
+    "Answers the first request only once a later request has been answered"
+
+    def __init__(self, first_error=None):
+        self.sent = []
+        self.first_error = first_error
+        self.release = threading.Event()
+
+    def send(self, request):
+        self.sent.append(request)
+        if len(self.sent) == 1:
+            self.release.wait(5)
+            if self.first_error:
+                raise self.first_error
+            return NapResponse('"first"', request.url, 200)
+
+        self.release.set()
+        return NapResponse('"hedge"', request.url, 200)
+
+
+class TestHedgePolicy(object):
+
+    def test_fixed_delay(self):
+        assert HedgePolicy(delay=0.2).get_delay() == 0.2
+
+    def test_percentile_delay(self):
+        policy = HedgePolicy(percentile=90, min_samples=10, min_delay=0.01)
+        assert policy.get_delay() == 0.01
+
+        for i in range(1, 11):
+            policy.record_latency(i / 10.0)
+        assert policy.get_delay() == 0.9
+
+    def test_allow_hedge(self):
+        policy = HedgePolicy(max_hedge_ratio=0.5)
+        policy.record_request()
+        assert not policy.allow_hedge()
+        policy.record_request()
+        assert policy.allow_hedge()
+        assert not policy.allow_hedge()
+
+
+class TestEngineHedging(object):
+
+    def setup_method(self, method):
+        self.policy = HedgePolicy(delay=0.01, max_hedge_ratio=1)
+        SampleResourceModel._meta['hedge_policy'] = self.policy
+
+    def teardown_method(self, method):
+        SampleResourceModel._meta['hedge_policy'] = None
+        SampleResourceModel._meta['transport'] = None
+        SampleResourceModel._meta['worker_pool'] = None
+
+    def test_hedge_wins(self):
+        transport = SlowFirstTransport()
+        SampleResourceModel._meta['transport'] = transport
+
+        response = SampleResourceModel.objects._request('GET', 'note/')
+
+        assert response.content == '"hedge"'
+        assert len(transport.sent) == 2
+        assert transport.sent[0] is not transport.sent[1]
+        assert self.policy.hedges == 1
+        assert len(self.policy.latencies) == 1
+
+    def test_hedge_used_when_first_fails(self):
+        transport = SlowFirstTransport(first_error=ValueError('first'))
+        SampleResourceModel._meta['transport'] = transport
+
+        response = SampleResourceModel.objects._request('GET', 'note/')
+        assert response.content == '"hedge"'
+
+    def test_error_raised_without_hedge(self):
+        transport = SlowFirstTransport(first_error=ValueError('first'))
+        self.policy.delay = 10
+        transport.release.set()
+        SampleResourceModel._meta['transport'] = transport
+
+        with pytest.raises(ValueError):
+            SampleResourceModel.objects._request('GET', 'note/')
+
+    def test_hedge_budget(self):
+        transport = SlowFirstTransport()
+        self.policy.max_hedge_ratio = 0
+        transport.release.set()
+        SampleResourceModel._meta['transport'] = transport
+
+        response = SampleResourceModel.objects._request('GET', 'note/')
+        assert response.content == '"first"'
+        assert len(transport.sent) == 1
+
+    def test_only_gets_hedged(self):
+        transport = SlowFirstTransport()
+        transport.release.set()
+        SampleResourceModel._meta['transport'] = transport
+
+        SampleResourceModel.objects._request('DELETE', 'note/')
+        assert self.policy.requests == 0
+
+    def test_attempts_run_on_policy_workers(self):
+        transport = SlowFirstTransport()
+        SampleResourceModel._meta['transport'] = transport
+        workers = self.policy.workers
+
+        with mock.patch.object(workers, 'submit', wraps=workers.submit) as submit:
+            response = SampleResourceModel.objects._request('GET', 'note/')
+            assert submit.call_count == 2
+
+        assert response.content == '"hedge"'
+
+    def test_async_engine_on_small_pool(self):
+        transport = SlowFirstTransport()
+        SampleResourceModel._meta['transport'] = transport
+        # the async call itself takes the pool's only thread
+        workers = WorkerPool(size=1)
+        SampleResourceModel._meta['worker_pool'] = workers
+
+        engine = AsyncResourceEngine(SampleResourceModel)
+        with mock.patch.object(engine.sync_engine_class,
+                'obj_from_get_response', lambda self, response, url: response):
+            result = engine.get_from_uri('note/1/', skip_cache=True)
+            response = result.get(timeout=5)
+        workers.close()
+
+        assert response.content == '"hedge"'
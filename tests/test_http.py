@@ -1,6 +1,13 @@
+import copy
+import pickle
+
+import mock
 import pytest
+import requests
+
+from nap.http import NapRequest, NapResponse, SessionPool
 
-from nap.http import NapRequest, NapResponse
+from . import SampleResourceModel
 
 
 class TestRequestMethods(object):
@@ -22,3 +29,103 @@ class TestNapResponse(object):
         res = NapResponse('content', 'naprulez.org', 200)
 
         assert hasattr(res.headers, 'keys')
+
+    def test_is_fresh(self):
+        res = NapResponse('content', 'naprulez.org', 200)
+        assert res.is_fresh
+
+        with mock.patch('time.time') as now:
+            now.return_value = 100
+            res.expires_at = 101
+            assert res.is_fresh
+            res.expires_at = 99
+            assert not res.is_fresh
+
+    def test_can_serve_stale(self):
+        res = NapResponse('content', 'naprulez.org', 200)
+        assert not res.can_serve_stale
+
+        with mock.patch('time.time') as now:
+            now.return_value = 100
+            res.stale_until = 101
+            assert res.can_serve_stale
+            res.stale_until = 99
+            assert not res.can_serve_stale
+
+    def test_parsed_object_not_pickled(self):
+        res = NapResponse('content', 'naprulez.org', 200)
+        res.parsed_object = 'parsed'
+        assert copy.copy(res).parsed_object == 'parsed'
+
+        res = pickle.loads(pickle.dumps(res))
+        assert res.parsed_object is None
+        assert res.content == 'content'
+
+    def test_get_conditional_headers(self):
+        res = NapResponse('content', 'naprulez.org', 200, headers={
+            'etag': '"abc"',
+            'last-modified': 'Sun, 06 Nov 1994 08:49:37 GMT',
+        })
+        assert res.get_conditional_headers() == {
+            'If-None-Match': '"abc"',
+            'If-Modified-Since': 'Sun, 06 Nov 1994 08:49:37 GMT',
+        }
+        assert NapResponse('', 'naprulez.org', 200).get_conditional_headers() == {}
+
+
+class TestSessionPool(object):
+
+    def test_send_with_session(self):
+        session = mock.Mock()
+        r = NapRequest('GET', 'http://foo.com/')
+        with mock.patch('requests.request') as request:
+            r.send(session=session)
+            assert not request.called
+        assert session.request.called
+
+    def test_session_per_key(self):
+        pool = SessionPool()
+        session = pool.get_session('http://foo.com/')
+        assert pool.get_session('http://foo.com/') is session
+        assert pool.get_session('http://bar.com/') is not session
+
+    def test_keep_alive_recycles_session(self):
+        pool = SessionPool(keep_alive=10)
+        with mock.patch('time.time') as now:
+            now.return_value = 100
+            session = pool.get_session('http://foo.com/')
+            now.return_value = 105
+            assert pool.get_session('http://foo.com/') is session
+            now.return_value = 111
+            with mock.patch.object(session, 'close') as close:
+                assert pool.get_session('http://foo.com/') is not session
+                # may still be in use by another thread
+                assert not close.called
+
+    def test_sessions_keep_no_cookies(self):
+        pool = SessionPool()
+        session = pool.get_session('http://foo.com/')
+        cookie = requests.cookies.create_cookie('session_id', 'abc')
+
+        session.cookies.set_cookie_if_ok(cookie, mock.Mock())
+        assert len(session.cookies) == 0
+
+    def test_close(self):
+        pool = SessionPool()
+        session = pool.get_session('http://foo.com/')
+        with mock.patch.object(session, 'close') as close:
+            pool.close()
+            assert close.called
+        assert pool.get_session('http://foo.com/') is not session
+
+    def test_engine_uses_pool(self):
+        pool = SessionPool()
+        SampleResourceModel._meta['connection_pool'] = pool
+        session = pool.get_session('http://foo.com')
+        try:
+            with mock.patch.object(session, 'request') as request:
+                request.return_value = mock.Mock(status_code=200, content='{}')
+                SampleResourceModel.objects._request('GET', 'note/')
+                assert request.called
+        finally:
+            SampleResourceModel._meta['connection_pool'] = None
@@ -0,0 +1,141 @@
+import mock
+import pytest
+
+from nap.deadline import deadline
+from nap.exceptions import DeadlineExceeded
+from nap.http import NapResponse
+from nap.ratelimit import RateLimiter, TokenBucket
+
+from . import SampleResourceModel
+
+
+class TestTokenBucket(object):
+
+    def test_reserve(self):
+        with mock.patch('time.time') as now:
+            now.return_value = 100
+            bucket = TokenBucket(rate=2, capacity=2)
+
+            assert bucket.reserve() == 0
+            assert bucket.reserve() == 0
+            # bursts are spread out at ``rate``
+            assert bucket.reserve() == 0.5
+            assert bucket.reserve() == 1.0
+
+            now.return_value = 110
+            assert bucket.reserve() == 0
+
+    def test_pause_until(self):
+        with mock.patch('time.time') as now:
+            now.return_value = 100
+            bucket = TokenBucket(rate=1, capacity=5)
+            bucket.pause_until(130)
+
+            assert bucket.reserve() == 30
+            assert bucket.reserve() == 31
+            now.return_value = 132
+            assert bucket.reserve() == 0
+
+    def test_slow_down(self):
+        with mock.patch('time.time') as now:
+            now.return_value = 100
+            bucket = TokenBucket(rate=10, capacity=1)
+            bucket.slow_down(1, until=110)
+            assert bucket.rate == 1
+
+            now.return_value = 105
+            bucket.reserve()
+            assert bucket.rate == 1
+
+            now.return_value = 110
+            bucket.reserve()
+            assert bucket.rate == 10
+
+    def test_cancel(self):
+        with mock.patch('time.time') as now:
+            now.return_value = 100
+            bucket = TokenBucket(rate=1, capacity=1)
+            assert bucket.reserve() == 0
+            assert bucket.reserve() == 1
+            bucket.cancel()
+            assert bucket.reserve() == 1
+
+
+class TestRateLimiter(object):
+
+    def get_response(self, remaining, reset):
+        return NapResponse('', 'http://foo.com/', 200, headers={
+            'x-ratelimit-remaining': str(remaining),
+            'x-ratelimit-reset': str(reset),
+        })
+
+    def test_acquire_sleeps(self):
+        limiter = RateLimiter(rate=1, burst=1)
+        with mock.patch.object(limiter, 'sleep') as sleep:
+            limiter.acquire('foo.com')
+            assert not sleep.called
+            limiter.acquire('foo.com')
+            assert sleep.called
+            sleep.reset_mock()
+            limiter.acquire('bar.com')
+            assert not sleep.called
+
+    def test_acquire_within_deadline(self):
+        limiter = RateLimiter(rate=1, burst=1)
+        limiter.acquire('foo.com')
+        with mock.patch.object(limiter, 'sleep') as sleep:
+            with deadline(0.1):
+                with pytest.raises(DeadlineExceeded):
+                    limiter.acquire('foo.com')
+            assert not sleep.called
+
+            with deadline(10):
+                limiter.acquire('foo.com')
+            assert sleep.called
+
+    def test_adapts_to_headers(self):
+        limiter = RateLimiter(rate=10)
+        with mock.patch('time.time') as now:
+            now.return_value = 1400000000
+            limiter.update_from_response('foo.com',
+                self.get_response(remaining=50, reset=1400000100))
+            assert limiter.get_bucket('foo.com').rate == 0.5
+
+            limiter.update_from_response('foo.com',
+                self.get_response(remaining=5000, reset=60))
+            assert limiter.get_bucket('foo.com').rate == 10
+
+            limiter.update_from_response('foo.com',
+                self.get_response(remaining=0, reset=1400000100))
+            assert limiter.get_bucket('foo.com').reserve() >= 100
+
+    def test_rate_restored_after_reset(self):
+        limiter = RateLimiter(rate=10)
+        with mock.patch('time.time') as now:
+            now.return_value = 1400000000
+            limiter.update_from_response('foo.com',
+                self.get_response(remaining=50, reset=1400000100))
+            assert limiter.get_bucket('foo.com').rate == 0.5
+
+            now.return_value = 1400000100
+            limiter.get_bucket('foo.com').reserve()
+            assert limiter.get_bucket('foo.com').rate == 10
+
+    def test_ignores_headers(self):
+        limiter = RateLimiter(rate=10, respect_headers=False)
+        limiter.update_from_response('foo.com',
+            self.get_response(remaining=0, reset=60))
+        assert limiter.get_bucket('foo.com').reserve() == 0
+
+    def test_engine_acquires(self):
+        limiter = RateLimiter(rate=10)
+        SampleResourceModel._meta['rate_limiter'] = limiter
+        try:
+            with mock.patch.object(limiter, 'acquire') as acquire:
+                with mock.patch('requests.request') as request:
+                    request.return_value = mock.Mock(status_code=200,
+                        content='', headers={})
+                    SampleResourceModel.objects._request('GET', 'note/')
+                acquire.assert_called_with('foo.com')
+        finally:
+            SampleResourceModel._meta['rate_limiter'] = None
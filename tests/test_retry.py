@@ -0,0 +1,111 @@
+import time
+
+import mock
+import pytest
+from requests.exceptions import ConnectionError
+
+from nap.http import NapResponse
+from nap.retry import RetryBudget, RetryPolicy
+
+from . import SampleResourceModel
+
+
+def get_response(status_code=200, headers=None):
+    return NapResponse(content='{}', url='http://foo.com/v1/note/',
+        status_code=status_code, headers=headers)
+
+
+class TestRetryBudget(object):
+
+    def test_withdraw(self):
+        budget = RetryBudget(ratio=0.5, initial=1)
+        assert budget.withdraw()
+        assert not budget.withdraw()
+        budget.deposit()
+        assert not budget.withdraw()
+        budget.deposit()
+        assert budget.withdraw()
+
+    def test_max_tokens(self):
+        budget = RetryBudget(ratio=5, initial=0, max_tokens=2)
+        budget.deposit()
+        assert budget.tokens == 2
+
+
+class TestRetryPolicy(object):
+
+    def test_should_retry(self):
+        policy = RetryPolicy(max_retries=2)
+        assert policy.should_retry('GET', 0, response=get_response(503))
+        assert policy.should_retry('GET', 1, error=ConnectionError())
+        assert not policy.should_retry('GET', 2, response=get_response(503))
+        assert not policy.should_retry('GET', 0, response=get_response(500))
+        assert not policy.should_retry('POST', 0, response=get_response(503))
+
+    def test_should_retry_budget(self):
+        policy = RetryPolicy(budget=RetryBudget(initial=1, ratio=0))
+        assert policy.should_retry('GET', 0, response=get_response(503))
+        assert not policy.should_retry('GET', 0, response=get_response(503))
+
+    def test_backoff(self):
+        policy = RetryPolicy(backoff_factor=1, max_backoff=5, jitter=False)
+        assert policy.get_backoff(0) == 1
+        assert policy.get_backoff(2) == 4
+        assert policy.get_backoff(5) == 5
+
+        policy.jitter = True
+        for attempt in range(5):
+            assert 0 <= policy.get_backoff(attempt) <= 5
+
+    def test_retry_after(self):
+        policy = RetryPolicy(max_backoff=60)
+        response = get_response(503, headers={'retry-after': '12'})
+        assert policy.get_backoff(0, response=response) == 12
+
+        with mock.patch('time.time') as now:
+            now.return_value = 784111767
+            response = get_response(503, headers={
+                'retry-after': 'Sun, 06 Nov 1994 08:49:57 GMT'
+            })
+            assert policy.get_backoff(0, response=response) == 30
+
+        policy.respect_retry_after = False
+        policy.jitter = False
+        assert policy.get_backoff(0, response=response) == 0.5
+
+
+class TestEngineRetries(object):
+
+    def setup_method(self, method):
+        self.policy = RetryPolicy(max_retries=2)
+        SampleResourceModel._meta['retry_policy'] = self.policy
+
+    def teardown_method(self, method):
+        SampleResourceModel._meta['retry_policy'] = None
+
+    def test_retries_until_success(self):
+        responses = [mock.Mock(status_code=503, content='', headers={}),
+            mock.Mock(status_code=200, content='{}', headers={})]
+        with mock.patch('requests.request') as request:
+            request.side_effect = responses
+            with mock.patch.object(self.policy, 'sleep') as sleep:
+                response = SampleResourceModel.objects._request('GET', 'note/')
+                assert sleep.call_count == 1
+
+        assert response.status_code == 200
+
+    def test_gives_up(self):
+        with mock.patch('requests.request') as request:
+            request.side_effect = ConnectionError()
+            with mock.patch.object(self.policy, 'sleep'):
+                with pytest.raises(ConnectionError):
+                    SampleResourceModel.objects._request('GET', 'note/')
+            assert request.call_count == 3
+
+    def test_no_retry_for_post(self):
+        with mock.patch('requests.request') as request:
+            request.return_value = mock.Mock(status_code=503, content='', headers={})
+            response = SampleResourceModel.objects._request('POST', 'note/')
+            assert request.call_count == 1
+
+        assert response.status_code == 503
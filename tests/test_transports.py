@@ -0,0 +1,159 @@
+import json
+import socket
+
+import mock
+import pytest
+from requests.exceptions import ConnectionError, Timeout
+
+from nap.compression import compress
+from nap.http import NapRequest, SessionPool
+from nap.transports import (BaseTransport, RequestsTransport,
+    Urllib3Transport, WSGITransport, urllib3)
+
+from . import SampleResourceModel
+
+
+def echo_app(environ, start_response):
+    body = environ['wsgi.input'].read(int(environ['CONTENT_LENGTH'] or 0))
+    content = json.dumps({
+        'method': environ['REQUEST_METHOD'],
+        'path': environ['PATH_INFO'],
+        'query': environ['QUERY_STRING'],
+        'header': environ.get('HTTP_X_FAKE'),
+        'content_type': environ.get('CONTENT_TYPE'),
+        'body': body,
+    })
+    start_response('200 OK', [('Content-Type', 'application/json')])
+    return [content]
+
+
+class TestRequestsTransport(object):
+
+    def test_send(self):
+        transport = RequestsTransport()
+        request = NapRequest('GET', 'http://foo.com/v1/note/')
+        with mock.patch('requests.request') as r:
+            r.return_value = mock.Mock(status_code=200, content='{}', headers={})
+            response = transport.send(request)
+            assert r.called
+
+        assert response.status_code == 200
+        assert response.url == 'http://foo.com/v1/note/'
+
+    def test_session_pool_keyed_by_host(self):
+        pool = SessionPool()
+        transport = RequestsTransport(session_pool=pool)
+        request = NapRequest('GET', 'http://foo.com/v1/note/?q=1')
+        session = transport.get_session(request)
+        assert session is pool.get_session('http://foo.com')
+
+
+class TestUrllib3Transport(object):
+
+    def test_send(self):
+        transport = Urllib3Transport()
+        request = NapRequest('POST', 'http://foo.com/v1/note/', data='{}',
+            headers={'content-type': 'application/json'}, auth=('u', 'p'))
+        raw_response = mock.Mock(status=201, data='{"a": 1}',
+            headers={'content-type': 'application/json'})
+        with mock.patch.object(transport.pool_manager, 'urlopen') as urlopen:
+            urlopen.return_value = raw_response
+            response = transport.send(request)
+
+            args, kwargs = urlopen.call_args
+            assert args == ('POST', 'http://foo.com/v1/note/')
+            assert kwargs['body'] == '{}'
+            assert kwargs['headers']['authorization'].startswith('Basic ')
+
+        assert response.status_code == 201
+        assert response.content == '{"a": 1}'
+        assert response.headers['Content-Type'] == 'application/json'
+
+    def test_request_args(self):
+        transport = Urllib3Transport()
+        request = NapRequest('GET', 'http://foo.com/', timeout=5,
+            allow_redirects=False)
+        raw_response = mock.Mock(status=200, data='{}', headers={})
+        with mock.patch.object(transport.pool_manager, 'urlopen') as urlopen:
+            urlopen.return_value = raw_response
+            transport.send(request)
+
+            args, kwargs = urlopen.call_args
+            assert kwargs['timeout'] == 5
+            assert kwargs['redirect'] is False
+
+    def test_unsupported_request_args(self):
+        transport = Urllib3Transport()
+        request = NapRequest('GET', 'http://foo.com/', verify=False)
+        with mock.patch.object(transport.pool_manager, 'urlopen') as urlopen:
+            with pytest.raises(TypeError):
+                transport.send(request)
+            assert not urlopen.called
+
+    @pytest.mark.parametrize(('error', 'expected_error'), [
+        (socket.error(), ConnectionError),
+        (urllib3.exceptions.MaxRetryError(None, 'http://foo.com/'),
+            ConnectionError),
+        (urllib3.exceptions.TimeoutError(None, 'http://foo.com/', 'timed out'), Timeout),
+    ])
+    def test_errors_mapped(self, error, expected_error):
+        transport = Urllib3Transport()
+        request = NapRequest('GET', 'http://foo.com/')
+        with mock.patch.object(transport.pool_manager, 'urlopen') as urlopen:
+            urlopen.side_effect = error
+            with pytest.raises(expected_error):
+                transport.send(request)
+
+
+class TestWSGITransport(object):
+
+    def test_send(self):
+        transport = WSGITransport(echo_app, script_name='/v1')
+        request = NapRequest('POST', 'http://foo.com/v1/note/?q=1', data='hi',
+            headers={'content-type': 'text/plain', 'x-fake': 'yes'})
+        response = transport.send(request)
+
+        assert response.status_code == 200
+        assert response.headers['content-type'] == 'application/json'
+        data = json.loads(response.content)
+        assert data == {
+            'method': 'POST',
+            'path': '/note/',
+            'query': 'q=1',
+            'header': 'yes',
+            'content_type': 'text/plain',
+            'body': 'hi',
+        }
+
+    def test_decompress_response(self):
+        def gzip_app(environ, start_response):
+            start_response('200 OK', [('Content-Encoding', 'gzip')])
+            return [compress('{"a": 1}', 'gzip')]
+
+        transport = WSGITransport(gzip_app)
+        response = transport.send(NapRequest('GET', 'http://foo.com/'))
+        assert response.content == '{"a": 1}'
+
+    def test_write_callable(self):
+        def writing_app(environ, start_response):
+            write = start_response('200 OK', [])
+            write('{"a": ')
+            return ['1}']
+
+        transport = WSGITransport(writing_app)
+        response = transport.send(NapRequest('GET', 'http://foo.com/'))
+        assert response.content == '{"a": 1}'
+
+    def test_engine_with_wsgi_transport(self):
+        SampleResourceModel._meta['transport'] = WSGITransport(echo_app)
+        try:
+            response = SampleResourceModel.objects._request('GET', 'note/')
+        finally:
+            SampleResourceModel._meta['transport'] = None
+
+        assert json.loads(response.content)['path'] == '/v1/note/'
+        assert response.request_method == 'GET'
+
+
+def test_base_transport_close():
+    assert BaseTransport().close() is None
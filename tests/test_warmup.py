@@ -0,0 +1,99 @@
+import json
+
+import mock
+
+import nap
+from nap.engine import WARMUP_TIMEOUT
+from nap.http import NapRequest, SessionPool
+from nap.transports import RequestsTransport, Urllib3Transport
+
+from . import AuthorModel, SampleResourceModel
+
+
+class TestTransportWarmup(object):
+
+    def test_resolves_host(self):
+        transport = RequestsTransport()
+        with mock.patch('socket.getaddrinfo') as getaddrinfo:
+            transport.warmup('https://foo.com/v1/')
+            getaddrinfo.assert_called_with('foo.com', 443)
+
+    def test_opens_pooled_connections(self):
+        pool = SessionPool()
+        transport = RequestsTransport(session_pool=pool)
+        session = pool.get_session('http://foo.com')
+        with mock.patch('socket.getaddrinfo'):
+            with mock.patch.object(session, 'request') as request:
+                request.return_value = mock.Mock(status_code=200, content='',
+                    headers={})
+                transport.warmup('http://foo.com/v1/', connections=3)
+                assert request.call_count == 3
+                args, kwargs = request.call_args
+                assert args == ('HEAD', 'http://foo.com/v1/')
+
+    def test_urllib3_opens_connections(self):
+        transport = Urllib3Transport()
+        with mock.patch('socket.getaddrinfo'):
+            with mock.patch.object(transport.pool_manager, 'urlopen') as urlopen:
+                transport.warmup('http://foo.com/v1/', connections=2)
+                assert urlopen.call_count == 2
+
+
+class TestEngineWarmup(object):
+
+    def teardown_method(self, method):
+        SampleResourceModel._meta['warmup_urls'] = ()
+
+    @mock.patch('socket.getaddrinfo')
+    def test_warmup(self, getaddrinfo):
+        assert SampleResourceModel.objects.warmup() == []
+        getaddrinfo.assert_called_with('foo.com', 80)
+
+    @mock.patch('socket.getaddrinfo')
+    def test_connections_opened_like_requests(self, getaddrinfo):
+        transport = mock.Mock()
+        SampleResourceModel._meta['transport'] = transport
+        try:
+            with mock.patch('nap.engine.ResourceEngine.send_once') as send_once:
+                SampleResourceModel.objects.warmup(connections=2, timeout=3)
+                send = transport.warmup.call_args[1]['send']
+                send(NapRequest('HEAD', 'http://foo.com/v1/'))
+
+                sent_transport, request = send_once.call_args[0]
+                assert sent_transport is transport
+                assert request.extra_kwargs['timeout'] == 3
+
+                SampleResourceModel.objects.warmup()
+                send = transport.warmup.call_args[1]['send']
+                send(NapRequest('HEAD', 'http://foo.com/v1/'))
+                request = send_once.call_args[0][1]
+                assert request.extra_kwargs['timeout'] == WARMUP_TIMEOUT
+        finally:
+            SampleResourceModel._meta['transport'] = None
+
+    @mock.patch('socket.getaddrinfo')
+    def test_primes_cache(self, getaddrinfo):
+        SampleResourceModel._meta['warmup_urls'] = ('note/popular/',)
+        with mock.patch('requests.request') as request:
+            request.return_value = mock.Mock(status_code=200,
+                content=json.dumps({'title': 'popular'}), headers={})
+            with mock.patch('nap.cache.base.BaseCacheBackend.set') as cache_set:
+                results = SampleResourceModel.objects.warmup()
+                assert cache_set.called
+
+        assert results[0].title == 'popular'
+
+        with mock.patch('requests.request') as request:
+            SampleResourceModel.objects.warmup(prime_cache=False)
+            assert not request.called
+
+    @mock.patch('socket.getaddrinfo')
+    def test_nap_warmup(self, getaddrinfo):
+        getaddrinfo.side_effect = lambda host, port: None
+        results = nap.warmup([SampleResourceModel, AuthorModel])
+        assert results.ok
+        assert len(results) == 2
+
+        getaddrinfo.side_effect = IOError('no dns')
+        results = nap.warmup([SampleResourceModel])
+        assert isinstance(results.errors[0], IOError)